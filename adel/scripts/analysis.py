@@ -1,102 +1,81 @@
+import argparse
 import os
 import pandas as pd
-import re
-import sys
 from collections import defaultdict
-import matplotlib.pyplot as plt
-
-def extract_packet_info(log_data):
-    transmissions = []
-    acks = []
+from packet_matching import match_acks, summarize_latencies, per_node_metrics, binned_packet_sums
+from log_parser import match_first, events_frame, count_by_node, report_malformed
+from log_cache import load_log
+from plotting import bar_chart, grouped_chart, line_chart, save_charts
+from resample import TimeBins, NodeSeries
+
+PACKET_PATTERNS = [
+    ('sent', 'packet sent'),
+    ('ack', ('packet received', 'DAO-ACK')),
+    ('DIS', 'sending a DIS'),
+    ('DIO', 'sending a DIO'),
+    ('DAO', 'sending a DAO'),
+]
+
+def extract_packet_info(log, masks=None):
+    if masks is None:
+        masks = match_first(log, PACKET_PATTERNS)
+    transmissions = events_frame(log, masks['sent'])
+    acks = events_frame(log, masks['ack'])
     control_msgs = defaultdict(lambda: {'DIS': 0, 'DIO': 0, 'DAO': 0})
-    for line in log_data:
-        parts = line.strip().split('\t', 2)
-        if len(parts) == 3:
-            timestamp, node_id_str, message = parts
-            node_id = int(re.search(r'\d+', node_id_str).group())
-            if "packet sent" in message:
-                transmissions.append((timestamp, node_id, message))
-            elif "packet received" in message or "DAO-ACK" in message:
-                acks.append((timestamp, node_id, message))
-            elif "sending a DIS" in message:
-                control_msgs[node_id]['DIS'] += 1
-            elif "sending a DIO" in message:
-                control_msgs[node_id]['DIO'] += 1
-            elif "sending a DAO" in message:
-                control_msgs[node_id]['DAO'] += 1
+    for msg_type in ['DIS', 'DIO', 'DAO']:
+        for node_id, count in count_by_node(log, masks[msg_type]).items():
+            control_msgs[node_id][msg_type] += count
     return transmissions, acks, control_msgs
 
-def calculate_packet_loss(transmissions, acks, time_window=1.0):
-    matched_acks = 0
-    for _, transmission in transmissions.iterrows():
-        matched_ack = acks[(acks['node_id'] == transmission['node_id']) & 
-                           (acks['timestamp'] >= transmission['timestamp']) & 
-                           (acks['timestamp'] <= transmission['timestamp'] + time_window)]
-        if not matched_ack.empty:
-            matched_acks += 1
-    total_transmissions = len(transmissions)
-    packet_loss_rate = ((total_transmissions - matched_acks) / total_transmissions) * 100
-    return packet_loss_rate
+# metric -> (numerator, denominator, scale) over the binned sums of node_time_series,
+# named like the node_metrics columns
+SERIES_METRICS = {
+    'Packet Loss Rate': ('lost', 'transmissions', 100),
+    'Throughput (packets/sec)': ('per_second', None, 1),
+    'Average Latency (sec)': ('latency', 'matched', 1),
+    'DIS': ('DIS', None, 1),
+    'DIO': ('DIO', None, 1),
+    'DAO': ('DAO', None, 1),
+}
+
+# Every metric per node and time bin of bin_seconds
+def node_time_series(log, masks, df_transmissions, latencies, bin_seconds):
+    timestamps = log.timestamp
+    bins = TimeBins.covering(log.node_id, timestamps, bin_seconds)
+    sums = binned_packet_sums(bins, df_transmissions, latencies)
+    for msg_type in ['DIS', 'DIO', 'DAO']:
+        sums[msg_type] = bins.counts(log.node_id[masks[msg_type]], timestamps[masks[msg_type]])
+    return NodeSeries(bins, sums, SERIES_METRICS)
 
 def calculate_throughput(transmissions, duration):
     total_packets = len(transmissions)
     throughput = total_packets / duration
     return throughput
 
-def calculate_latency(transmissions, acks):
-    latencies = []
-    for _, transmission in transmissions.iterrows():
-        ack = acks[(acks['node_id'] == transmission['node_id']) & 
-                   (acks['timestamp'] >= transmission['timestamp']) & 
-                   (acks['timestamp'] <= transmission['timestamp'] + 1.0)]
-        if not ack.empty:
-            latency = ack['timestamp'].min() - transmission['timestamp']
-            latencies.append(latency)
-    avg_latency = sum(latencies) / len(latencies) if latencies else 0
-    return avg_latency
-
-def analyze_node_behavior(df_transmissions, df_acks, control_msgs):
-    nodes = sorted(df_transmissions['node_id'].unique())
-    node_metrics = {}
-    for node in nodes:
-        node_transmissions = df_transmissions[df_transmissions['node_id'] == node]
-        node_acks = df_acks[df_acks['node_id'] == node]
-        
-        packet_loss_rate = calculate_packet_loss(node_transmissions, node_acks)
-        duration = node_transmissions['timestamp'].max() - node_transmissions['timestamp'].min()
-        throughput = calculate_throughput(node_transmissions, duration)
-        avg_latency = calculate_latency(node_transmissions, node_acks)
-        control_msg_counts = control_msgs[node]
-        
-        node_metrics[node] = {
-            'Packet Loss Rate': packet_loss_rate,
-            'Throughput (packets/sec)': throughput,
-            'Average Latency (sec)': avg_latency,
-            'Control Messages': control_msg_counts
-        }
+def analyze_node_behavior(df_transmissions, latencies, control_msgs):
+    metrics = per_node_metrics(df_transmissions, latencies)
+    node_metrics = pd.DataFrame({
+        'Packet Loss Rate': metrics['packet_loss_rate'],
+        'Throughput (packets/sec)': metrics['throughput'],
+        'Average Latency (sec)': metrics['avg_latency'],
+    })
+    node_metrics['Control Messages'] = [control_msgs[node] for node in node_metrics.index]
     return node_metrics
 
-def analyze_log_file(file_path):
-    with open(file_path, 'r') as file:
-        log_data = file.readlines()
+# With bin_seconds, the per-node time series of the metrics are returned as well (else None)
+def analyze_log_file(file_path, bin_seconds=None):
+    log = load_log(file_path)
+    report_malformed(log, file_path)
 
     # Extract packet information
-    transmissions_data, acks_data, control_msgs = extract_packet_info(log_data)
-
-    # Create DataFrames
-    columns = ['timestamp', 'node_id', 'message']
-    df_transmissions = pd.DataFrame(transmissions_data, columns=columns)
-    df_acks = pd.DataFrame(acks_data, columns=columns)
-
-    # Convert timestamps to floats for accurate calculations
-    df_transmissions['timestamp'] = df_transmissions['timestamp'].astype(float)
-    df_acks['timestamp'] = df_acks['timestamp'].astype(float)
+    masks = match_first(log, PACKET_PATTERNS)
+    df_transmissions, df_acks, control_msgs = extract_packet_info(log, masks)
 
     # Calculate overall metrics
-    packet_loss_rate = calculate_packet_loss(df_transmissions, df_acks)
+    latencies = match_acks(df_transmissions, df_acks)
+    packet_loss_rate, avg_latency = summarize_latencies(latencies)
     duration = df_transmissions['timestamp'].max() - df_transmissions['timestamp'].min()
     throughput = calculate_throughput(df_transmissions, duration)
-    avg_latency = calculate_latency(df_transmissions, df_acks)
     
     overall_metrics = {
         'Packet Loss Rate': packet_loss_rate,
@@ -105,9 +84,13 @@ def analyze_log_file(file_path):
     }
 
     # Calculate per-node metrics
-    node_metrics = analyze_node_behavior(df_transmissions, df_acks, control_msgs)
+    node_metrics = analyze_node_behavior(df_transmissions, latencies, control_msgs)
+
+    series = None
+    if bin_seconds:
+        series = node_time_series(log, masks, df_transmissions, latencies, bin_seconds)
     
-    return overall_metrics, node_metrics
+    return overall_metrics, node_metrics, series
 
 def generate_report(overall_metrics, node_metrics, output_folder):
     os.makedirs(output_folder, exist_ok=True)
@@ -123,7 +106,7 @@ def generate_report(overall_metrics, node_metrics, output_folder):
         
         log_file.write("\nNode-specific Metrics:\n")
         log_file.write("--------------------------\n")
-        ranked_nodes = sorted(node_metrics.items())
+        ranked_nodes = sorted(node_metrics.to_dict('index').items())
         for node, metrics in ranked_nodes:
             log_file.write(f"\nNode {node}:\n")
             for metric, value in metrics.items():
@@ -136,73 +119,77 @@ def generate_report(overall_metrics, node_metrics, output_folder):
     
     return log_file_path
 
-def generate_visualizations(node_metrics, output_folder):
-    # Nodes are already sorted as integers
-    nodes = sorted(node_metrics.keys())
-    packet_loss_rates = [node_metrics[node]['Packet Loss Rate'] for node in nodes]
-    throughputs = [node_metrics[node]['Throughput (packets/sec)'] for node in nodes]
-    latencies = [node_metrics[node]['Average Latency (sec)'] for node in nodes]
-    control_messages = {msg_type: [node_metrics[node]['Control Messages'][msg_type] for node in nodes] for msg_type in ['DIS', 'DIO', 'DAO']}
-    
-    # Packet Loss Rate by Node
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, packet_loss_rates, color='red')
-    plt.xlabel('Node')
-    plt.ylabel('Packet Loss Rate (%)')
-    plt.title('Packet Loss Rate by Node')
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, 'packet_loss_rate.png'))
-    
-    # Throughput by Node
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, throughputs, color='blue')
-    plt.xlabel('Node')
-    plt.ylabel('Throughput (packets/sec)')
-    plt.title('Throughput by Node')
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, 'throughput.png'))
-    
-    # Average Latency by Node
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, latencies, color='green')
-    plt.xlabel('Node')
-    plt.ylabel('Average Latency (sec)')
-    plt.title('Average Latency by Node')
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, 'latency.png'))
-    
-    # Control Messages by Node
-    plt.figure(figsize=(10, 6))
-    bar_width = 0.25
-    index = range(len(nodes))
-    
-    plt.bar(index, control_messages['DIS'], bar_width, label='DIS', color='purple')
-    plt.bar([i + bar_width for i in index], control_messages['DIO'], bar_width, label='DIO', color='orange')
-    plt.bar([i + 2 * bar_width for i in index], control_messages['DAO'], bar_width, label='DAO', color='cyan')
-    
-    plt.xlabel('Node')
-    plt.ylabel('Number of Control Messages')
-    plt.title('Control Messages by Node')
-    plt.xticks([i + bar_width for i in index], nodes, rotation=90)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, 'control_messages.png'))
-
-def process_files_in_directory(directory):
+# Long (metric, node_id, bin, value) CSV of the time series
+def write_time_series(series, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    csv_path = os.path.join(output_folder, 'timeseries.csv')
+    series.to_frame().to_csv(csv_path, index=False)
+    return csv_path
+
+# Network-wide value of the metrics per time bin
+def time_series_charts(series, output_folder):
+    per_bin = f'per {series.bins.bin_seconds:g} s'
+    charts = []
+    for column, prefix, ylabel in [('Packet Loss Rate', 'packet_loss_rate', 'Packet Loss Rate (%)'),
+                                   ('Throughput (packets/sec)', 'throughput', 'Throughput (packets/sec)'),
+                                   ('Average Latency (sec)', 'latency', 'Average Latency (sec)')]:
+        values = series.network(column)
+        charts.append(line_chart(os.path.join(output_folder, f'{prefix}_timeseries.png'),
+                                 [(column, values.index, values)], f'{column} over Time ({per_bin})', 'Time (sec)', ylabel))
+    lines = []
+    for msg_type in ['DIS', 'DIO', 'DAO']:
+        values = series.network(msg_type)
+        lines.append((msg_type, values.index, values))
+    charts.append(line_chart(os.path.join(output_folder, 'control_messages_timeseries.png'), lines,
+                             f'Control Messages over Time ({per_bin})', 'Time (sec)', 'Number of Control Messages'))
+    return charts
+
+# With the time series of the log, the charts of the metrics over time are added
+def generate_visualizations(node_metrics, output_folder, jobs=1, pdf=False, series=None):
+    nodes = sorted(node_metrics.index)
+    node_metrics = node_metrics.loc[nodes]
+    control_messages = node_metrics['Control Messages']
+
+    charts = [
+        bar_chart(os.path.join(output_folder, 'packet_loss_rate.png'), nodes, node_metrics['Packet Loss Rate'],
+                  'Packet Loss Rate by Node', 'Packet Loss Rate (%)', 'red'),
+        bar_chart(os.path.join(output_folder, 'throughput.png'), nodes, node_metrics['Throughput (packets/sec)'],
+                  'Throughput by Node', 'Throughput (packets/sec)', 'blue'),
+        bar_chart(os.path.join(output_folder, 'latency.png'), nodes, node_metrics['Average Latency (sec)'],
+                  'Average Latency by Node', 'Average Latency (sec)', 'green'),
+        grouped_chart(os.path.join(output_folder, 'control_messages.png'), nodes,
+                      [(msg_type, [counts[msg_type] for counts in control_messages], color)
+                       for msg_type, color in [('DIS', 'purple'), ('DIO', 'orange'), ('DAO', 'cyan')]],
+                      'Control Messages by Node', 'Number of Control Messages'),
+    ]
+    if series is not None:
+        charts.extend(time_series_charts(series, output_folder))
+    save_charts(charts, jobs, os.path.join(output_folder, 'charts.pdf') if pdf else None)
+
+def process_files_in_directory(directory, jobs=1, pdf=False, bin_seconds=None):
     for file_name in os.listdir(directory):
         if file_name.endswith('.txt'):
             file_path = os.path.join(directory, file_name)
             base_name = os.path.splitext(file_name)[0]
             output_folder = os.path.join(directory, base_name)
-            overall_metrics, node_metrics = analyze_log_file(file_path)
+            overall_metrics, node_metrics, series = analyze_log_file(file_path, bin_seconds)
             generate_report(overall_metrics, node_metrics, output_folder)
-            generate_visualizations(node_metrics, output_folder)
+            if series is not None:
+                write_time_series(series, output_folder)
+            generate_visualizations(node_metrics, output_folder, jobs, pdf, series)
             print(f"Processed {file_name}, output saved in {output_folder}")
 
 if __name__ == "__main__":
-    directory = os.path.dirname(os.path.realpath(__file__))
-    process_files_in_directory(directory)
-
+    parser = argparse.ArgumentParser(description="Metrics report and charts of every COOJA log (.txt) in a directory")
+    parser.add_argument("directory", nargs="?", default=os.path.dirname(os.path.realpath(__file__)),
+                        help="directory of the logs (default: the directory of this script)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of charts rendered in parallel (0 = one per CPU)")
+    parser.add_argument("--pdf", action="store_true",
+                        help="write the charts of every log into one multi-page PDF instead of PNG files")
+    parser.add_argument("-b", "--bin", type=float, metavar="SECONDS",
+                        help="also write every metric per node and time bin of SECONDS (timeseries.csv) and chart it over time")
+    args = parser.parse_args()
+    if args.bin is not None and args.bin <= 0:
+        parser.error("--bin must be positive")
+    process_files_in_directory(args.directory, args.jobs, args.pdf, args.bin)
@@ -0,0 +1,287 @@
+import argparse
+import json
+import math
+import re
+import sys
+import time
+
+###########################################
+# Online RPL attack detector.
+#
+# Log lines are consumed one at a time and every node keeps a fixed set of
+# exponentially weighted moving averages, so the state does not grow with the log:
+#
+#   dis      DIS messages sent per second
+#   dio      DIO messages sent per second
+#   rank     changes of at least RANK_STEP in the advertised rank, per second
+#   version  changes of the DODAG version in the DIOs of the node, per second
+#   forward  forwarded / received transit packets
+#
+# All the averages of a node decay together, with time constant tau seconds,
+# whenever one of its events is seen. An alert (timestamp, node, signal, value)
+# is raised when a signal crosses its threshold, and re-armed once it is back
+# well inside it.
+
+EVENT_RE = re.compile(
+    r'([\d.]+)\tID:(\d+)\t\[\w+: ([^\]]*)\] ?'
+    r'(?:(sending a DIS)'
+    r'|sending a \w+-DIO with rank (\d+)'
+    r'|received a \w+-DIO from 6L-(\d+), .*version (\d+)'
+    r'|(Forwarding packet)'
+    r'|packet received from 6G-\d+ to 6G-(\d+)'
+    r'|(attack has started))')
+
+SIGNALS = ['dis', 'dio', 'rank', 'version', 'forward']
+
+DEFAULT_THRESHOLDS = {
+    'dis': 0.2,       # DIS/sec
+    'dio': 0.5,       # DIO/sec
+    'rank': 0.2,      # rank changes/sec
+    'version': 0.05,  # version changes/sec
+    'forward': 0.15,  # forwarded/received ratio, alert below
+}
+DEFAULT_TAU = 20.0
+
+RANK_STEP = 128          # MinHopRankIncrease: rank changes below one hop are ignored
+MIN_TRANSIT = 5.0        # weighted transit packets needed before the forward ratio is judged
+CLEAR_FACTOR = 0.5       # a rate alert is re-armed below CLEAR_FACTOR * threshold
+
+###########################################
+
+class NodeState:
+    __slots__ = ('last', 'dis', 'dio', 'rank_changes', 'version_changes',
+                 'forwarded', 'received', 'rank', 'version', 'alerting')
+
+    def __init__(self, timestamp):
+        self.last = timestamp
+        self.dis = 0.0
+        self.dio = 0.0
+        self.rank_changes = 0.0
+        self.version_changes = 0.0
+        self.forwarded = 0.0
+        self.received = 0.0
+        self.rank = None
+        self.version = None
+        # set of signals currently in alert
+        self.alerting = set()
+
+    # Decay every average to timestamp
+    def decay(self, timestamp, tau):
+        dt = timestamp - self.last
+        if dt > 0:
+            factor = math.exp(-dt / tau)
+            self.dis *= factor
+            self.dio *= factor
+            self.rank_changes *= factor
+            self.version_changes *= factor
+            self.forwarded *= factor
+            self.received *= factor
+            self.last = timestamp
+
+class Detector:
+    def __init__(self, thresholds=None, tau=DEFAULT_TAU, on_alert=None):
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        if thresholds:
+            self.thresholds.update(thresholds)
+        self.tau = tau
+        self.on_alert = on_alert
+        self.nodes = {}
+        self.lines = 0
+        self.events = 0
+        self.alerts = 0
+        # (timestamp, node, attack) of the "attack has started" markers, and the
+        # timestamp of the first alert of every node, for the detection delays
+        self.markers = []
+        self.first_alert = {}
+
+    def _node(self, node, timestamp):
+        state = self.nodes.get(node)
+        if state is None:
+            state = self.nodes[node] = NodeState(timestamp)
+        else:
+            state.decay(timestamp, self.tau)
+        return state
+
+    def _alert(self, timestamp, node, signal, value):
+        self.alerts += 1
+        if node not in self.first_alert:
+            self.first_alert[node] = timestamp
+        if self.on_alert is not None:
+            self.on_alert(timestamp, node, signal, value)
+
+    # Raise or re-arm an alert on a rate signal
+    def _check_rate(self, timestamp, node, state, signal, weight):
+        rate = weight / self.tau
+        threshold = self.thresholds[signal]
+        if rate > threshold:
+            if signal not in state.alerting:
+                state.alerting.add(signal)
+                self._alert(timestamp, node, signal, rate)
+        elif rate < CLEAR_FACTOR * threshold:
+            state.alerting.discard(signal)
+
+    def _check_forward(self, timestamp, node, state):
+        if state.received < MIN_TRANSIT:
+            return
+        ratio = state.forwarded / state.received
+        threshold = self.thresholds['forward']
+        if ratio < threshold:
+            if 'forward' not in state.alerting:
+                state.alerting.add('forward')
+                self._alert(timestamp, node, 'forward', ratio)
+        elif ratio > (1 + threshold) / 2:
+            state.alerting.discard('forward')
+
+    # Feed the groups of an EVENT_RE match
+    def _event(self, groups):
+        ts, node, module, dis, rank, sender, version, forward, destination, marker = groups
+        timestamp = float(ts)
+        node = int(node)
+        self.events += 1
+        if dis is not None:
+            state = self._node(node, timestamp)
+            state.dis += 1
+            self._check_rate(timestamp, node, state, 'dis', state.dis)
+        elif rank is not None:
+            state = self._node(node, timestamp)
+            state.dio += 1
+            self._check_rate(timestamp, node, state, 'dio', state.dio)
+            rank = int(rank)
+            if state.rank is not None and abs(rank - state.rank) >= RANK_STEP:
+                state.rank_changes += 1
+                self._check_rate(timestamp, node, state, 'rank', state.rank_changes)
+            state.rank = rank
+        elif sender is not None:
+            # the version is tracked for the sender of the DIO, as seen by its neighbours
+            sender = int(sender)
+            state = self._node(sender, timestamp)
+            version = int(version)
+            if state.version is not None and version != state.version:
+                state.version_changes += 1
+                self._check_rate(timestamp, sender, state, 'version', state.version_changes)
+            state.version = version
+        elif forward is not None:
+            state = self._node(node, timestamp)
+            state.forwarded += 1
+        elif destination is not None:
+            # only packets for another node are expected to be forwarded
+            if int(destination) != node:
+                state = self._node(node, timestamp)
+                state.received += 1
+                self._check_forward(timestamp, node, state)
+        elif marker is not None:
+            self.markers.append((timestamp, node, module.strip()))
+
+    def feed_line(self, line):
+        self.lines += 1
+        m = EVENT_RE.match(line)
+        if m is not None:
+            self._event(m.groups())
+
+    # Feed a block of whole lines at once, e.g. what was appended to a followed log
+    def feed_text(self, text):
+        lines = text.splitlines()
+        self.lines += len(lines)
+        for m in filter(None, map(EVENT_RE.match, lines)):
+            self._event(m.groups())
+
+    # {(attack, node, start): delay in sec to the first alert of the node at or after the start, or None}
+    def detection_delays(self):
+        delays = {}
+        for timestamp, node, attack in self.markers:
+            first = self.first_alert.get(node)
+            delays[(attack, node, timestamp)] = first - timestamp if first is not None and first >= timestamp else None
+        return delays
+
+###########################################
+
+def print_alert(timestamp, node, signal, value):
+    print(f"{timestamp:.3f}\tID:{node}\t{signal}\t{value:.3f}")
+
+# Read the blocks of whole lines appended to a file, until interrupted
+def follow(file_path, interval=0.5):
+    with open(file_path) as f:
+        pending = ''
+        while True:
+            block = f.read()
+            if not block:
+                time.sleep(interval)
+                continue
+            block = pending + block
+            end = block.rfind('\n') + 1
+            pending = block[end:]
+            if end:
+                yield block[:end]
+
+# Best of repeat runs over the lines of a log held in memory, so that only the detector is timed
+def benchmark(file_path, thresholds, tau, repeat=3):
+    with open(file_path) as f:
+        text = f.read()
+    lines = text.splitlines(True)
+    best = float('inf')
+    for _ in range(repeat):
+        detector = Detector(thresholds, tau)
+        start = time.perf_counter()
+        for line in lines:
+            detector.feed_line(line)
+        best = min(best, time.perf_counter() - start)
+
+    delays = detector.detection_delays()
+    return {
+        'file': file_path,
+        'lines': detector.lines,
+        'events': detector.events,
+        'alerts': detector.alerts,
+        'seconds': best,
+        'lines_per_sec': detector.lines / best,
+        'detection_delays': [{'attack': attack, 'node': node, 'start': start, 'delay': delay}
+                             for (attack, node, start), delay in sorted(delays.items(), key=lambda item: item[0][2])],
+    }
+
+def print_benchmark(result):
+    print(f"{result['file']}: {result['lines']} lines, {result['events']} events, {result['alerts']} alerts")
+    print(f"  {result['lines_per_sec']:.0f} lines/sec")
+    for delay in result['detection_delays']:
+        detected = f"{delay['delay']:.3f} s" if delay['delay'] is not None else "not detected"
+        print(f"  {delay['attack']} on node {delay['node']} at {delay['start']:.3f} s: {detected}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect RPL attacks online from COOJA log lines ('-' reads stdin)")
+    parser.add_argument("log_files", nargs="+")
+    parser.add_argument("--tau", type=float, default=DEFAULT_TAU, help="time constant of the moving averages, in sec")
+    for signal in SIGNALS:
+        parser.add_argument(f"--{signal}", type=float, default=DEFAULT_THRESHOLDS[signal],
+                            help=f"alert threshold of the {signal} signal (default {DEFAULT_THRESHOLDS[signal]})")
+    parser.add_argument("-f", "--follow", action="store_true", help="keep reading lines appended to the (single) log file")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="report lines/sec and the detection delay of every 'attack has started' marker instead of the alerts")
+    parser.add_argument("--json", help="with --benchmark, also write the results to this JSON file")
+    args = parser.parse_args()
+    thresholds = {signal: getattr(args, signal) for signal in SIGNALS}
+    if args.follow and len(args.log_files) != 1:
+        parser.error("--follow needs a single log file")
+
+    if args.benchmark:
+        results = [benchmark(file_path, thresholds, args.tau) for file_path in args.log_files]
+        for result in results:
+            print_benchmark(result)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        sys.exit(0)
+
+    for file_path in args.log_files:
+        detector = Detector(thresholds, args.tau, print_alert)
+        if args.follow:
+            try:
+                for block in follow(file_path):
+                    detector.feed_text(block)
+            except KeyboardInterrupt:
+                pass
+        elif file_path == '-':
+            for line in sys.stdin:
+                detector.feed_line(line)
+        else:
+            with open(file_path) as f:
+                for line in f:
+                    detector.feed_line(line)
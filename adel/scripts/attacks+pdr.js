@@ -1,14 +1,26 @@
 //sim.setSpeedLimit(1.0); // set simulation speed to real time (1x)
 TIMEOUT(600000, log.log("Total PRR " + totalPRR + "\n")); // 10 mintue simulation
-path = "/home/adel/contiki-ng-attacks/examples/benchmarks/faya/no-attack_log.txt";// path to log file
-log.writeFile(path, "");
+// path to log file, given by batch_runner.py in $RPL_LOG_PATH
+path = java.lang.System.getenv("RPL_LOG_PATH") || "/home/adel/contiki-ng-attacks/examples/benchmarks/faya/no-attack_log.txt";
+// the lines are buffered in memory and written in blocks, when the buffer is
+// full, every LOG_FLUSH_TIME of simulated time and when the script ends,
+// instead of reopening the file for every line with log.append
+LOG_BUFFER_SIZE = 1 << 20; // chars
+LOG_FLUSH_TIME = 10000000; // usec
+log_writer = new java.io.BufferedWriter(new java.io.FileWriter(path), LOG_BUFFER_SIZE);
+log_flushed = 0;
 
 timeout_function = function my_fun() {
+  log_writer.close();
   log.log("Script timed out.\n");
   log.testOK();
 }
-my_log_func = function(path,time,idx,msgx){
-  log.append(path, (time / 1000000) + "\tID:" + idx + "	" + msgx + "\n");
+my_log_func = function(time,idx,msgx){
+  log_writer.write((time / 1000000) + "\tID:" + idx + "	" + msgx + "\n");
+  if (time - log_flushed >= LOG_FLUSH_TIME) {
+    log_writer.flush();
+    log_flushed = time;
+  }
 }
 // class Attack
 function Attack(name,target,startTime,endTime){
@@ -50,14 +62,14 @@ function Attack(name,target,startTime,endTime){
             this.ON = this.memAccess(this.name,0,0xff);
             if(this.ON)
                 log.log("[WARN: "+this.name+" ] attack has stopped")
-                my_log_func(path,time,this.target.getID(),"[WARN: "+this.name+" ] attack has started");
+                my_log_func(time,this.target.getID(),"[WARN: "+this.name+" ] attack has started");
         }
         this.timeVarUpdate(time);
         if (!this.OFF && time > this.endTime) {
             this.OFF = this.memAccess(this.name,0,0x00);
             if(this.OFF)
                 log.log("[WARN: "+this.name+" ] attack has stopped")
-                my_log_func(path,time,this.target.getID(),"[WARN: "+this.name+" ] attack has stopped");
+                my_log_func(time,this.target.getID(),"[WARN: "+this.name+" ] attack has stopped");
         }
     }
 }
@@ -89,7 +101,7 @@ attacks.push(new Attack("SHA_on", 7, 300000, 1200000));
 // while(rand_node < 2 || rand_node == 7)
 //       rand_node = randx.nextInt(16);
 
-// my_log_func(path,time,-1,"rand = "+rand_node);
+// my_log_func(time,-1,"rand = "+rand_node);
 // attacks.push(new Attack("sfa_on", rand_node, 300000, 500000));
 
 // Initialize arrays and variables
@@ -127,7 +139,7 @@ while (true) {
     var result = msg.slice(position + 1).trim();
     var msgArray = result.split(' ');
 
-    my_log_func(path, time, id, msg);
+    my_log_func(time, id, msg);
 
     if (msgArray[1].equals("received") && msgArray.length == 6) {
         
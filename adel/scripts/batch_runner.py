@@ -0,0 +1,293 @@
+import argparse
+import glob
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from parallel import resolve_jobs
+
+###########################################
+# Parallel batch of COOJA simulations, analysed as they finish.
+#
+# One job per (simulation script, seed). Up to --jobs simulations run at once;
+# as soon as one finishes its log goes to a separate pool of --analysis-jobs
+# analyses while the next simulations keep running. Every command runs in its
+# own process group, so a timeout kills the whole tree (java and its children),
+# and a failed or timed out simulation is retried up to --retries times.
+#
+# The simulation writes its log to $RPL_LOG_PATH (see sim_script.js), which is
+# <log>.partial until the command succeeds, then renamed to <log>: a log that
+# exists is always complete. Its console (stdout and stderr) goes to
+# <log>.console. Every finished step is appended to batch_state.jsonl in the log
+# directory; after a crash or Ctrl-C, running the same batch again skips what
+# is already done. Any other executable can stand in for COOJA with --command,
+# e.g. the synthetic logs of log_generator.py:
+#
+#   batch_runner.py sim_scripts/ --runs 4 -j 4 \
+#       --command 'python3 log_generator.py --seed {seed} -d 120 -o {log}'
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COOJA_JAR = '/home/adel/contiki-ng-attacks/tools/cooja/dist/cooja.jar'
+CONTIKI_DIR = '/home/adel/contiki-ng-attacks'
+SIM_CONFIG = 'sim.csc'
+
+# fields: {script} {seed} {log} {name} {cooja} {contiki} {config}; every field
+# is one argument, whatever it contains
+COOJA_COMMAND = 'java -jar {cooja} -nogui={config} -contiki={contiki} -script={script} -random-seed={seed}'
+ANALYSIS_COMMAND = shlex.quote(sys.executable) + ' ' + shlex.quote(
+    os.path.join(SCRIPTS_DIR, 'network_node_metrics_calculator.py')) + ' {log}'
+
+# environment of the simulation, read by the simulation scripts
+LOG_PATH_ENV = 'RPL_LOG_PATH'
+SEED_ENV = 'RPL_SEED'
+
+STATE_FILE = 'batch_state.jsonl'
+PARTIAL_SUFFIX = '.partial'
+CONSOLE_SUFFIX = '.console'
+ANALYSIS_SUFFIX = '.analysis'
+
+SIMULATION = 'simulation'
+ANALYSIS = 'analysis'
+
+# exit status reported for a command killed by its timeout
+TIMED_OUT = 'timeout'
+
+###########################################
+
+class Job:
+    __slots__ = ('name', 'script', 'seed', 'log')
+
+    def __init__(self, name, script, seed, log):
+        self.name = name
+        self.script = script
+        self.seed = seed
+        self.log = log
+
+    def fields(self, **extra):
+        return dict(script=self.script, seed=self.seed, log=self.log, name=self.name, **extra)
+
+# One job per script and seed; the log of job <name> is <log_dir>/<name>_log.txt
+def make_jobs(scripts, seeds, log_dir):
+    jobs = []
+    for script in scripts:
+        base = os.path.splitext(os.path.basename(script))[0]
+        for seed in seeds:
+            name = f'{base}_seed{seed}'
+            jobs.append(Job(name, os.path.abspath(script), seed, os.path.abspath(os.path.join(log_dir, f'{name}_log.txt'))))
+    return jobs
+
+# A script argument is a .js file or a directory of them
+def find_scripts(paths):
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            scripts.extend(sorted(glob.glob(os.path.join(path, '*.js'))))
+        else:
+            scripts.append(path)
+    return scripts
+
+# argv of a command template: split like a shell, then the fields substituted in every argument
+def command_argv(template, fields):
+    return [arg.format(**fields) for arg in shlex.split(template)]
+
+###########################################
+# Commands
+
+# process groups of the running commands, killed on Ctrl-C
+_running = set()
+_running_lock = threading.Lock()
+
+def kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def kill_running():
+    with _running_lock:
+        for process in _running:
+            kill_group(process)
+
+# Exit code of argv, TIMED_OUT if it ran longer than timeout (sec); stdout and stderr go to output
+def run_command(argv, output, timeout=None, env=None):
+    with open(output, 'wb') as out:
+        try:
+            process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=out, stderr=subprocess.STDOUT,
+                                       env=env, start_new_session=True)
+        except OSError as e:
+            out.write(f'{argv[0]}: {e}\n'.encode())
+            return 127
+        with _running_lock:
+            _running.add(process)
+        try:
+            return process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_group(process)
+            process.wait()
+            return TIMED_OUT
+        finally:
+            with _running_lock:
+                _running.discard(process)
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# (status, attempts, seconds) of a simulation: the command is run until it exits
+# with 0 and writes a non-empty log, at most retries + 1 times
+def run_simulation(job, template, settings, timeout=None, retries=0):
+    partial = job.log + PARTIAL_SUFFIX
+    argv = command_argv(template, dict(job.fields(**settings), log=partial))
+    env = dict(os.environ, **{LOG_PATH_ENV: partial, SEED_ENV: str(job.seed)})
+    start = time.monotonic()
+    status = None
+    for attempt in range(1, retries + 2):
+        remove(partial)
+        status = run_command(argv, job.log + CONSOLE_SUFFIX, timeout, env)
+        if status == 0:
+            if os.path.exists(partial) and os.path.getsize(partial) > 0:
+                os.replace(partial, job.log)
+                return 'done', attempt, time.monotonic() - start
+            status = 'no log'
+    remove(partial)
+    return f'failed ({status})', retries + 1, time.monotonic() - start
+
+def run_analysis(job, template, timeout=None):
+    start = time.monotonic()
+    status = run_command(command_argv(template, job.fields()), job.log + ANALYSIS_SUFFIX, timeout)
+    return ('done' if status == 0 else f'failed ({status})'), 1, time.monotonic() - start
+
+###########################################
+# State of the batch, for resume
+
+# {(job name, step): record} of the last record of every step
+def load_state(state_path):
+    state = {}
+    if not os.path.exists(state_path):
+        return state
+    with open(state_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a crashed run may be cut
+                continue
+            state[(record['job'], record['step'])] = record
+    return state
+
+def append_state(state_path, job, step, status, attempts, seconds):
+    record = {'job': job.name, 'step': step, 'status': status, 'attempts': attempts,
+              'seconds': round(seconds, 3), 'log': job.log, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    with open(state_path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def is_done(state, job, step):
+    record = state.get((job.name, step))
+    return record is not None and record['status'] == 'done'
+
+###########################################
+
+# Run every job; returns {step: {status: count}}
+def run_batch(jobs, log_dir, template=COOJA_COMMAND, settings=None, analysis=ANALYSIS_COMMAND,
+              jobs_count=1, analysis_jobs=1, timeout=None, analysis_timeout=None, retries=0, resume=True):
+    settings = settings or {}
+    os.makedirs(log_dir, exist_ok=True)
+    state_path = os.path.join(log_dir, STATE_FILE)
+    state = load_state(state_path) if resume else {}
+    counts = {SIMULATION: {}, ANALYSIS: {}}
+
+    def finish(job, step, result):
+        status, attempts, seconds = result
+        append_state(state_path, job, step, status, attempts, seconds)
+        counts[step][status] = counts[step].get(status, 0) + 1
+        retried = f' after {attempts} attempts' if attempts > 1 else ''
+        print(f"[{step}] {job.name}: {status}{retried} in {seconds:.1f} s", flush=True)
+
+    simulations = ThreadPoolExecutor(max_workers=max(1, resolve_jobs(jobs_count)))
+    analyses = ThreadPoolExecutor(max_workers=max(1, resolve_jobs(analysis_jobs)))
+    pending = {}
+
+    def analyse(job):
+        if analysis and not (resume and is_done(state, job, ANALYSIS)):
+            pending[analyses.submit(run_analysis, job, analysis, analysis_timeout)] = (job, ANALYSIS)
+
+    try:
+        for job in jobs:
+            if resume and is_done(state, job, SIMULATION) and os.path.exists(job.log):
+                counts[SIMULATION]['skipped'] = counts[SIMULATION].get('skipped', 0) + 1
+                analyse(job)
+            else:
+                pending[simulations.submit(run_simulation, job, template, settings, timeout, retries)] = (job, SIMULATION)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, step = pending.pop(future)
+                result = future.result()
+                finish(job, step, result)
+                if step == SIMULATION and result[0] == 'done':
+                    analyse(job)
+    except KeyboardInterrupt:
+        simulations.shutdown(wait=False, cancel_futures=True)
+        analyses.shutdown(wait=False, cancel_futures=True)
+        kill_running()
+        raise
+    simulations.shutdown()
+    analyses.shutdown()
+    return counts
+
+def parse_seeds(args):
+    if args.seeds:
+        return args.seeds
+    return list(range(args.base_seed, args.base_seed + args.runs))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run COOJA simulations in parallel, with seeds, timeouts, retries and resume, "
+                                                 "and analyse every log as soon as its simulation finishes")
+    parser.add_argument("scripts", nargs="+", help="simulation scripts (.js), or directories of them")
+    parser.add_argument("-l", "--log-dir", default="logs", help="directory of the logs and of the batch state")
+    seeds = parser.add_mutually_exclusive_group()
+    seeds.add_argument("--seeds", type=int, nargs="+", help="random seeds, one run per script and seed")
+    seeds.add_argument("-r", "--runs", type=int, default=1, help="runs per script, with seeds --base-seed, --base-seed + 1, ...")
+    parser.add_argument("--base-seed", type=int, default=1, help="seed of the first run")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="simulations run at once (0: one per CPU)")
+    parser.add_argument("--analysis-jobs", type=int, default=1, help="analyses run at once (0: one per CPU)")
+    parser.add_argument("-t", "--timeout", type=float, help="seconds after which a simulation is killed (and retried)")
+    parser.add_argument("--analysis-timeout", type=float, help="seconds after which an analysis is killed")
+    parser.add_argument("--retries", type=int, default=1, help="retries of a failed or timed out simulation")
+    parser.add_argument("--command", default=COOJA_COMMAND,
+                        help="simulation command; fields {script} {seed} {log} {name} {cooja} {contiki} {config} "
+                             "(default: %(default)s)")
+    parser.add_argument("--analysis", default=ANALYSIS_COMMAND,
+                        help="analysis command run on every log; fields {log} {name} {script} {seed} (default: %(default)s)")
+    parser.add_argument("--no-analysis", action="store_true", help="only run the simulations")
+    parser.add_argument("--cooja", default=COOJA_JAR, help="COOJA jar")
+    parser.add_argument("--contiki", default=CONTIKI_DIR, help="Contiki-NG directory")
+    parser.add_argument("--config", default=SIM_CONFIG, help="COOJA simulation (.csc)")
+    parser.add_argument("--restart", action="store_true", help="ignore the state of a previous batch and run every job again")
+    args = parser.parse_args()
+
+    scripts = find_scripts(args.scripts)
+    if not scripts:
+        parser.error("no simulation scripts")
+    jobs = make_jobs(scripts, parse_seeds(args), args.log_dir)
+    settings = {'cooja': args.cooja, 'contiki': args.contiki, 'config': args.config}
+    print(f"{len(jobs)} simulations of {len(scripts)} scripts, logs in {args.log_dir}", flush=True)
+
+    counts = run_batch(jobs, args.log_dir, args.command, settings, None if args.no_analysis else args.analysis,
+                       args.jobs, args.analysis_jobs, args.timeout, args.analysis_timeout, args.retries,
+                       resume=not args.restart)
+    failed = 0
+    for step, statuses in counts.items():
+        if statuses:
+            print(f"{step}: " + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+        failed += sum(count for status, count in statuses.items() if status.startswith('failed'))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,218 @@
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import energest
+import extract_metrics
+import log_cache
+import link_delivery
+import network_analysis
+import packet_paths
+import parent_timeline
+import round_trips
+from log_parser import parse_log, match_first, events_frame
+from packet_matching import calculate_packet_loss, calculate_latency
+
+# the file name has a dash, it cannot be imported with an import statement
+run_analysis = importlib.import_module('run-analysis')
+
+###########################################
+# Benchmarks of the analysis hot paths.
+#
+# Every stage is timed (best of --repeat runs) and memory-profiled (peak of the
+# Python and numpy allocations, from tracemalloc, in one extra run) on the
+# bundled logs and on copies of them replicated x10 / x100. Results are written
+# as JSON, and a previous results file can be given to compare against.
+#
+# A stage is (name, setup, run): setup(log path) returns the arguments of run
+# and is not timed. The log cache is turned off, so parsing is always measured.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGS_DIR = os.path.join(SCRIPTS_DIR, '..', 'logs')
+DEFAULT_LOGS = ['normal.txt', 'SFA+SHA52021_log.txt']
+DEFAULT_SCALES = [1, 10, 100]
+
+# simulated seconds between two copies of a replicated log
+REPLICA_GAP = 1.0
+
+###########################################
+# Stages
+
+def setup_path(path):
+    return (path,)
+
+def setup_log(path):
+    return (parse_log(path),)
+
+def setup_packets(path):
+    log = parse_log(path)
+    masks = match_first(log, network_analysis.PACKET_PATTERNS)
+    return events_frame(log, masks['sent']), events_frame(log, masks['ack'])
+
+def setup_metrics_frame(path):
+    return (extract_metrics.parse_log_file(path),)
+
+def extract_packet_info(log):
+    return network_analysis.extract_packet_info(log, match_first(log, network_analysis.PACKET_PATTERNS))
+
+STAGES = [
+    ('parse_log', setup_path, parse_log),
+    ('run-analysis.analyze_results', setup_path, run_analysis.analyze_results),
+    ('network_analysis.extract_packet_info', setup_log, extract_packet_info),
+    ('calculate_packet_loss', setup_packets, calculate_packet_loss),
+    ('calculate_latency', setup_packets, calculate_latency),
+    ('extract_metrics.calculate_metrics', setup_metrics_frame, extract_metrics.calculate_metrics),
+    ('energest.log_periods', setup_log, energest.log_periods),
+    ('link_delivery.link_delivery', setup_log, link_delivery.link_delivery),
+    ('round_trips.match_round_trips', setup_log, round_trips.match_round_trips),
+    ('packet_paths.trace_paths', setup_log, packet_paths.trace_paths),
+    ('parent_timeline.parent_timeline', setup_log, parent_timeline.parent_timeline),
+]
+
+###########################################
+
+# Write factor copies of a log one after the other, the timestamps of every copy
+# shifted past the end of the previous one
+def replicate_log(file_path, factor, output_path):
+    with open(file_path) as f:
+        lines = f.readlines()
+    duration = 0.0
+    for line in lines:
+        try:
+            duration = max(duration, float(line.split('\t', 1)[0]))
+        except ValueError:
+            pass
+    with open(output_path, 'w') as out:
+        for k in range(factor):
+            offset = k * (duration + REPLICA_GAP)
+            if not offset:
+                out.writelines(lines)
+                continue
+            for line in lines:
+                ts, tab, rest = line.partition('\t')
+                try:
+                    out.write(f"{float(ts) + offset:.6f}{tab}{rest}")
+                except ValueError:
+                    out.write(line)
+    return output_path
+
+def count_lines(file_path):
+    with open(file_path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+
+def time_stage(run, args, repeat):
+    runs = []
+    # the stages print progress and debugging output; it is not part of the measurement
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(*args)
+            runs.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            run(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return runs, peak
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPTS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(log_files, scales, stage_names=None, repeat=3, workdir=None):
+    stages = [stage for stage in STAGES if stage_names is None or stage[0] in stage_names]
+    results = []
+    own_workdir = workdir is None
+    workdir = tempfile.mkdtemp(prefix='rpl-bench-') if own_workdir else workdir
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        for log_file in log_files:
+            for scale in scales:
+                if scale == 1:
+                    path = log_file
+                else:
+                    base_name = os.path.basename(log_file)
+                    path = replicate_log(log_file, scale, os.path.join(workdir, f'x{scale}_{base_name}'))
+                lines = count_lines(path)
+                size = os.path.getsize(path)
+                for name, setup, run in stages:
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        args = setup(path)
+                    runs, peak = time_stage(run, args, repeat)
+                    best = min(runs)
+                    result = {
+                        'stage': name,
+                        'log': os.path.basename(log_file),
+                        'scale': scale,
+                        'lines': lines,
+                        'bytes': size,
+                        'seconds': best,
+                        'runs': runs,
+                        'lines_per_sec': lines / best if best else None,
+                        'peak_memory_bytes': peak,
+                    }
+                    results.append(result)
+                    print(f"{name:40s} {result['log']:24s} x{scale:<4d} {best:9.4f} s {peak / 1e6:9.1f} MB")
+                if path != log_file:
+                    os.remove(path)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+# Print the time and peak memory of every result relative to the same (stage, log, scale) in baseline
+def compare(report, baseline):
+    previous = {(r['stage'], r['log'], r['scale']): r for r in baseline['results']}
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'} ({baseline.get('created')}):")
+    for result in report['results']:
+        old = previous.get((result['stage'], result['log'], result['scale']))
+        if old is None:
+            continue
+        speedup = old['seconds'] / result['seconds'] if result['seconds'] else float('inf')
+        memory = result['peak_memory_bytes'] / old['peak_memory_bytes'] if old['peak_memory_bytes'] else float('nan')
+        print(f"{result['stage']:40s} {result['log']:24s} x{result['scale']:<4d} "
+              f"{old['seconds']:9.4f} -> {result['seconds']:9.4f} s ({speedup:5.2f}x faster), memory x{memory:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile the analysis stages on the bundled logs and replicated copies")
+    parser.add_argument("log_files", nargs="*", help=f"logs to benchmark (default: {', '.join(DEFAULT_LOGS)} from adel/logs)")
+    parser.add_argument("-s", "--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="replication factors of every log (default: 1 10 100)")
+    parser.add_argument("--stage", action="append", choices=[name for name, _, _ in STAGES],
+                        help="only run this stage (can be repeated)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per stage, the best one is kept")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--workdir", help="directory for the replicated logs (default: a temporary directory)")
+    args = parser.parse_args()
+    if any(scale < 1 for scale in args.scales):
+        parser.error("scales must be at least 1")
+    log_files = args.log_files or [os.path.join(LOGS_DIR, name) for name in DEFAULT_LOGS]
+
+    log_cache.USE_CACHE = False
+    report = run_benchmarks(log_files, args.scales, args.stage, max(args.repeat, 1), args.workdir)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -1,104 +1,59 @@
+import argparse
 import sys
+import pandas as pd
+from log_parser import report_malformed
+from log_cache import load_log
+from link_delivery import link_delivery, delivery_matrix, node_links
 
-def parse_log_file(filename):
-    nodes_sent = {}
-    nodes_received = {}
-    active_sequences = {}
-
-    with open(filename, 'r') as file:
-        for line in file:
-            # Debugging print
-            print(f"Processing line: {line.strip()}")
-
-            # Find and parse the timestamp
-            timestamp_end = line.find('ID:')
-            timestamp = float(line[:timestamp_end].strip())
-
-            # Find and parse the node ID
-            node_id_start = line.find('ID:') + 3
-            node_id_end = line.find('[', node_id_start)
-            node_id = int(line[node_id_start:node_id_end].strip())
-
-            # Find and parse the info type
-            info_type_start = line.find('[', node_id_end) + 1
-            info_type_end = line.find(']', info_type_start)
-            info_type = line[info_type_start:info_type_end].strip()
-
-            # Extract the message
-            message = line[info_type_end + 1:].strip()
-
-            # Debugging print
-            print(f"Parsed - Timestamp: {timestamp}, Node ID: {node_id}, Info Type: {info_type}, Message: {message}")
-
-            if info_type == "INFO: TSCH" and "send packet" in message:
-                seqno_start = message.find('seqno') + 6
-                if seqno_start > 5:  # Ensure 'seqno' was found
-                    seqno_end = message.find(',', seqno_start)
-                    seqno = int(message[seqno_start:seqno_end].strip())
-                    
-                    if node_id not in active_sequences:
-                        active_sequences[node_id] = set()
-                    
-                    if seqno not in active_sequences[node_id]:
-                        if node_id not in nodes_sent:
-                            nodes_sent[node_id] = 0
-                        nodes_sent[node_id] += 1
-                        active_sequences[node_id].add(seqno)
-
-                        # Debugging print
-                        print(f"Node {node_id} sent packet with seqno {seqno}. Total sent: {nodes_sent[node_id]}")
+ROOT_ID = 1
 
-            if info_type == "INFO: TSCH" and "received from" in message and node_id == 1:
-                seqno_start = message.find('seqno') + 6
-                if seqno_start > 5:  # Ensure 'seqno' was found
-                    seqno_end = message.find(',', seqno_start)
-                    seqno = int(message[seqno_start:seqno_end].strip())
-
-                    source_id_start = message.find('from LL-') + 8
-                    source_id_end = message.find(' with seqno')
-                    source_id = int(message[source_id_start:source_id_end].strip())
-
-                    if source_id in active_sequences and seqno in active_sequences[source_id]:
-                        if source_id not in nodes_received:
-                            nodes_received[source_id] = 0
-                        nodes_received[source_id] += 1
-                        active_sequences[source_id].remove(seqno)
-
-                        # Debugging print
-                        print(f"Root node received packet with seqno {seqno} from Node {source_id}. Total received from Node {source_id}: {nodes_received[source_id]}")
-
-    return nodes_sent, nodes_received
+# Per-link delivery of the unicast TSCH frames of a log, see link_delivery.py
+def parse_log_file(filename):
+    log = load_log(filename)
+    report_malformed(log, filename)
+    return link_delivery(log)
 
-def calculate_pdr(nodes_sent, nodes_received):
-    pdr = {}
-    for node in nodes_sent:
-        if node != 1:
-            sent = nodes_sent.get(node, 0)
-            received = nodes_received.get(node, 0)
-            if sent > 0:
-                pdr[node] = (received / sent) * 100
-            else:
-                pdr[node] = 0.0
+# {node: PDR (%) of its frames to the root}
+def calculate_pdr(links, root=ROOT_ID):
+    to_root = links.xs(root, level='dst') if root in links.index.get_level_values('dst') else links.iloc[:0]
+    return {int(node): float(ratio) for node, ratio in to_root['delivery_ratio'].items()}
 
-            # Debugging print
-            print(f"Node {node} - Sent: {sent}, Received: {received}, PDR: {pdr[node]:.2f}%")
-    return pdr
+def print_links(links):
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(links.round({'delivery_ratio': 2}).to_string())
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 script.py <logfile>")
-        return
-
-    logfile = sys.argv[1]
-    nodes_sent, nodes_received = parse_log_file(logfile)
-
-    # Debugging information
-    print(f"Nodes sent: {nodes_sent}")
-    print(f"Nodes received: {nodes_received}")
-
-    pdr = calculate_pdr(nodes_sent, nodes_received)
-
-    for node, ratio in sorted(pdr.items()):
+    parser = argparse.ArgumentParser(description="Link-layer delivery ratio of every TSCH link (src -> dst) of a COOJA log")
+    parser.add_argument("logfile")
+    parser.add_argument("-n", "--node", type=int, action="append",
+                        help="only show the links from or to this node, e.g. an attacker (can be repeated)")
+    parser.add_argument("-m", "--matrix", action="store_true", help="also print the src x dst delivery ratio matrix")
+    parser.add_argument("-o", "--output", help="write the per-link table to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        links = parse_log_file(args.logfile)
+    except FileNotFoundError:
+        print(f"File not found: {args.logfile}")
+        sys.exit(1)
+
+    if args.output:
+        links.to_csv(args.output)
+        print(f"Link delivery saved to {args.output}")
+
+    if args.node:
+        for node in args.node:
+            print(f"Links of node {node}:")
+            print_links(node_links(links, node))
+    else:
+        print_links(links)
+
+    if args.matrix:
+        print("Delivery ratio (%), rows: src, columns: dst")
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 250):
+            print(delivery_matrix(links).round(1).to_string(na_rep='-'))
+
+    for node, ratio in sorted(calculate_pdr(links).items()):
         print(f"Node {node} PDR: {ratio:.2f}%")
 
 if __name__ == "__main__":
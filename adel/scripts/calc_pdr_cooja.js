@@ -1,11 +1,12 @@
-// Set a timeout to log the total PRR every 900,000 ms (15 minutes)
-TIMEOUT(900000, log.log("Total PRR " + totalPRR + "\n"));
+// Set a timeout to log the total PRR every 900,000 ms (15 minutes), computed from
+// the running totals: totalPRR is only updated every SUMMARY_INTERVAL
+TIMEOUT(900000, log.log("Total PRR " + (totalReceived / totalSent) + "\n"));
 
 // Initialize arrays and variables
 packetsReceived = new Array();
 packetsSent = new Array();
 serverID = 1;
-nodeCount = 16;
+nodeCount = sim.getMotesCount();
 totalPRR = 0;
 t_total = 0;
 throughput = 0;
@@ -16,8 +17,21 @@ timeReceived = new Array();
 timeSent = new Array();
 delay = new Array();
 
-// Initialize arrays to zero for each node
-for (i = 0; i < (nodeCount - 1); i++) {
+// Running totals, updated in O(1) per packet instead of summing over the nodes:
+// the delay of a node is its last reception minus its last sending (usec),
+// counted in totalDelayUs while it is positive
+totalReceived = 0;
+totalSent = 0;
+totalDelayUs = 0;
+totaldelay = 0;
+count1 = 0;
+
+// The totals are logged every SUMMARY_INTERVAL of simulated time, not per packet
+SUMMARY_INTERVAL = 10000000; // usec
+nextSummary = SUMMARY_INTERVAL;
+
+// Initialize arrays to zero for each node (mote ids start at 1)
+for (i = 0; i <= nodeCount; i++) {
     packetsReceived[i] = 0;
     packetsSent[i] = 0;
     timeReceived[i] = 0.0;
@@ -25,10 +39,47 @@ for (i = 0; i < (nodeCount - 1); i++) {
     delay[i] = 0.0;
 }
 
+// Replace the delay of node i in the totals after its timeReceived or timeSent changed
+function updateDelay(i) {
+    if (delay[i] > 0) {
+        totalDelayUs -= delay[i];
+        count1--;
+    }
+    delay[i] = timeReceived[i] > 0 ? timeReceived[i] - timeSent[i] : 0;
+    if (delay[i] > 0) {
+        totalDelayUs += delay[i];
+        count1++;
+    }
+}
+
+function logSummary() {
+    totalPRR = totalReceived / totalSent;
+    totaldelay = totalDelayUs / 10000000;
+    total_simulation_time = time;
+
+    throughput = (totalReceived * data_length * 8 * 1000) / total_simulation_time;
+
+    PDR = (totalReceived / totalSent) * 100;
+    t_total = totalPRR * 100;
+
+    log.log(
+        "\nTotal Packet Reception Rate: " + totalPRR +
+        ", Total Delay: " + totaldelay +
+        ", Packet Delivery Ratio: " + PDR + "\n"
+    );
+
+    //log.log("\nThroughput: " + throughput + "\n");
+}
+
 // Main loop to handle messages
 while (1) {
     YIELD();
 
+    if (time >= nextSummary) {
+        logSummary();
+        nextSummary = time - time % SUMMARY_INTERVAL + SUMMARY_INTERVAL;
+    }
+
     var position = msg.indexOf(']');
     var result = msg.slice(position + 1).trim();
     var msgArray = result.split(' ');
@@ -57,47 +108,8 @@ while (1) {
             ", timeSent[senderID]: " + timeSent[senderID]/ 10000000 + "\n"
         );*/
 
-        totalReceived = totalSent = 0;
-        totaldelay = 0;
-        count1 = 0;
-
-        for (i = 0; i < (nodeCount - 1); i++) {
-            totalReceived += packetsReceived[i];
-            totalSent += packetsSent[i];
-
-            if (timeReceived[i] > 0) {
-                delay[i] = timeReceived[i] - timeSent[i];
-                delay[i] = delay[i] / 10000000;
-
-                if (delay[i] > 0) {
-                    totaldelay = totaldelay + delay[i];
-                    count1++;
-                }
-            }
-        }
-
-        totalPRR = totalReceived / totalSent;
-        total_simulation_time = time;
-
-        //log.log("\nTotal simulation time: " + total_simulation_time / 10000000 + "(Sec) \n");
-
-        throughput = (totalReceived * data_length * 8 * 1000) / total_simulation_time;
-
-        /* log.log(
-            "\nTotal Received: " + totalReceived +
-            ", Total Sent: " + totalSent + "\n"
-        ); */
-
-        PDR = (totalReceived / totalSent) * 100;
-        t_total = totalPRR * 100;
-
-        log.log(
-            "\nTotal Packet Reception Rate: " + totalPRR +
-            ", Total Delay: " + totaldelay +
-            ", Packet Delivery Ratio: " + PDR + "\n"
-        );
-
-        //log.log("\nThroughput: " + throughput + "\n");
+        totalReceived++;
+        updateDelay(senderID);
 
     } else if (msgArray[0].equals("Sending") && msgArray.length == 6) {
         
@@ -106,6 +118,8 @@ while (1) {
         //log.log("Message from: "+ receiverID + " is " + msg + "\n");
         packetsSent[receiverID]++;
         timeSent[receiverID] = time;
+        totalSent++;
+        updateDelay(receiverID);
 
         /*log.log(
             "\nPackets Sent[receiverID]: " + packetsSent[receiverID] +
@@ -1,21 +1,17 @@
+import argparse
 import sys
-import matplotlib.pyplot as plt
+from log_parser import match_first, count_by_node, report_malformed
+from log_cache import load_log
+from plotting import grouped_chart, save_chart, show_chart
+
+PDR_PATTERNS = [
+    ('sent', 'Packet sent to'),
+    ('received', 'Packet received from'),
+]
 
 def parse_log_file(file_path):
-    packets_sent = {}
-    packets_received = {}
-    
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                if 'Packet sent to' in line:
-                    print(f"Parsing sent packet line: {line.strip()}")
-                    node_id = int(line.split('ID:')[1].split()[0])
-                    packets_sent[node_id] = packets_sent.get(node_id, 0) + 1
-                elif 'Packet received from' in line:
-                    print(f"Parsing received packet line: {line.strip()}")
-                    node_id = int(line.split('ID:')[1].split()[0])
-                    packets_received[node_id] = packets_received.get(node_id, 0) + 1
+        log = load_log(file_path)
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         sys.exit(1)
@@ -23,6 +19,10 @@ def parse_log_file(file_path):
         print(f"Error reading file {file_path}: {e}")
         sys.exit(1)
 
+    report_malformed(log, file_path)
+    masks = match_first(log, PDR_PATTERNS)
+    packets_sent = count_by_node(log, masks['sent'])
+    packets_received = count_by_node(log, masks['received'])
     return packets_sent, packets_received
 
 def calculate_pdr(packets_sent, packets_received):
@@ -36,7 +36,7 @@ def calculate_pdr(packets_sent, packets_received):
             pdr[node] = 0
     return pdr
 
-def plot_pdr(normal_pdr, attack_pdr, normal_filename, attack_filename):
+def plot_pdr(normal_pdr, attack_pdr, normal_filename, attack_filename, output_path='pdr_comparison.png', show=False):
     nodes = sorted(set(normal_pdr.keys()).union(set(attack_pdr.keys())))
     normal_values = [normal_pdr.get(node, 0) for node in nodes]
     attack_values = [attack_pdr.get(node, 0) for node in nodes]
@@ -49,29 +49,27 @@ def plot_pdr(normal_pdr, attack_pdr, normal_filename, attack_filename):
         print("No valid nodes found in the log files.")
         return
 
-    plt.figure(figsize=(10, 6))
-    bar_width = 0.35
-    index = range(len(nodes))
-
-    plt.bar(index, normal_values, bar_width, label=f'Normal ({normal_filename})')
-    plt.bar([i + bar_width for i in index], attack_values, bar_width, label=f'Attack ({attack_filename})')
-
-    plt.xlabel('Node')
-    plt.ylabel('PDR (%)')
-    plt.title('End-to-End Packet Delivery Ratio (PDR) Comparison')
-    plt.xticks([i + bar_width / 2 for i in index], nodes)
-    plt.legend()
-
-    plt.tight_layout()
-    plt.show()
+    chart = grouped_chart(output_path, nodes,
+                          [(f'Normal ({normal_filename})', normal_values, None),
+                           (f'Attack ({attack_filename})', attack_values, None)],
+                          'End-to-End Packet Delivery Ratio (PDR) Comparison', 'PDR (%)',
+                          bar_width=0.35, rotation=0)
+    if show:
+        show_chart(chart)
+    else:
+        save_chart(chart)
+        print(f"PDR comparison saved to {output_path}")
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 script.py logfile1 logfile2")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Compare the end-to-end PDR of two COOJA logs")
+    parser.add_argument("normal_log")
+    parser.add_argument("attack_log")
+    parser.add_argument("-o", "--output", default="pdr_comparison.png", help="chart file (default: %(default)s)")
+    parser.add_argument("--show", action="store_true", help="open the chart in a window instead of saving it")
+    args = parser.parse_args()
 
-    normal_log = sys.argv[1]
-    attack_log = sys.argv[2]
+    normal_log = args.normal_log
+    attack_log = args.attack_log
 
     normal_packets_sent, normal_packets_received = parse_log_file(normal_log)
     attack_packets_sent, attack_packets_received = parse_log_file(attack_log)
@@ -79,7 +77,7 @@ def main():
     normal_pdr = calculate_pdr(normal_packets_sent, normal_packets_received)
     attack_pdr = calculate_pdr(attack_packets_sent, attack_packets_received)
 
-    plot_pdr(normal_pdr, attack_pdr, normal_log, attack_log)
+    plot_pdr(normal_pdr, attack_pdr, normal_log, attack_log, args.output, args.show)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,257 @@
+import argparse
+import re
+import numpy as np
+import pandas as pd
+from log_parser import report_malformed, US_PER_SEC
+from log_cache import load_log
+from profiling import stage
+
+###########################################
+# Energest period summaries.
+#
+# Every node prints a block of Energest lines per period:
+#
+#   --- Period summary #<period> (<seconds> seconds)
+#   Total time  :   <ticks>
+#   CPU         :   <ticks>/  <total> (<permil> permil)
+#   LPM / Deep LPM / Radio Tx / Radio Rx / Radio total : the same
+#
+# All the lines are parsed with one vectorized regex, each value is assigned to
+# the last header of its node (one stable sort by node and a cumulative sum of
+# the headers), and the blocks become one row each of an integer tick matrix.
+# RDC and CC2650 charge are then computed for every period at once.
+#
+# A period counts as joined (for rdc_joined) if the node was TSCH-joined at the
+# header of its previous period and did not leave the network since, as in the
+# per-line loop of run-analysis.py.
+#
+# EnergestTotals is the streaming form, for logs read line by line: it keeps the
+# period being read and the running totals of the complete ones, per node.
+
+ENERGEST_MODULE = 'Energest'
+TSCH_MODULE = 'TSCH'
+TSCH_JOINED = 'association done'
+TSCH_LEFT = 'leaving the network'
+
+ENERGEST_RE = (r'^(?:--- Period summary #(\d+) \((\d+) seconds\)'
+               r'|(Total time|CPU|Deep LPM|LPM|Radio Tx|Radio Rx)\s*:\s*(\d+))')
+
+ENERGEST_LINE = re.compile(ENERGEST_RE)
+
+# column of every Energest line name
+FIELDS = {
+    'Total time': 'total',
+    'CPU': 'cpu',
+    'LPM': 'lpm',
+    'Deep LPM': 'deep_lpm',
+    'Radio Tx': 'radio_tx',
+    'Radio Rx': 'radio_rx',
+}
+TICK_COLUMNS = list(FIELDS.values())
+TICK_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+# for charge calculations
+CC2650_MHZ = 48
+CC2650_RADIO_TX_CURRENT_MA = 9.100  # at 5 dBm, from CC2650 datasheet
+CC2650_RADIO_RX_CURRENT_MA = 5.900  # from CC2650 datasheet
+CC2650_RADIO_CPU_ON_CURRENT = 0.061 * CC2650_MHZ  # from CC2650 datasheet
+CC2650_RADIO_CPU_SLEEP_CURRENT = 1.335  # empirical
+CC2650_RADIO_CPU_DEEP_SLEEP_CURRENT = 0.010  # empirical
+
+###########################################
+
+# One row per period summary: node_id, period, timestamp (sec), seconds, the
+# ticks of every state, complete (all the lines of the block were seen) and
+# joined. joined and left are given per line: whether the node is TSCH-joined and
+# how many times it left the network before the line (see tsch_state). A period
+# is joined if its node was joined at the previous header and did not leave
+# since; without joined no period is, without left the leaves are not checked.
+def energest_periods(timestamps, node_ids, messages, joined=None, left=None):
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    fields = pd.Series(messages, dtype=object).str.extract(ENERGEST_RE)
+    is_header = fields[0].notna().to_numpy()
+    is_value = fields[2].notna().to_numpy()
+
+    # block of every line: the last header of the same node before it
+    order = np.argsort(node_ids, kind='stable')
+    block = np.cumsum(is_header[order]) - 1
+    headers = order[is_header[order]]
+    valid = block >= 0
+    valid[valid] = node_ids[headers[block[valid]]] == node_ids[order[valid]]
+
+    ticks = np.zeros((len(headers), len(TICK_COLUMNS)), dtype=np.int64)
+    seen = np.zeros((len(headers), len(TICK_COLUMNS)), dtype=bool)
+    values = valid & is_value[order]
+    rows = block[values]
+    columns = fields[2].map(TICK_INDEX).to_numpy()[order[values]].astype(np.int64)
+    ticks[rows, columns] = fields[3].to_numpy()[order[values]].astype(np.int64)
+    seen[rows, columns] = True
+
+    periods = pd.DataFrame({
+        'node_id': node_ids[headers],
+        'period': fields[0].to_numpy()[headers].astype(np.int64),
+        'timestamp': timestamps[headers],
+        'seconds': fields[1].to_numpy()[headers].astype(np.int64),
+    })
+    for i, column in enumerate(TICK_COLUMNS):
+        periods[column] = ticks[:, i]
+    periods['complete'] = seen.all(axis=1)
+    periods['joined'] = False
+    if joined is not None:
+        # previous header of the same node (headers are sorted by node, then line)
+        same = node_ids[headers[1:]] == node_ids[headers[:-1]]
+        previous, current = headers[:-1][same], headers[1:][same]
+        started_joined = np.asarray(joined, dtype=bool)[previous]
+        if left is not None:
+            left = np.asarray(left)
+            started_joined &= left[current] == left[previous]
+        flags = np.zeros(len(headers), dtype=bool)
+        flags[1:][same] = started_joined
+        periods['joined'] = flags
+    return periods
+
+# TSCH state of the node of every row in mask, from the "association done" and
+# "leaving the network" lines before it: (joined, number of leaves), one array each
+def tsch_state(log, mask):
+    tsch = log.is_module(TSCH_MODULE)
+    is_joined = log.contains(TSCH_JOINED, tsch)
+    events = np.flatnonzero(is_joined | log.contains(TSCH_LEFT, tsch))
+    rows = np.flatnonzero(mask)
+
+    # events sorted by node, then line; the last one of the node before every row
+    span = len(log) + 1
+    event_nodes = log.node_id[events].astype(np.int64)
+    order = np.lexsort((events, event_nodes))
+    keys = event_nodes[order] * span + events[order]
+    row_nodes = log.node_id[rows].astype(np.int64)
+    last = np.searchsorted(keys, row_nodes * span + rows) - 1
+    first = np.searchsorted(keys, row_nodes * span)
+
+    joined_events = is_joined[events[order]]
+    joined = np.zeros(len(rows), dtype=bool)
+    found = last >= first
+    joined[found] = joined_events[last[found]]
+    leaves = np.concatenate(([0], np.cumsum(~joined_events)))
+    return joined, leaves[last + 1] - leaves[first]
+
+# Add rdc (%) and charge (mC) to a frame of ticks: one row per period or per
+# node, or a dict of the totals of one node
+def add_energy(frame):
+    total = np.asarray(frame['total'], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ticks_per_second = total / np.asarray(frame['seconds'], dtype=np.float64)
+        frame['rdc'] = np.where(total > 0, 100.0 * (frame['radio_tx'] + frame['radio_rx']) / total, 0.0)
+        charge = (CC2650_RADIO_TX_CURRENT_MA * frame['radio_tx']
+                  + CC2650_RADIO_RX_CURRENT_MA * frame['radio_rx']
+                  + CC2650_RADIO_CPU_ON_CURRENT * frame['cpu']
+                  + CC2650_RADIO_CPU_SLEEP_CURRENT * frame['lpm']
+                  + CC2650_RADIO_CPU_DEEP_SLEEP_CURRENT * frame['deep_lpm']) / ticks_per_second
+    frame['charge'] = np.where(total > 0, charge, 0.0)
+    return frame
+
+# Per-period ticks, rdc and charge of the Energest lines of a log
+@stage(rows=len)
+def log_periods(log):
+    mask = log.is_module(ENERGEST_MODULE)
+    joined, left = tsch_state(log, mask)
+    periods = energest_periods(log.timestamp_us[mask] / US_PER_SEC, log.node_id[mask], log.message[mask],
+                               joined, left)
+    return add_energy(periods)
+
+# Per-node totals of the complete periods: ticks, seconds, periods, rdc and
+# charge, and rdc_joined, the RDC over the periods that started joined
+def node_energy(periods):
+    periods = periods[periods['complete']]
+    grouped = periods.groupby('node_id', sort=True)
+    nodes = grouped[['seconds'] + TICK_COLUMNS].sum()
+    nodes.insert(0, 'periods', grouped.size())
+    add_energy(nodes)
+    joined = periods[periods['joined']].groupby('node_id', sort=True)[['radio_tx', 'radio_rx', 'total']].sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rdc_joined = 100.0 * (joined['radio_tx'] + joined['radio_rx']) / joined['total']
+    nodes['rdc_joined'] = rdc_joined.reindex(nodes.index).fillna(0.0)
+    return nodes
+
+###########################################
+
+# Energest totals of one node, fed one line at a time. A period is added to the
+# totals as soon as all its lines were seen; like node_energy, incomplete
+# periods are left out. joined is the flag of the header line; a period counts
+# as joined if the node was joined at the header of the previous period and
+# leave() was not called since.
+class EnergestTotals:
+    __slots__ = ('ticks', 'seen', 'seconds', 'joined', 'next_joined',
+                 'periods', 'totals', 'joined_ticks')
+
+    def __init__(self):
+        # period being read, None before the first header or once added
+        self.ticks = None
+        self.seen = 0
+        self.seconds = 0
+        self.joined = False
+        self.next_joined = False
+        # totals of the complete periods: seconds and ticks, and the
+        # (radio_tx + radio_rx, total) ticks of the joined ones
+        self.periods = 0
+        self.totals = [0] * (len(TICK_COLUMNS) + 1)
+        self.joined_ticks = [0, 0]
+
+    def add_line(self, message, joined=False):
+        match = ENERGEST_LINE.match(message)
+        if match is None:
+            return
+        if match.group(1) is not None:
+            self.ticks = [0] * len(TICK_COLUMNS)
+            self.seen = 0
+            self.seconds = int(match.group(2))
+            self.joined = self.next_joined
+            self.next_joined = joined
+        elif self.ticks is not None:
+            column = TICK_INDEX[match.group(3)]
+            self.ticks[column] = int(match.group(4))
+            self.seen |= 1 << column
+            if self.seen == (1 << len(TICK_COLUMNS)) - 1:
+                self.add_period()
+
+    # the node left the network: the next period does not count as joined
+    def leave(self):
+        self.next_joined = False
+
+    def add_period(self):
+        ticks = self.ticks
+        self.periods += 1
+        self.totals[0] += self.seconds
+        for i, value in enumerate(ticks):
+            self.totals[i + 1] += value
+        if self.joined:
+            self.joined_ticks[0] += ticks[TICK_INDEX['Radio Tx']] + ticks[TICK_INDEX['Radio Rx']]
+            self.joined_ticks[1] += ticks[TICK_INDEX['Total time']]
+        self.ticks = None
+
+    # {periods, seconds, ticks..., rdc, charge, rdc_joined} like a row of
+    # node_energy, None before the first complete period
+    def energy(self):
+        if not self.periods:
+            return None
+        energy = dict(zip(['seconds'] + TICK_COLUMNS, self.totals), periods=self.periods)
+        add_energy(energy)
+        radio, total = self.joined_ticks
+        energy['rdc_joined'] = 100.0 * radio / total if total else 0.0
+        return energy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-period and per-node Energest ticks, radio duty cycle and CC2650 charge")
+    parser.add_argument("logfile")
+    parser.add_argument("-o", "--output", help="write the per-period rows to this CSV file")
+    args = parser.parse_args()
+
+    log = load_log(args.logfile)
+    report_malformed(log, args.logfile)
+    periods = log_periods(log)
+    print(f"{len(periods)} Energest periods of {periods['node_id'].nunique()} nodes")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(node_energy(periods).round(2).to_string())
+    if args.output:
+        periods.to_csv(args.output, index=False)
+        print(f"Energest periods saved to {args.output}")
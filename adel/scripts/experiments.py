@@ -0,0 +1,191 @@
+import argparse
+import glob
+import math
+import os
+import numpy as np
+import pandas as pd
+from log_cache import load_log
+from log_parser import report_malformed
+from parallel import map_shared
+from energest import log_periods, node_energy
+from parent_timeline import parent_timeline
+from round_trips import match_round_trips
+
+###########################################
+# Aggregation of the metrics of many runs (seeds) of the same scenario.
+#
+# A scenario is a set of logs, e.g. every seed of DFA_on at node 7. The logs
+# are analysed in parallel (one log per task, parallel.map_shared), and the
+# metrics of every run are merged as they arrive into streaming Welford
+# accumulators, per (scenario, node, metric) and network-wide. Only the per-run
+# values (one float per run and metric) are kept besides, for the bootstrap
+# confidence interval of the mean.
+
+NETWORK = 'network'
+
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_CONFIDENCE = 0.95
+
+###########################################
+
+# Streaming mean and variance; two accumulators merge with Chan's formula
+class Welford:
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if not n:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.n > 1 else math.nan
+
+# Percentile bootstrap confidence interval of the mean of values
+def bootstrap_ci(values, resamples=DEFAULT_BOOTSTRAP, confidence=DEFAULT_CONFIDENCE, rng=None):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return math.nan, math.nan
+    rng = rng if rng is not None else np.random.default_rng(0)
+    means = values[rng.integers(0, len(values), size=(resamples, len(values)))].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+###########################################
+# Metrics of one run
+
+# (network {metric: value}, per-node frame indexed by node_id) of one log
+def run_metrics(file_path):
+    log = load_log(file_path)
+    report_malformed(log, file_path)
+
+    trips = match_round_trips(log)
+    answered = trips['response_received'].notna()
+    by_destination = trips.assign(answered=answered).groupby('dst')
+    nodes = pd.DataFrame({
+        'app_pdr': by_destination['answered'].mean() * 100,
+        'round_trip': by_destination['round_trip'].mean(),
+    })
+    energy = node_energy(log_periods(log))
+    nodes = nodes.join(energy[['rdc', 'charge']], how='outer')
+    switches = pd.Series(parent_timeline(log).switches(), dtype=np.float64)
+    nodes['parent_switches'] = switches.reindex(nodes.index.union(switches.index)).fillna(0)
+    nodes.index.name = 'node_id'
+
+    network = {
+        'app_pdr': float(answered.mean() * 100) if len(trips) else math.nan,
+        'round_trip': float(trips['round_trip'].mean()),
+        'rdc': float(energy['rdc'].mean()) if len(energy) else math.nan,
+        'charge': float(energy['charge'].sum()) if len(energy) else math.nan,
+        'parent_switches': float(nodes['parent_switches'].sum()),
+    }
+    return network, nodes
+
+def _run_metrics(shared, item):
+    scenario, file_path = item
+    network, nodes = run_metrics(file_path)
+    return scenario, file_path, network, nodes
+
+###########################################
+
+class ScenarioAggregate:
+    def __init__(self):
+        self.runs = []
+        # (node, metric) -> Welford, and the per-run values for the bootstrap
+        self.stats = {}
+        self.values = {}
+
+    def add(self, key, value):
+        if value is None or math.isnan(value):
+            return
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = Welford()
+            self.values[key] = []
+        stats.add(value)
+        self.values[key].append(value)
+
+    def add_run(self, file_path, network, nodes):
+        self.runs.append(file_path)
+        for metric, value in network.items():
+            self.add((NETWORK, metric), value)
+        for node, row in zip(nodes.index.tolist(), nodes.to_numpy(dtype=np.float64)):
+            for metric, value in zip(nodes.columns, row):
+                self.add((node, metric), float(value))
+
+# {scenario: ScenarioAggregate} of the logs of every scenario, analysed with up to jobs processes
+def aggregate(scenarios, jobs=1):
+    aggregates = {scenario: ScenarioAggregate() for scenario in scenarios}
+    items = [(scenario, file_path) for scenario, files in scenarios.items() for file_path in files]
+    for scenario, file_path, network, nodes in map_shared(_run_metrics, items, None, jobs):
+        aggregates[scenario].add_run(file_path, network, nodes)
+    return aggregates
+
+# Long (scenario, node, metric, runs, mean, std, ci_low, ci_high) frame
+def summarize(aggregates, resamples=DEFAULT_BOOTSTRAP, confidence=DEFAULT_CONFIDENCE, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for scenario, aggregate in aggregates.items():
+        for (node, metric), stats in aggregate.stats.items():
+            low, high = bootstrap_ci(aggregate.values[(node, metric)], resamples, confidence, rng)
+            rows.append((scenario, node, metric, stats.n, stats.mean, stats.std, low, high))
+    summary = pd.DataFrame(rows, columns=['scenario', 'node', 'metric', 'runs', 'mean', 'std', 'ci_low', 'ci_high'])
+    # network rows first, then the nodes in order
+    summary['order'] = [-1 if node == NETWORK else node for node in summary['node']]
+    summary = summary.sort_values(['scenario', 'order', 'metric'], kind='stable').drop(columns='order')
+    return summary.reset_index(drop=True)
+
+# A scenario is NAME=GLOB, or a directory whose *.txt logs are the runs
+def parse_scenario(spec):
+    if '=' in spec:
+        name, pattern = spec.split('=', 1)
+        return name, sorted(glob.glob(pattern))
+    return os.path.basename(os.path.normpath(spec)), sorted(glob.glob(os.path.join(spec, '*.txt')))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mean and bootstrap confidence interval of the metrics of every scenario over its runs (seeds)")
+    parser.add_argument("scenarios", nargs="+",
+                        help="NAME=GLOB (e.g. 'DFA_7=logs/DFA_7_seed*.txt') or a directory of the logs of one scenario")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes (0: one per CPU)")
+    parser.add_argument("-b", "--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help="bootstrap resamples")
+    parser.add_argument("-c", "--confidence", type=float, default=DEFAULT_CONFIDENCE, help="confidence level of the intervals")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the bootstrap resampling")
+    parser.add_argument("-o", "--output", default="experiments_summary.csv", help="CSV of the per-node and network-wide results")
+    args = parser.parse_args()
+
+    scenarios = dict(parse_scenario(spec) for spec in args.scenarios)
+    for name, files in scenarios.items():
+        if not files:
+            parser.error(f"no logs for scenario {name}")
+
+    aggregates = aggregate(scenarios, args.jobs)
+    summary = summarize(aggregates, args.bootstrap, args.confidence, args.seed)
+    summary.to_csv(args.output, index=False)
+
+    level = round(args.confidence * 100)
+    for name, aggregate in aggregates.items():
+        print(f"\n{name}: {len(aggregate.runs)} runs")
+        network = summary[(summary['scenario'] == name) & (summary['node'] == NETWORK)]
+        for row in network.itertuples():
+            print(f"  {row.metric:16s} {row.mean:12.4f} ± {row.std:.4f}  {level}% CI [{row.ci_low:.4f}, {row.ci_high:.4f}]")
+    print(f"\nSummary saved to {args.output}")
@@ -1,75 +1,125 @@
+import argparse
 import os
+import numpy as np
 import pandas as pd
-import re
-import sys
 from collections import defaultdict
-import matplotlib.pyplot as plt
+from log_parser import match_first, count_by_node, report_malformed
+from log_cache import load_log
+from pcap_parser import rpl_events, control_msgs_from_events
+from plotting import grouped_chart, line_chart, save_chart, show_chart
+from resample import TimeBins, NodeSeries
 
-def extract_packet_info(log_data):
+CONTROL_PATTERNS = [
+    ('DIS', 'sending a DIS'),
+    ('DIO', 'sending a DIO'),
+    ('DAO', 'sending a DAO'),
+]
+
+MSG_TYPES = ['DIS', 'DIO', 'DAO']
+
+# metrics of the time series: the count of every message type per bin
+SERIES_METRICS = {msg_type: (msg_type, None, 1) for msg_type in MSG_TYPES}
+
+def extract_packet_info(log):
+    masks = match_first(log, CONTROL_PATTERNS)
     control_msgs = defaultdict(lambda: {'DIS': 0, 'DIO': 0, 'DAO': 0})
-    for line in log_data:
-        parts = line.strip().split('\t', 2)
-        if len(parts) == 3:
-            timestamp, node_id_str, message = parts
-            node_id = int(re.search(r'\d+', node_id_str).group())
-            if "sending a DIS" in message:
-                control_msgs[node_id]['DIS'] += 1
-            elif "sending a DIO" in message:
-                control_msgs[node_id]['DIO'] += 1
-            elif "sending a DAO" in message:
-                control_msgs[node_id]['DAO'] += 1
+    for msg_type in ['DIS', 'DIO', 'DAO']:
+        for node_id, count in count_by_node(log, masks[msg_type]).items():
+            control_msgs[node_id][msg_type] += count
     return control_msgs
 
-def analyze_log_file(file_path):
-    print(f"Analyzing log file: {file_path}")
-    with open(file_path, 'r') as file:
-        log_data = file.readlines()
+# Messages of every type per node and time bin of bin_seconds; events maps a
+# message type to the (node ids, timestamps in sec) of its messages
+def control_time_series(events, bin_seconds):
+    node_ids = np.concatenate([nodes for nodes, _ in events.values()])
+    timestamps = np.concatenate([times for _, times in events.values()])
+    bins = TimeBins.covering(node_ids, timestamps, bin_seconds)
+    sums = {msg_type: bins.counts(nodes, times) for msg_type, (nodes, times) in events.items()}
+    return NodeSeries(bins, sums, SERIES_METRICS)
 
-    # Extract control message information
-    control_msgs = extract_packet_info(log_data)
+# With bin_seconds, the per-node time series of the messages are returned as well (else None)
+def analyze_log_file(file_path, bin_seconds=None):
+    if file_path.endswith('.pcap'):
+        print(f"Analyzing capture: {file_path}")
+        rpl = rpl_events(file_path)
+        control_msgs = control_msgs_from_events(rpl)
+        types = rpl['type'].to_numpy()
+        events = {msg_type: (rpl['node_id'].to_numpy()[types == msg_type], rpl['timestamp'].to_numpy()[types == msg_type])
+                  for msg_type in MSG_TYPES}
+    else:
+        print(f"Analyzing log file: {file_path}")
+        log = load_log(file_path)
+        report_malformed(log, file_path)
 
-    return control_msgs
+        # Extract control message information
+        control_msgs = extract_packet_info(log)
+        masks = match_first(log, CONTROL_PATTERNS)
+        events = {msg_type: (log.node_id[masks[msg_type]], log.timestamp[masks[msg_type]]) for msg_type in MSG_TYPES}
+
+    series = control_time_series(events, bin_seconds) if bin_seconds else None
+    return control_msgs, series
 
-def generate_control_message_visualization(control_msgs_file1, control_msgs_file2, file1, file2, output_folder):
+def generate_control_message_visualization(control_msgs_file1, control_msgs_file2, file1, file2, output_folder, show=False):
     print(f"Generating control message visualizations")
     nodes = sorted(set(control_msgs_file1.keys()).union(set(control_msgs_file2.keys())))
     control_messages_file1 = {msg_type: [control_msgs_file1[node][msg_type] if node in control_msgs_file1 else 0 for node in nodes] for msg_type in ['DIS', 'DIO', 'DAO']}
     control_messages_file2 = {msg_type: [control_msgs_file2[node][msg_type] if node in control_msgs_file2 else 0 for node in nodes] for msg_type in ['DIS', 'DIO', 'DAO']}
     
-    plt.figure(figsize=(10, 6))
-    bar_width = 0.25
-    index = range(len(nodes))
-    
-    plt.bar(index, control_messages_file1['DIS'], bar_width, label=f'DIS {os.path.basename(file1)}', color='purple')
-    plt.bar([i + bar_width for i in index], control_messages_file2['DIS'], bar_width, label=f'DIS {os.path.basename(file2)}', color='orange')
-    plt.bar([i + 2 * bar_width for i in index], control_messages_file1['DIO'], bar_width, label=f'DIO {os.path.basename(file1)}', color='cyan')
-    plt.bar([i + 3 * bar_width for i in index], control_messages_file2['DIO'], bar_width, label=f'DIO {os.path.basename(file2)}', color='green')
-    plt.bar([i + 4 * bar_width for i in index], control_messages_file1['DAO'], bar_width, label=f'DAO {os.path.basename(file1)}', color='blue')
-    plt.bar([i + 5 * bar_width for i in index], control_messages_file2['DAO'], bar_width, label=f'DAO {os.path.basename(file2)}', color='red')
-    
-    plt.xlabel('Node')
-    plt.ylabel('Number of Control Messages')
-    plt.title('Control Messages Comparison')
-    plt.xticks([i + 2.5 * bar_width for i in index], nodes, rotation=90)
-    plt.legend()
-    plt.tight_layout()
+    name1 = os.path.basename(file1)
+    name2 = os.path.basename(file2)
+    groups = []
+    for msg_type, colors in [('DIS', ('purple', 'orange')), ('DIO', ('cyan', 'green')), ('DAO', ('blue', 'red'))]:
+        groups.append((f'{msg_type} {name1}', control_messages_file1[msg_type], colors[0]))
+        groups.append((f'{msg_type} {name2}', control_messages_file2[msg_type], colors[1]))
     output_path = os.path.join(output_folder, 'control_messages_comparison.png')
-    plt.savefig(output_path)
-    plt.show()  # Open the visual
+    chart = grouped_chart(output_path, nodes, groups, 'Control Messages Comparison', 'Number of Control Messages')
+    save_chart(chart)
     print(f"Visualization saved in {output_path}")
+    if show:
+        show_chart(chart)
+
+# Long (log, metric, node_id, bin, value) CSV of the time series of both files,
+# and the network-wide count of every message type over time
+def generate_time_series(series_file1, series_file2, file1, file2, output_folder, show=False):
+    frames = []
+    for file_path, series in [(file1, series_file1), (file2, series_file2)]:
+        frame = series.to_frame()
+        frame.insert(0, 'log', os.path.basename(file_path))
+        frames.append(frame)
+    csv_path = os.path.join(output_folder, 'control_messages_timeseries.csv')
+    pd.concat(frames, ignore_index=True).to_csv(csv_path, index=False)
+    print(f"Time series saved in {csv_path}")
 
-def main(file1, file2):
-    control_msgs_file1 = analyze_log_file(file1)
-    control_msgs_file2 = analyze_log_file(file2)
+    for msg_type in MSG_TYPES:
+        lines = []
+        for file_path, series in [(file1, series_file1), (file2, series_file2)]:
+            values = series.network(msg_type)
+            lines.append((os.path.basename(file_path), values.index, values))
+        output_path = os.path.join(output_folder, f'{msg_type}_timeseries.png')
+        chart = line_chart(output_path, lines, f'{msg_type} Messages over Time', 'Time (sec)',
+                           f'{msg_type} messages per {series_file1.bins.bin_seconds:g} s')
+        save_chart(chart)
+        print(f"Visualization saved in {output_path}")
+        if show:
+            show_chart(chart)
+
+def main(file1, file2, show=False, bin_seconds=None):
+    control_msgs_file1, series_file1 = analyze_log_file(file1, bin_seconds)
+    control_msgs_file2, series_file2 = analyze_log_file(file2, bin_seconds)
     
     output_folder = os.path.dirname(file1)
-    generate_control_message_visualization(control_msgs_file1, control_msgs_file2, file1, file2, output_folder)
+    generate_control_message_visualization(control_msgs_file1, control_msgs_file2, file1, file2, output_folder, show)
+    if bin_seconds:
+        generate_time_series(series_file1, series_file2, file1, file2, output_folder, show)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 script.py <log_file1> <log_file2>")
-        sys.exit(1)
-    
-    file1 = sys.argv[1]
-    file2 = sys.argv[2]
-    main(file1, file2)
+    parser = argparse.ArgumentParser(description="Compare the DIS/DIO/DAO messages sent per node in two COOJA logs or .pcap captures")
+    parser.add_argument("log_file1")
+    parser.add_argument("log_file2")
+    parser.add_argument("--show", action="store_true", help="also open the chart in a window")
+    parser.add_argument("-b", "--bin", type=float, metavar="SECONDS",
+                        help="also write the messages per node and time bin of SECONDS (control_messages_timeseries.csv) and chart them over time")
+    args = parser.parse_args()
+    if args.bin is not None and args.bin <= 0:
+        parser.error("--bin must be positive")
+    main(args.log_file1, args.log_file2, args.show, args.bin)
@@ -1,31 +1,36 @@
-import sys
-import re
+import argparse
 import pandas as pd
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from energest import energest_periods, add_energy
+from log_parser import report_malformed
+from log_cache import load_log
+from plotting import new_figure, finish_figure
+from profiling import stage
 
 def parse_log_file(file_path):
-    data = defaultdict(list)
-    with open(file_path, 'r') as file:
-        for line in file:
-            match = re.match(r'(?P<timestamp>\d+\.?\d*)\s+ID:(?P<id>\d+)\s+\[(?P<level>INFO|WARN|ERROR):\s*(?P<source>.*?)\s*\]\s*(?P<message>.*)', line)
-            if match:
-                data['timestamp'].append(float(match.group('timestamp')))
-                data['id'].append(int(match.group('id')))
-                data['level'].append(match.group('level'))
-                data['source'].append(match.group('source').strip())
-                data['message'].append(match.group('message').strip())
-    return pd.DataFrame(data)
+    log = load_log(file_path)
+    report_malformed(log, file_path)
+    df = log.to_frame()
+    df = df[df['level'].isin(['INFO', 'WARN', 'ERROR'])]
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy(),
+        'id': df['node_id'].to_numpy(),
+        'level': df['level'].astype(str).to_numpy(),
+        'source': df['module'].astype(str).to_numpy(),
+        'message': df['message'].str.strip().to_numpy(),
+    })
 
+@stage(rows=len)
 def calculate_metrics(df):
     nodes = df['id'].unique()
+    rdc = calculate_rdc(df)
     metrics = defaultdict(dict)
     for node in nodes:
         node_df = df[df['id'] == node]
         metrics[node]['PDR'] = calculate_pdr(node_df)
         metrics[node]['Parent Changes'] = calculate_parent_changes(node_df)
         metrics[node]['Ack Rate'] = calculate_ack_rate(node_df)
-        metrics[node]['RDC'] = calculate_rdc(node_df)
+        metrics[node]['RDC'] = rdc.get(node, 0)
     metrics_df = pd.DataFrame(metrics).T
     metrics_df.index.name = 'Node'
     metrics_df = metrics_df.sort_index()
@@ -45,19 +50,16 @@ def calculate_ack_rate(df):
     ack_packets = df[df['message'].str.contains('received a unicast-DIO')].shape[0]
     return ack_packets / sent_packets if sent_packets > 0 else 0
 
+# {node: mean radio duty cycle (fraction) of its complete Energest periods}
 def calculate_rdc(df):
-    energest_df = df[df['message'].str.contains('Period summary')]
-    rdc_sum = 0
-    for index, row in energest_df.iterrows():
-        match = re.search(r'Radio total\s*:\s*(\d+)/\s*(\d+)', row['message'])
-        if match:
-            radio_active_time = int(match.group(1))
-            total_time = int(match.group(2))
-            rdc_sum += (radio_active_time / total_time) if total_time > 0 else 0
-    return rdc_sum / energest_df.shape[0] if energest_df.shape[0] > 0 else 0
+    energest_df = df[df['source'] == 'Energest']
+    periods = add_energy(energest_periods(energest_df['timestamp'], energest_df['id'], energest_df['message']))
+    periods = periods[periods['complete']]
+    return (periods.groupby('node_id')['rdc'].mean() / 100).to_dict()
 
-def visualize_metrics(metrics_df, output_image_path):
-    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+def visualize_metrics(metrics_df, output_image_path, show=False):
+    fig = new_figure((14, 10), show)
+    axes = fig.subplots(2, 2)
     metrics_df['PDR'].plot(kind='bar', ax=axes[0, 0], title='End-to-end Packet Delivery Ratio (PDR)')
     metrics_df['Parent Changes'].plot(kind='bar', ax=axes[0, 1], title='Number of Routing Parent Changes')
     metrics_df['Ack Rate'].plot(kind='bar', ax=axes[1, 0], title='Packet Acknowledgement Rate')
@@ -68,18 +70,17 @@ def visualize_metrics(metrics_df, output_image_path):
         ax.set_ylabel('Value')
         ax.set_xticklabels(metrics_df.index, rotation=0)
     
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.suptitle('Metrics per Node', fontsize=16)
-    plt.subplots_adjust(top=0.92)
-    plt.savefig(output_image_path)
-    plt.show()
+    fig.tight_layout(rect=[0, 0, 1, 0.96])
+    fig.suptitle('Metrics per Node', fontsize=16)
+    fig.subplots_adjust(top=0.92)
+    finish_figure(fig, output_image_path, show)
 
 def save_metrics_summary(metrics_df, output_summary_path):
     with open(output_summary_path, 'w') as f:
         f.write("Metrics extracted from the log file:\n")
         f.write(metrics_df.to_string())
 
-def main(file_path):
+def main(file_path, show=False):
     df = parse_log_file(file_path)
     print("Parsed log data:")
     print(df.head())
@@ -93,14 +94,14 @@ def main(file_path):
     output_summary_path = f"{log_dir}/metrics_summary.txt"
     
     print("\nGenerating visualization and saving output...")
-    visualize_metrics(metrics_df, output_image_path)
+    visualize_metrics(metrics_df, output_image_path, show)
     save_metrics_summary(metrics_df, output_summary_path)
     print(f"Visualization saved to {output_image_path}")
     print(f"Summary saved to {output_summary_path}")
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python3 metrics_visualization_script.py path/to/file")
-        sys.exit(1)
-    file_path = sys.argv[1]
-    main(file_path)
+    parser = argparse.ArgumentParser(description="Per-node PDR, parent changes, ack rate and RDC of a COOJA log")
+    parser.add_argument("file_path", help="COOJA log file")
+    parser.add_argument("--show", action="store_true", help="also open the chart in a window")
+    args = parser.parse_args()
+    main(args.file_path, args.show)
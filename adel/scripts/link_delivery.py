@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from log_parser import match_first, extract_fields
+from profiling import stage
+
+###########################################
+# Link-layer delivery of unicast TSCH frames.
+#
+# Three TSCH lines describe a frame:
+#
+#   <src>  send packet to LL-<dst> with seqno <seqno>, queue ...       queued
+#   <src>  packet sent to LL-<dst>, seqno <seqno>, status <s>, tx <n>  done after n attempts
+#   <dst>  received from LL-<src> with seqno <seqno>                   received
+#
+# The fields of all the rows of one kind are extracted in bulk, and the
+# completions and receptions are joined to the queued frames with merge_asof on
+# (src, dst, seqno): the MAC sequence number is 8 bits and wraps around, but a
+# sender only reuses it 256 frames later, so the frame seen is the latest one
+# queued with the same key at or before the line. Broadcast frames (LL-0000 /
+# LL-NULL, received with seqno 65535) cannot be matched and are left out.
+
+TSCH_MODULE = 'TSCH'
+
+FRAME_PATTERNS = [
+    ('queued', 'send packet to LL-'),
+    ('done', 'packet sent to LL-'),
+    ('received', 'received from LL-'),
+]
+
+QUEUED_RE = r'send packet to LL-(\w+) with seqno (\d+)'
+DONE_RE = r'packet sent to LL-(\w+), seqno (\d+), status (\d+), tx (\d+)'
+RECEIVED_RE = r'received from LL-(\w+) with seqno (\d+)'
+
+BROADCAST = 0
+SEQNO_MODULO = 256
+MAC_TX_OK = 0
+
+LINK_COLUMNS = ['sent', 'delivered', 'duplicates', 'acked', 'failed',
+                'transmissions', 'retransmissions', 'delivery_ratio']
+
+###########################################
+
+# (queued, done, received) frames of the unicast TSCH frames, each with
+# timestamp_us, src, dst and seqno; done adds status and tx
+@stage(rows=lambda frames: sum(len(frame) for frame in frames))
+def tsch_frames(log):
+    masks = match_first(log, FRAME_PATTERNS)
+    tsch = log.is_module(TSCH_MODULE)
+
+    queued = extract_fields(log, masks['queued'] & tsch, QUEUED_RE, ['dst', 'seqno'])
+    queued = queued.rename(columns={'node_id': 'src'})
+    done = extract_fields(log, masks['done'] & tsch, DONE_RE, ['dst', 'seqno', 'status', 'tx'])
+    done = done.rename(columns={'node_id': 'src'})
+    received = extract_fields(log, masks['received'] & tsch, RECEIVED_RE, ['src', 'seqno'])
+    received = received.rename(columns={'node_id': 'dst'})
+
+    queued = queued[(queued['dst'] > BROADCAST) & (queued['seqno'] < SEQNO_MODULO)]
+    done = done[(done['dst'] > BROADCAST) & (done['seqno'] < SEQNO_MODULO)]
+    received = received[(received['src'] > BROADCAST) & (received['seqno'] < SEQNO_MODULO)]
+    return queued, done, received
+
+# Index (row of queued) of the frame every event refers to, or -1
+def match_frames(queued, events):
+    if events.empty:
+        return np.empty(0, dtype=np.int64)
+    if queued.empty:
+        return np.full(len(events), -1, dtype=np.int64)
+    keys = ['src', 'dst', 'seqno']
+    left = events[['timestamp_us'] + keys].assign(order=np.arange(len(events))).sort_values('timestamp_us', kind='stable')
+    right = queued[['timestamp_us'] + keys].assign(frame=np.arange(len(queued))).sort_values('timestamp_us', kind='stable')
+    matched = pd.merge_asof(left, right, on='timestamp_us', by=keys, direction='backward')
+    frames = np.empty(len(events), dtype=np.int64)
+    frames[matched['order'].to_numpy()] = matched['frame'].fillna(-1).astype(np.int64).to_numpy()
+    return frames
+
+# One row per queued unicast frame: src, dst, seqno, timestamp_us, receptions
+# (0 if lost, more than 1 for duplicates), status and tx of its completion (-1 if none)
+def frame_outcomes(queued, done, received):
+    frames = queued[['timestamp_us', 'src', 'dst', 'seqno']].reset_index(drop=True)
+    n = len(frames)
+
+    of_reception = match_frames(queued, received)
+    frames['receptions'] = np.bincount(of_reception[of_reception >= 0], minlength=n)[:n]
+
+    of_done = match_frames(queued, done)
+    status = np.full(n, -1, dtype=np.int64)
+    tx = np.full(n, -1, dtype=np.int64)
+    matched = of_done >= 0
+    # a frame has a single completion; if the log holds more, the last one wins
+    status[of_done[matched]] = done['status'].to_numpy()[matched]
+    tx[of_done[matched]] = done['tx'].to_numpy()[matched]
+    frames['status'] = status
+    frames['tx'] = tx
+    return frames
+
+# Per-link (src, dst) delivery: frames sent, delivered at least once, duplicate
+# receptions, acked / failed completions, transmission attempts and
+# retransmissions (attempts after the first one), and delivery_ratio (%)
+@stage(rows=len)
+def link_delivery(log):
+    frames = frame_outcomes(*tsch_frames(log))
+    attempts = frames['tx'].clip(lower=0)
+    frames = frames.assign(
+        sent=1,
+        delivered=(frames['receptions'] > 0).astype(np.int64),
+        duplicates=(frames['receptions'] - 1).clip(lower=0),
+        acked=(frames['status'] == MAC_TX_OK).astype(np.int64),
+        failed=(frames['status'] > MAC_TX_OK).astype(np.int64),
+        transmissions=attempts,
+        retransmissions=(attempts - 1).clip(lower=0),
+    )
+    links = frames.groupby(['src', 'dst'], sort=True)[LINK_COLUMNS[:-1]].sum()
+    links['delivery_ratio'] = links['delivered'] / links['sent'] * 100
+    return links
+
+# src x dst matrix of one column of link_delivery, NaN for links without traffic
+def delivery_matrix(links, column='delivery_ratio'):
+    matrix = links[column].unstack('dst')
+    nodes = sorted(set(matrix.index) | set(matrix.columns))
+    return matrix.reindex(index=nodes, columns=nodes)
+
+# Links from or to a node
+def node_links(links, node):
+    src = links.index.get_level_values('src')
+    dst = links.index.get_level_values('dst')
+    return links[(src == node) | (dst == node)]
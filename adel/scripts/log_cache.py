@@ -0,0 +1,141 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+from log_parser import parse_log, log_lines, LogTable, MessageBlob
+from profiling import stage
+
+###########################################
+# Binary cache of parsed logs.
+#
+# The parsed table of <log> is stored next to it in <log>.cache/ as one .npy
+# file per column plus the raw message bytes, so later runs memory-map it
+# instead of parsing the text again. The cache is keyed by the size, mtime and
+# content hash of the log; a log whose mtime changed but whose content did not
+# (e.g. after a copy) still hits the cache.
+
+# set RPL_LOG_CACHE=0 to always parse the text
+USE_CACHE = os.environ.get('RPL_LOG_CACHE', '1') != '0'
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.cache'
+
+COLUMNS = ['timestamp_us', 'node_id', 'level_codes', 'module_codes']
+MESSAGES_FILE = 'messages.bin'
+OFFSETS_FILE = 'message_offsets.npy'
+META_FILE = 'meta.json'
+
+###########################################
+
+def cache_dir(file_path):
+    return file_path + CACHE_SUFFIX
+
+def file_digest(file_path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_key(file_path):
+    st = os.stat(file_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+# Metadata of a cache or index directory, None if missing, unreadable or of another version
+def read_meta(directory, version=CACHE_VERSION):
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == version else None
+
+def write_meta(directory, meta):
+    tmp_path = os.path.join(directory, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+
+# Return the metadata of a sidecar directory (a cache of the given version, or the index of
+# pcap_index.py) if it matches the file, refreshing the stored mtime if only that changed
+def validate_cache(file_path, directory, version=CACHE_VERSION):
+    meta = read_meta(directory, version)
+    if meta is None:
+        return None
+    key = file_key(file_path)
+    if meta['size'] != key['size']:
+        return None
+    if meta['mtime_ns'] != key['mtime_ns']:
+        if meta['digest'] != file_digest(file_path):
+            return None
+        meta['mtime_ns'] = key['mtime_ns']
+        try:
+            write_meta(directory, meta)
+        except OSError:
+            pass
+    return meta
+
+###########################################
+
+def save_cache(file_path, log, digest=None):
+    directory = cache_dir(file_path)
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    meta = file_key(file_path)
+    meta.update({
+        'version': CACHE_VERSION,
+        'digest': digest or file_digest(file_path),
+        'rows': len(log),
+        'malformed': log.malformed,
+        'levels': log.levels,
+        'modules': log.modules,
+    })
+
+    blob = log.message_blob or MessageBlob.from_messages(log.message)
+    os.makedirs(tmp_directory, exist_ok=True)
+    try:
+        for column in COLUMNS:
+            np.save(os.path.join(tmp_directory, column + '.npy'), np.ascontiguousarray(getattr(log, column)))
+        np.save(os.path.join(tmp_directory, OFFSETS_FILE), blob.offsets)
+        with open(os.path.join(tmp_directory, MESSAGES_FILE), 'wb') as f:
+            f.write(blob.data)
+        write_meta(tmp_directory, meta)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_directory, directory)
+    finally:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+def open_cache(directory, meta):
+    columns = {column: np.load(os.path.join(directory, column + '.npy'), mmap_mode='r') for column in COLUMNS}
+    offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+    with open(os.path.join(directory, MESSAGES_FILE), 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b''
+    return LogTable(columns['timestamp_us'], columns['node_id'],
+                    columns['level_codes'], meta['levels'],
+                    columns['module_codes'], meta['modules'],
+                    MessageBlob(data, offsets), meta['malformed'])
+
+# Parsed table of a log, read from its cache when valid and written to it otherwise
+@stage(lines=log_lines)
+def load_log(file_path, use_cache=None):
+    if use_cache is None:
+        use_cache = USE_CACHE
+    if not use_cache:
+        return parse_log(file_path)
+
+    directory = cache_dir(file_path)
+    meta = validate_cache(file_path, directory) if os.path.isdir(directory) else None
+    if meta is not None:
+        try:
+            return open_cache(directory, meta)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    log = parse_log(file_path)
+    try:
+        save_cache(file_path, log)
+    except OSError as e:
+        print(f"Warning: could not cache {file_path}: {e}")
+    return log
@@ -0,0 +1,401 @@
+import argparse
+import heapq
+import random
+import sys
+
+###########################################
+# Synthetic COOJA logs for scale testing.
+#
+# A small event-driven model of the simulated network writes lines in the
+# format of my_log_func in sim_script.js:
+#
+#   <time in sec>\tID:<node>\t[<LEVEL>: <Module>] <message>
+#
+# Node 1 is the RPL root; every other mote n picks a parent among ids n/2 .. n-1
+# (a tree of logarithmic depth), sends DIS until it joins, then DIOs, DAOs (acknowledged by the root) and
+# answers the requests the root sends round-robin, hop by hop over TSCH.
+# Every mote prints an Energest summary each minute. Attacks of sim_script.js
+# write the same WARN markers and change what the target logs:
+#
+#   SFA_on  the target stops forwarding data packets
+#   SHA_on  the target advertises the root rank
+#   VNA_on  the target increments the DODAG version in every DIO
+#   DFA_on  the target sends a DIS every DFA_INTERVAL
+#   SYA_on  only the markers
+#
+# Lines come out in time order and are written in blocks, so the size of the
+# output is not limited by memory. Timers and the lines of later times wait in a
+# heap; the lines of the current time are written directly.
+
+US = 1000000
+
+ROOT = 1
+ROOT_RANK = 128
+HOP_RANK = 256
+INITIAL_VERSION = 240
+INFINITE_RANK = 65535
+
+BOOT_TIME = 32000                 # usec
+DIS_INTERVAL = (10 * US, 30 * US)
+JOIN_DELAY = (5 * US, 30 * US)    # per hop
+DIO_INTERVAL = (10 * US, 60 * US)
+DAO_INTERVAL = (60 * US, 120 * US)
+REQUEST_INTERVAL = 10 * US        # the root sends one request every REQUEST_INTERVAL
+ENERGEST_PERIOD = 60 * US
+PARENT_SWITCH_PROBABILITY = 0.05  # per DAO
+DFA_INTERVAL = 1 * US
+
+HOP_DELAY = (2000, 30000)         # usec per TSCH hop
+LINK_LOSS = 0.05                  # probability that a hop fails after MAX_TX transmissions
+MAX_TX = 3
+
+ATTACKS = ['SFA_on', 'SHA_on', 'VNA_on', 'DFA_on', 'SYA_on']
+
+FLUSH_LINES = 65536
+
+# timers
+DIS, JOIN, DIO, DAO, REQUEST, ENERGEST, ATTACK_START, ATTACK_STOP = range(1, 9)
+LINE = 0
+
+###########################################
+
+# time / 1000000 as JavaScript prints it
+def format_time(t_us):
+    seconds, frac = divmod(t_us, US)
+    if not frac:
+        return str(seconds)
+    return f"{seconds}.{frac:06d}".rstrip('0')
+
+def ll(node):
+    return f"LL-{node:04d}"
+
+def ip_ll(node):
+    return f"6L-{node:03d}"
+
+def ip_global(node):
+    return f"6G-{node:03d}"
+
+class Mote:
+    __slots__ = ('node', 'parent', 'children', 'depth', 'joined', 'rank', 'mac_seqno', 'dao_seqno',
+                 'version', 'energest_period', 'radio_us')
+
+    def __init__(self, node):
+        self.node = node
+        self.parent = None
+        self.children = set()
+        self.depth = 0
+        self.joined = node == ROOT
+        self.rank = ROOT_RANK if node == ROOT else INFINITE_RANK
+        self.mac_seqno = 0
+        self.dao_seqno = INITIAL_VERSION
+        self.version = INITIAL_VERSION
+        self.energest_period = 0
+        self.radio_us = 0
+
+    def next_mac_seqno(self):
+        self.mac_seqno = (self.mac_seqno + 1) % 256
+        return self.mac_seqno
+
+class Generator:
+    def __init__(self, motes, duration_us, attacks=(), seed=None):
+        self.random = random.Random(seed)
+        self.duration_us = duration_us
+        self.motes = {node: Mote(node) for node in range(1, motes + 1)}
+        # (name, target, start, stop) in usec
+        self.attacks = list(attacks)
+        self.active = set()
+        self.queue = []
+        self.seq = 0
+        # time of the event being handled, and the lines it logged for that time
+        self.now = 0
+        self.current = []
+        self.request_id = 0
+        self.request_target = ROOT
+
+        uniform = self.random.uniform
+        for mote in self.motes.values():
+            mote.mac_seqno = self.random.randrange(256)
+            self.schedule(BOOT_TIME + mote.node * 1000 + ENERGEST_PERIOD, ENERGEST, mote.node, ENERGEST_PERIOD)
+            if mote.node == ROOT:
+                self.schedule(BOOT_TIME + int(uniform(*DIO_INTERVAL)), DIO, ROOT)
+                self.schedule(BOOT_TIME + 10 * REQUEST_INTERVAL, REQUEST, ROOT)
+                continue
+            parent = self.random.randint(max(ROOT, mote.node // 2), mote.node - 1)
+            mote.parent = parent
+            mote.depth = self.motes[parent].depth + 1
+            self.schedule(BOOT_TIME + int(uniform(*DIS_INTERVAL)), DIS, mote.node)
+            self.schedule(BOOT_TIME + sum(int(uniform(*JOIN_DELAY)) for _ in range(mote.depth)), JOIN, mote.node)
+        for name, target, start, stop in self.attacks:
+            self.schedule(start, ATTACK_START, target, name)
+            self.schedule(stop, ATTACK_STOP, target, name)
+
+    def schedule(self, t_us, kind, node, payload=None):
+        self.seq += 1
+        heapq.heappush(self.queue, (t_us, self.seq, kind, node, payload))
+
+    def log(self, t_us, node, module, message, level='INFO'):
+        if t_us == self.now:
+            self.current.append((node, f"[{level}: {module:<10}] {message}"))
+        else:
+            self.schedule(t_us, LINE, node, f"[{level}: {module:<10}] {message}")
+
+    def attacked(self, name, node):
+        return (name, node) in self.active
+
+    # Yield the lines of the simulation, in time order
+    def lines(self):
+        queue = self.queue
+        handlers = {
+            DIS: self.on_dis, JOIN: self.on_join, DIO: self.on_dio, DAO: self.on_dao,
+            REQUEST: self.on_request, ENERGEST: self.on_energest,
+            ATTACK_START: self.on_attack_start, ATTACK_STOP: self.on_attack_stop,
+        }
+        current = self.current
+        time_text = format_time(self.now)
+        while queue:
+            t_us, _, kind, node, payload = heapq.heappop(queue)
+            if t_us > self.duration_us:
+                break
+            if t_us != self.now:
+                self.now = t_us
+                time_text = format_time(t_us)
+            if kind == LINE:
+                yield f"{time_text}\tID:{node}\t{payload}\n"
+            else:
+                handlers[kind](t_us, node, payload)
+                for node, line in current:
+                    yield f"{time_text}\tID:{node}\t{line}\n"
+                current.clear()
+
+    ###########################################
+    # one hop over TSCH; returns the arrival time, or None if the frame was lost
+
+    def hop(self, t_us, sender, receiver, payload_len=21):
+        mote = self.motes[sender]
+        seqno = mote.next_mac_seqno()
+        self.log(t_us, sender, 'TSCH', f"send packet to {ll(receiver)} with seqno {seqno}, queue 1/64 1/64, len {payload_len} 96")
+        tx = 1
+        while tx < MAX_TX and self.random.random() < LINK_LOSS * 4:
+            tx += 1
+        lost = tx == MAX_TX and self.random.random() < LINK_LOSS
+        t_us += tx * int(self.random.uniform(*HOP_DELAY))
+        status = 2 if lost else 0
+        mote.radio_us += tx * 4000
+        self.log(t_us, sender, 'TSCH', f"packet sent to {ll(receiver)}, seqno {seqno}, status {status}, tx {tx}")
+        self.log(t_us, sender, 'RPL', f"packet sent to {ll(receiver)}, status {status}, tx {tx}, new link metric {128 * tx + 128}")
+        if lost:
+            return None
+        self.log(t_us, receiver, 'TSCH', f"received from {ll(sender)} with seqno {seqno}")
+        self.motes[receiver].radio_us += 4000
+        return t_us
+
+    # Send a data packet from source to destination along the tree; returns the arrival time or None
+    def route(self, t_us, source, destination, path):
+        for sender, receiver in zip(path, path[1:]):
+            if sender != source:
+                if self.attacked('SFA_on', sender):
+                    return None
+                self.log(t_us, sender, 'IPv6', f"Forwarding packet to next hop {ip_global(receiver)}")
+            t_us = self.hop(t_us, sender, receiver, 58)
+            if t_us is None:
+                return None
+            self.log(t_us, receiver, 'IPv6', f"packet received from {ip_global(source)} to {ip_global(destination)}")
+        return t_us
+
+    def path_to_root(self, node):
+        path = [node]
+        while path[-1] != ROOT:
+            path.append(self.motes[path[-1]].parent)
+        return path
+
+    ###########################################
+
+    def on_dis(self, t_us, node, payload):
+        mote = self.motes[node]
+        if mote.joined and not self.attacked('DFA_on', node):
+            return
+        self.log(t_us, node, 'RPL', "sending a DIS to 6M-000")
+        if not mote.joined:
+            self.log(t_us, node, 'TSCH', "Cannot compute max payload size: not associated", 'WARN')
+        interval = DFA_INTERVAL if self.attacked('DFA_on', node) else int(self.random.uniform(*DIS_INTERVAL))
+        self.schedule(t_us + interval, DIS, node)
+
+    def on_join(self, t_us, node, payload):
+        mote = self.motes[node]
+        parent = self.motes[mote.parent]
+        if not parent.joined:
+            self.schedule(t_us + int(self.random.uniform(*JOIN_DELAY)), JOIN, node)
+            return
+        mote.joined = True
+        parent.children.add(node)
+        mote.rank = parent.rank + HOP_RANK + self.random.randrange(-64, 64)
+        self.log(t_us, node, 'TSCH', f"association done (1), sec 0, PAN ID 8921, asn-0.{t_us // 10000:x}, jp {mote.depth}, "
+                                     f"timeslot id 0, hopping id 0, slotframe len 0 with 0 links, from {ll(mote.parent)}")
+        self.log(t_us, node, 'TSCH Queue', f"update time source: LL-NULL -> {ll(mote.parent)}")
+        self.log(t_us, node, 'RPL', f"parent switch: 6A-NULL -> {ip_ll(mote.parent)}")
+        self.log(t_us, node, 'IPv6 Route', f"Add default: adding default route to {ip_ll(mote.parent)}")
+        self.schedule(t_us + int(self.random.uniform(*DIO_INTERVAL)), DIO, node)
+        self.schedule(t_us + int(self.random.uniform(*DAO_INTERVAL)) // 4, DAO, node)
+
+    def on_dio(self, t_us, node, payload):
+        mote = self.motes[node]
+        rank = ROOT_RANK if self.attacked('SHA_on', node) else mote.rank
+        if self.attacked('VNA_on', node):
+            mote.version = (mote.version + 1) % 256
+        self.log(t_us, node, 'RPL', f"sending a multicast-DIO with rank {rank} to 6M-000")
+        self.log(t_us, node, 'ICMPv6', "Sending ICMPv6 packet to 6M-000, type 155, code 1, len 72")
+        seqno = mote.next_mac_seqno()
+        self.log(t_us, node, 'TSCH', f"send packet to LL-0000 with seqno {seqno}, queue 1/64 2/64, len 14 94")
+        t_sent = t_us + int(self.random.uniform(*HOP_DELAY))
+        self.log(t_sent, node, 'TSCH', f"packet sent to LL-NULL, seqno {seqno}, status 0, tx 1")
+        neighbours = set(mote.children)
+        if mote.parent is not None:
+            neighbours.add(mote.parent)
+        for neighbour in sorted(neighbours):
+            self.log(t_sent, neighbour, 'IPv6', f"packet received from {ip_ll(node)} to 6M-000")
+            self.log(t_sent, neighbour, 'RPL', f"received a multicast-DIO from {ip_ll(node)}, instance_id 0, "
+                                               f"DAG ID {ip_global(ROOT)}, version {mote.version}, dtsn 240, rank {rank}")
+        self.schedule(t_us + int(self.random.uniform(*DIO_INTERVAL)), DIO, node)
+
+    def on_dao(self, t_us, node, payload):
+        mote = self.motes[node]
+        if self.random.random() < PARENT_SWITCH_PROBABILITY:
+            candidates = [n for n in range(max(ROOT, node // 2), node) if n != mote.parent and self.motes[n].joined]
+            if candidates:
+                old_parent = mote.parent
+                new_parent = self.random.choice(candidates)
+                self.motes[old_parent].children.discard(node)
+                self.motes[new_parent].children.add(node)
+                mote.parent = new_parent
+                self.log(t_us, node, 'RPL', f"parent switch: {ip_ll(old_parent)} -> {ip_ll(new_parent)}")
+                self.log(t_us, node, 'TSCH Queue', f"update time source: {ll(old_parent)} -> {ll(new_parent)}")
+
+        mote.dao_seqno = (mote.dao_seqno + 1) % 256
+        seqno = mote.dao_seqno
+        self.log(t_us, node, 'RPL', f"sending a DAO seqno {seqno}, tx count 1, lifetime 30, prefix {ip_global(node)} "
+                                    f"to {ip_global(ROOT)}, parent {ip_ll(mote.parent)}")
+        self.log(t_us, node, 'ICMPv6', f"Sending ICMPv6 packet to {ip_global(ROOT)}, type 155, code 2, len 46")
+        t_root = self.route(t_us, node, ROOT, self.path_to_root(node))
+        if t_root is not None:
+            self.log(t_root, ROOT, 'RPL', f"received a DAO from {ip_global(node)}, seqno {seqno}, lifetime 30, "
+                                          f"prefix {ip_global(node)}, prefix length 128, parent {ip_global(mote.parent)} ")
+            self.log(t_root, ROOT, 'RPL', f"sending a DAO-ACK seqno {seqno} to {ip_global(node)} with status 0")
+            t_back = self.route(t_root, ROOT, node, self.path_to_root(node)[::-1])
+            if t_back is not None:
+                self.log(t_back, node, 'RPL', f"received a DAO-ACK with seqno {seqno} ({seqno} {seqno}) and status 0 "
+                                              f"from {ip_global(ROOT)}")
+        self.schedule(t_us + int(self.random.uniform(*DAO_INTERVAL)), DAO, node)
+
+    def on_request(self, t_us, node, payload):
+        self.schedule(t_us + REQUEST_INTERVAL, REQUEST, ROOT)
+        joined = [n for n in self.motes if n != ROOT and self.motes[n].joined]
+        if not joined:
+            self.log(t_us, ROOT, 'App', f"Node count: 0/{len(self.motes)}")
+            return
+        # the next joined mote after the previous target
+        target = min((n for n in joined if n > self.request_target), default=joined[0])
+        self.request_target = target
+        request = self.request_id
+        self.request_id += 1
+        path = self.path_to_root(target)
+        self.log(t_us, ROOT, 'App', f"Sending request {request} to {ip_global(target)}")
+        t_arrival = self.route(t_us, ROOT, target, path[::-1])
+        if t_arrival is None:
+            return
+        self.log(t_arrival, target, 'App', f"Received request {request} from {ip_global(ROOT)}")
+        self.log(t_arrival, target, 'App', f"Sending response {request} to {ip_global(ROOT)}")
+        t_back = self.route(t_arrival, target, ROOT, path)
+        if t_back is not None:
+            self.log(t_back, ROOT, 'App', f"Received response {request} from {ip_global(target)}")
+
+    def on_energest(self, t_us, node, period_us):
+        mote = self.motes[node]
+        radio_rx = min(period_us, mote.radio_us + (period_us // 10 if mote.joined else period_us))
+        radio_tx = min(period_us - radio_rx, mote.radio_us // 2)
+        cpu = period_us // 50 if mote.joined else period_us
+        mote.radio_us = 0
+        lines = [
+            f"--- Period summary #{mote.energest_period} ({period_us // US} seconds)",
+            f"{'Total time':<12}: {period_us:10d}",
+        ]
+        for label, value in [('CPU', cpu), ('LPM', period_us - cpu), ('Deep LPM', 0),
+                             ('Radio Tx', radio_tx), ('Radio Rx', radio_rx), ('Radio total', radio_tx + radio_rx)]:
+            lines.append(f"{label:<12}: {value:10d}/{period_us:10d} ({value * 1000 // period_us} permil)")
+        for line in lines:
+            self.log(t_us, node, 'Energest', line)
+        mote.energest_period += 1
+        self.schedule(t_us + period_us, ENERGEST, node, period_us)
+
+    def on_attack_start(self, t_us, node, name):
+        self.active.add((name, node))
+        self.schedule(t_us, LINE, node, f"[WARN: {name} ] attack has started")
+        if name == 'DFA_on':
+            self.schedule(t_us + DFA_INTERVAL, DIS, node)
+
+    def on_attack_stop(self, t_us, node, name):
+        self.active.discard((name, node))
+        self.schedule(t_us, LINE, node, f"[WARN: {name} ] attack has stopped")
+
+###########################################
+
+def parse_size(text):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+# NAME:NODE:START:STOP, times in seconds, as the Attack(...) lines of sim_script.js
+def parse_attack(text):
+    try:
+        name, target, start, stop = text.split(':')
+        return name, int(target), int(float(start) * US), int(float(stop) * US)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME:NODE:START:STOP, got {text!r}")
+
+# Write the log of the generator to out, stopping after max_bytes if given; returns the bytes written
+def write_log(generator, out, max_bytes=None):
+    written = 0
+    block = []
+    for line in generator.lines():
+        block.append(line)
+        if len(block) >= FLUSH_LINES:
+            data = ''.join(block)
+            out.write(data)
+            written += len(data)
+            block = []
+            if max_bytes is not None and written >= max_bytes:
+                return written
+    data = ''.join(block)
+    out.write(data)
+    return written + len(data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic COOJA log in the format of sim_script.js")
+    parser.add_argument("-n", "--motes", type=int, default=16, help="number of motes, node 1 being the root")
+    parser.add_argument("-d", "--duration", type=float, help="simulated seconds (default 600, or unlimited with --size)")
+    parser.add_argument("-a", "--attack", type=parse_attack, action="append", default=[],
+                        help=f"NAME:NODE:START:STOP with NAME in {', '.join(ATTACKS)} and times in seconds (can be repeated)")
+    parser.add_argument("-s", "--size", type=parse_size,
+                        help="stop once about this many bytes are written (e.g. 500M, 10G); the duration is then unlimited unless given")
+    parser.add_argument("--seed", type=int, help="random seed, for reproducible logs")
+    parser.add_argument("-o", "--output", default="-", help="output file ('-' for stdout)")
+    args = parser.parse_args()
+    if args.motes < 2:
+        parser.error("at least 2 motes are needed")
+    for name, target, start, stop in args.attack:
+        if name not in ATTACKS:
+            parser.error(f"unknown attack {name}")
+        if not 1 <= target <= args.motes:
+            parser.error(f"attack target {target} is not a mote")
+
+    duration = args.duration
+    if duration is None:
+        duration = float('inf') if args.size is not None else 600
+    generator = Generator(args.motes, duration * US, args.attack, args.seed)
+    if args.output == '-':
+        write_log(generator, sys.stdout, args.size)
+    else:
+        with open(args.output, 'w') as out:
+            written = write_log(generator, out, args.size)
+        print(f"{written} bytes written to {args.output}")
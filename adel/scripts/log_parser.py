@@ -0,0 +1,246 @@
+import re
+import numpy as np
+import pandas as pd
+from profiling import stage
+
+###########################################
+# Shared parser for COOJA logs written by my_log_func in sim_script.js:
+#
+#   <time in sec>\tID:<node>\t[<LEVEL>: <Module>] <message>
+#
+# A log is streamed once and turned into typed columns: int64 microsecond
+# timestamps, integer node ids, categorical level/module codes and the message.
+
+LOG_LINE_RE = re.compile(r'(\d+(?:\.\d+)?)\tID:(-?\d+)\t\[(\w+):\s*([^\]]*?)\s*\]\s?(.*)')
+
+US_PER_SEC = 1000000
+
+###########################################
+
+# Messages stored back to back as UTF-8, each terminated by a newline.
+# data can be bytes or an mmap; offsets holds the start of every row plus the end.
+class MessageBlob:
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_messages(cls, messages):
+        data = ''.join(m + '\n' for m in messages).encode()
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+        offsets = np.concatenate(([0], ends)).astype(np.int64)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def strings(self):
+        messages = np.empty(len(self), dtype=object)
+        messages[:] = bytes(self.data[:self.offsets[-1]]).decode().split('\n')[:-1]
+        return messages
+
+    # boolean mask of the rows containing text, found by searching the raw bytes
+    def contains(self, text):
+        needle = re.compile(re.escape(text.encode()))
+        positions = np.fromiter((m.start() for m in needle.finditer(self.data)), dtype=np.int64)
+        found = np.zeros(len(self), dtype=bool)
+        found[np.searchsorted(self.offsets, positions, side='right') - 1] = True
+        return found
+
+###########################################
+
+class LogTable:
+    def __init__(self, timestamp_us, node_id, level_codes, levels, module_codes, modules, message, malformed=0):
+        self.timestamp_us = timestamp_us
+        self.node_id = node_id
+        self.level_codes = level_codes
+        self.levels = levels
+        self.module_codes = module_codes
+        self.modules = modules
+        self.malformed = malformed
+        # message is either an object array of str or a MessageBlob decoded on first use
+        if isinstance(message, MessageBlob):
+            self.message_blob = message
+            self._message = None
+        else:
+            self.message_blob = None
+            self._message = message
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = self.message_blob.strings()
+        return self._message
+
+    def __len__(self):
+        return len(self.timestamp_us)
+
+    # timestamps in seconds, as written in the log
+    @property
+    def timestamp(self):
+        return self.timestamp_us / US_PER_SEC
+
+    def level_code(self, level):
+        return self.levels.index(level) if level in self.levels else -1
+
+    def module_code(self, module):
+        return self.modules.index(module) if module in self.modules else -1
+
+    def is_module(self, module):
+        return self.module_codes == self.module_code(module)
+
+    # boolean mask of the rows whose message contains the given substring
+    def contains(self, text, mask=None):
+        if self._message is None:
+            found = self.message_blob.contains(text)
+            return found if mask is None else found & mask
+        messages = self.message if mask is None else self.message[mask]
+        found = np.fromiter((text in m for m in messages), dtype=bool, count=len(messages))
+        if mask is None:
+            return found
+        result = np.zeros(len(self), dtype=bool)
+        result[mask] = found
+        return result
+
+    def select(self, mask):
+        return LogTable(self.timestamp_us[mask], self.node_id[mask],
+                        self.level_codes[mask], self.levels,
+                        self.module_codes[mask], self.modules,
+                        self.message[mask], self.malformed)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'timestamp_us': self.timestamp_us,
+            'timestamp': self.timestamp,
+            'node_id': self.node_id,
+            'level': pd.Categorical.from_codes(self.level_codes, self.levels),
+            'module': pd.Categorical.from_codes(self.module_codes, self.modules),
+            'message': self.message,
+        })
+
+###########################################
+
+def parse_timestamp_us(ts):
+    return round(float(ts) * US_PER_SEC)
+
+# Parse a single line into (timestamp_us, node_id, level, module, message), or None if malformed
+def parse_line(line):
+    match = LOG_LINE_RE.match(line)
+    if match is None:
+        return None
+    ts, node_id, level, module, message = match.groups()
+    return parse_timestamp_us(ts), int(node_id), level, module, message.rstrip()
+
+# Stream the records of an open log; lines read and malformed lines are counted
+# in stats['lines'] and stats['malformed']
+def iter_log(lines, stats=None):
+    match_line = LOG_LINE_RE.match
+    malformed = 0
+    count = 0
+    try:
+        for count, line in enumerate(lines, 1):
+            match = match_line(line)
+            if match is None:
+                if line.strip():
+                    malformed += 1
+                continue
+            ts, node_id, level, module, message = match.groups()
+            yield parse_timestamp_us(ts), int(node_id), level, module, message.rstrip()
+    finally:
+        if stats is not None:
+            stats['lines'] = stats.get('lines', 0) + count
+            stats['malformed'] = stats.get('malformed', 0) + malformed
+
+def parse_lines(lines):
+    match_line = LOG_LINE_RE.match
+    timestamps = []
+    node_ids = []
+    level_codes = []
+    module_codes = []
+    messages = []
+    levels = {}
+    modules = {}
+    malformed = 0
+
+    for line in lines:
+        match = match_line(line)
+        if match is None:
+            if line.strip():
+                malformed += 1
+            continue
+        ts, node_id, level, module, message = match.groups()
+        timestamps.append(ts)
+        node_ids.append(node_id)
+        code = levels.get(level)
+        if code is None:
+            code = levels[level] = len(levels)
+        level_codes.append(code)
+        code = modules.get(module)
+        if code is None:
+            code = modules[module] = len(modules)
+        module_codes.append(code)
+        messages.append(message.rstrip())
+
+    timestamp_us = np.rint(np.array(timestamps, dtype=np.float64) * US_PER_SEC).astype(np.int64)
+    message_array = np.empty(len(messages), dtype=object)
+    message_array[:] = messages
+    return LogTable(timestamp_us,
+                    np.array(node_ids, dtype=np.int64),
+                    np.array(level_codes, dtype=np.int16), list(levels),
+                    np.array(module_codes, dtype=np.int16), list(modules),
+                    message_array, malformed)
+
+# Lines of the log a table was read from: its rows and the malformed lines (blank lines aside)
+def log_lines(table):
+    return len(table) + table.malformed
+
+@stage(lines=log_lines)
+def parse_log(file_path):
+    with open(file_path, 'r', errors='replace') as f:
+        return parse_lines(f)
+
+###########################################
+# Helpers shared by the analysis scripts
+
+# Classify rows the way an if/elif chain of substring checks would: every row
+# goes to the first pattern it matches. A pattern is a substring or a tuple of substrings.
+def match_first(table, patterns):
+    remaining = np.ones(len(table), dtype=bool)
+    masks = {}
+    for name, texts in patterns:
+        if isinstance(texts, str):
+            texts = (texts,)
+        mask = np.zeros(len(table), dtype=bool)
+        for text in texts:
+            mask |= table.contains(text, remaining & ~mask)
+        masks[name] = mask
+        remaining &= ~mask
+    return masks
+
+# (timestamp, node_id, message) frame of the selected rows, timestamps in seconds
+def events_frame(table, mask):
+    return pd.DataFrame({
+        'timestamp': table.timestamp[mask],
+        'node_id': table.node_id[mask],
+        'message': table.message[mask],
+    })
+
+# (row, timestamp_us, node_id, columns...) frame of the selected rows, row being
+# the position in the log and the columns the integer groups of pattern in the
+# message; -1 where a group is not a number, e.g. LL-NULL
+def extract_fields(table, mask, pattern, columns):
+    fields = pd.Series(table.message[mask], dtype=object).str.extract(pattern)
+    frame = pd.DataFrame({'row': np.flatnonzero(mask), 'timestamp_us': table.timestamp_us[mask], 'node_id': table.node_id[mask]})
+    for i, column in enumerate(columns):
+        frame[column] = pd.to_numeric(fields[i], errors='coerce').fillna(-1).astype(np.int64).to_numpy()
+    return frame
+
+# {node_id: number of selected rows}
+def count_by_node(table, mask):
+    nodes, counts = np.unique(table.node_id[mask], return_counts=True)
+    return {int(node): int(count) for node, count in zip(nodes, counts)}
+
+def report_malformed(table_or_count, file_path):
+    count = table_or_count if isinstance(table_or_count, int) else table_or_count.malformed
+    if count:
+        print(f"Warning: skipped {count} malformed lines in {file_path}")
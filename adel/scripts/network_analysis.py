@@ -1,119 +1,117 @@
+import argparse
 import os
+import numpy as np
 import pandas as pd
 import re
-import sys
 from collections import defaultdict
-import matplotlib.pyplot as plt
+from packet_matching import match_acks, summarize_latencies, per_node_metrics, binned_packet_sums
+from log_parser import match_first, events_frame, count_by_node, report_malformed
+from log_cache import load_log
+from parallel import map_shared
+import profiling
+from profiling import stage
+from plotting import comparison_chart, grouped_chart, line_chart, save_charts
+from resample import TimeBins, NodeSeries
 
-def extract_packet_info(log_data):
-    transmissions = []
-    acks = []
+PACKET_PATTERNS = [
+    ('sent', 'packet sent'),
+    ('ack', ('packet received', 'DAO-ACK')),
+    ('DIS', 'sending a DIS'),
+    ('DIO', 'sending a DIO'),
+    ('DAO', 'sending a DAO'),
+    ('rejoin', 'rejoined the DODAG'),
+    ('parent_changes', 'routing parent change'),
+    ('ack_rate', 'ack received from parent'),
+    ('rdc', 'radio duty cycle'),
+]
+
+RDC_RE = re.compile(r'(\d+(\.\d+)?)%')
+
+@stage(rows=lambda result: len(result[0]) + len(result[1]))
+def extract_packet_info(log, masks):
+    transmissions = events_frame(log, masks['sent'])
+    acks = events_frame(log, masks['ack'])
     control_msgs = defaultdict(lambda: {'DIS': 0, 'DIO': 0, 'DAO': 0, 'rejoin': 0, 'parent_changes': 0, 'ack_rate': 0, 'rdc': 0})
-    parent_changes = defaultdict(int)
-    for line in log_data:
-        parts = line.strip().split('\t', 2)
-        if len(parts) == 3:
-            timestamp, node_id_str, message = parts
-            node_id = int(re.search(r'\d+', node_id_str).group())
-            if "packet sent" in message:
-                transmissions.append((timestamp, node_id, message))
-            elif "packet received" in message or "DAO-ACK" in message:
-                acks.append((timestamp, node_id, message))
-            elif "sending a DIS" in message:
-                control_msgs[node_id]['DIS'] += 1
-            elif "sending a DIO" in message:
-                control_msgs[node_id]['DIO'] += 1
-            elif "sending a DAO" in message:
-                control_msgs[node_id]['DAO'] += 1
-            elif "rejoined the DODAG" in message:
-                control_msgs[node_id]['rejoin'] += 1
-            elif "routing parent change" in message:
-                control_msgs[node_id]['parent_changes'] += 1
-            elif "ack received from parent" in message:
-                control_msgs[node_id]['ack_rate'] += 1
-            elif "radio duty cycle" in message:
-                # Extract RDC percentage from message
-                rdc_match = re.search(r'(\d+(\.\d+)?)%', message)
-                if rdc_match:
-                    control_msgs[node_id]['rdc'] = float(rdc_match.group(1))
+    for msg_type in ['DIS', 'DIO', 'DAO', 'rejoin', 'parent_changes', 'ack_rate']:
+        for node_id, count in count_by_node(log, masks[msg_type]).items():
+            control_msgs[node_id][msg_type] += count
+    for node_id, message in zip(log.node_id[masks['rdc']], log.message[masks['rdc']]):
+        # Extract RDC percentage from message
+        rdc_match = RDC_RE.search(message)
+        if rdc_match:
+            control_msgs[int(node_id)]['rdc'] = float(rdc_match.group(1))
     return transmissions, acks, control_msgs
 
-def calculate_packet_delivery_ratio(transmissions, acks, time_window=1.0):
-    matched_acks = 0
-    for _, transmission in transmissions.iterrows():
-        matched_ack = acks[(acks['node_id'] == transmission['node_id']) & 
-                           (acks['timestamp'] >= transmission['timestamp']) & 
-                           (acks['timestamp'] <= transmission['timestamp'] + time_window)]
-        if not matched_ack.empty:
-            matched_acks += 1
-    total_transmissions = len(transmissions)
-    packet_delivery_ratio = (matched_acks / total_transmissions) * 100
-    return packet_delivery_ratio
+# metric -> (numerator, denominator, scale) over the binned sums of node_time_series,
+# named like the node_metrics columns
+SERIES_METRICS = {
+    'Packet Delivery Ratio': ('matched', 'transmissions', 100),
+    'Throughput (packets/sec)': ('per_second', None, 1),
+    'Average Latency (sec)': ('latency', 'matched', 1),
+    'DIS': ('DIS', None, 1),
+    'DIO': ('DIO', None, 1),
+    'DAO': ('DAO', None, 1),
+    'Rejoins': ('rejoin', None, 1),
+    'Parent Changes': ('parent_changes', None, 1),
+    'Ack Rate': ('ack_rate', None, 1),
+    'RDC (%)': ('rdc', 'rdc_reports', 1),
+}
+
+# Every metric per node and time bin of bin_seconds; the RDC of a bin is the mean of its reports
+@stage()
+def node_time_series(log, masks, df_transmissions, latencies, bin_seconds):
+    timestamps = log.timestamp
+    bins = TimeBins.covering(log.node_id, timestamps, bin_seconds)
+    sums = binned_packet_sums(bins, df_transmissions, latencies)
+    for msg_type in ['DIS', 'DIO', 'DAO', 'rejoin', 'parent_changes', 'ack_rate']:
+        sums[msg_type] = bins.counts(log.node_id[masks[msg_type]], timestamps[masks[msg_type]])
+
+    rdc = pd.to_numeric(pd.Series(log.message[masks['rdc']], dtype=object).str.extract(RDC_RE)[0]).to_numpy(dtype=np.float64)
+    reported = ~np.isnan(rdc)
+    rdc = rdc[reported]
+    rdc_nodes = log.node_id[masks['rdc']][reported]
+    rdc_timestamps = timestamps[masks['rdc']][reported]
+    sums['rdc'] = bins.sums(rdc_nodes, rdc_timestamps, rdc)
+    sums['rdc_reports'] = bins.counts(rdc_nodes, rdc_timestamps)
+    return NodeSeries(bins, sums, SERIES_METRICS)
 
 def calculate_throughput(transmissions, duration):
     total_packets = len(transmissions)
     throughput = total_packets / duration
     return throughput
 
-def calculate_latency(transmissions, acks):
-    latencies = []
-    for _, transmission in transmissions.iterrows():
-        ack = acks[(acks['node_id'] == transmission['node_id']) & 
-                   (acks['timestamp'] >= transmission['timestamp']) & 
-                   (acks['timestamp'] <= transmission['timestamp'] + 1.0)]
-        if not ack.empty:
-            latency = ack['timestamp'].min() - transmission['timestamp']
-            latencies.append(latency)
-    avg_latency = sum(latencies) / len(latencies) if latencies else 0
-    return avg_latency
-
-def analyze_node_behavior(df_transmissions, df_acks, control_msgs):
-    nodes = sorted(df_transmissions['node_id'].unique())
-    node_metrics = {}
-    for node in nodes:
-        node_transmissions = df_transmissions[df_transmissions['node_id'] == node]
-        node_acks = df_acks[df_acks['node_id'] == node]
-        
-        packet_delivery_ratio = calculate_packet_delivery_ratio(node_transmissions, node_acks)
-        duration = node_transmissions['timestamp'].max() - node_transmissions['timestamp'].min()
-        throughput = calculate_throughput(node_transmissions, duration)
-        avg_latency = calculate_latency(node_transmissions, node_acks)
-        control_msg_counts = control_msgs[node]
-        
-        node_metrics[node] = {
-            'Packet Delivery Ratio': packet_delivery_ratio,
-            'Throughput (packets/sec)': throughput,
-            'Average Latency (sec)': avg_latency,
-            'Control Messages': control_msg_counts,
-            'Rejoins': control_msgs[node]['rejoin'],
-            'Parent Changes': control_msgs[node]['parent_changes'],
-            'Ack Rate': control_msgs[node]['ack_rate'],
-            'RDC (%)': control_msgs[node]['rdc']
-        }
+@stage(rows=len)
+def analyze_node_behavior(df_transmissions, latencies, control_msgs):
+    metrics = per_node_metrics(df_transmissions, latencies)
+    node_metrics = pd.DataFrame({
+        'Packet Delivery Ratio': 100 - metrics['packet_loss_rate'],
+        'Throughput (packets/sec)': metrics['throughput'],
+        'Average Latency (sec)': metrics['avg_latency'],
+    })
+    node_metrics['Control Messages'] = [control_msgs[node] for node in node_metrics.index]
+    node_metrics['Rejoins'] = [control_msgs[node]['rejoin'] for node in node_metrics.index]
+    node_metrics['Parent Changes'] = [control_msgs[node]['parent_changes'] for node in node_metrics.index]
+    node_metrics['Ack Rate'] = [control_msgs[node]['ack_rate'] for node in node_metrics.index]
+    node_metrics['RDC (%)'] = [control_msgs[node]['rdc'] for node in node_metrics.index]
     return node_metrics
 
-def analyze_log_file(file_path):
+# With bin_seconds, the per-node time series of the metrics are returned as well (else None)
+@stage()
+def analyze_log_file(file_path, bin_seconds=None):
     print(f"Analyzing log file: {file_path}")
-    with open(file_path, 'r') as file:
-        log_data = file.readlines()
+    log = load_log(file_path)
+    report_malformed(log, file_path)
 
     # Extract packet information
-    transmissions_data, acks_data, control_msgs = extract_packet_info(log_data)
-
-    # Create DataFrames
-    columns = ['timestamp', 'node_id', 'message']
-    df_transmissions = pd.DataFrame(transmissions_data, columns=columns)
-    df_acks = pd.DataFrame(acks_data, columns=columns)
-
-    # Convert timestamps to floats for accurate calculations
-    df_transmissions['timestamp'] = df_transmissions['timestamp'].astype(float)
-    df_acks['timestamp'] = df_acks['timestamp'].astype(float)
+    masks = match_first(log, PACKET_PATTERNS)
+    df_transmissions, df_acks, control_msgs = extract_packet_info(log, masks)
 
     # Calculate overall metrics
-    packet_delivery_ratio = calculate_packet_delivery_ratio(df_transmissions, df_acks)
+    latencies = match_acks(df_transmissions, df_acks)
+    packet_loss_rate, avg_latency = summarize_latencies(latencies)
+    packet_delivery_ratio = 100 - packet_loss_rate
     duration = df_transmissions['timestamp'].max() - df_transmissions['timestamp'].min()
     throughput = calculate_throughput(df_transmissions, duration)
-    avg_latency = calculate_latency(df_transmissions, df_acks)
     
     overall_metrics = {
         'Packet Delivery Ratio': packet_delivery_ratio,
@@ -122,10 +120,15 @@ def analyze_log_file(file_path):
     }
 
     # Calculate per-node metrics
-    node_metrics = analyze_node_behavior(df_transmissions, df_acks, control_msgs)
+    node_metrics = analyze_node_behavior(df_transmissions, latencies, control_msgs)
+
+    series = None
+    if bin_seconds:
+        series = node_time_series(log, masks, df_transmissions, latencies, bin_seconds)
     
-    return overall_metrics, node_metrics
+    return overall_metrics, node_metrics, series
 
+@stage()
 def generate_report(overall_metrics, node_metrics, output_folder, attack_name):
     print(f"Generating report for: {attack_name}")
     os.makedirs(output_folder, exist_ok=True)
@@ -141,7 +144,7 @@ def generate_report(overall_metrics, node_metrics, output_folder, attack_name):
         
         log_file.write("\nNode-specific Metrics:\n")
         log_file.write("--------------------------\n")
-        ranked_nodes = sorted(node_metrics.items())
+        ranked_nodes = sorted(node_metrics.to_dict('index').items())
         for node, metrics in ranked_nodes:
             log_file.write(f"\nNode {node}:\n")
             for metric, value in metrics.items():
@@ -154,150 +157,107 @@ def generate_report(overall_metrics, node_metrics, output_folder, attack_name):
     
     return log_file_path
 
-def generate_comparison_visualizations(node_metrics_no_attack, node_metrics_attack, attack_name, output_folder):
+# (column, file name prefix, y label, title) of the per-node comparison charts
+COMPARISON_CHARTS = [
+    ('Packet Delivery Ratio', 'packet_delivery_ratio', 'Packet Delivery Ratio (%)', 'Packet Delivery Ratio Comparison'),
+    ('Throughput (packets/sec)', 'throughput', 'Throughput (packets/sec)', 'Throughput Comparison'),
+    ('Average Latency (sec)', 'latency', 'Average Latency (sec)', 'Average Latency Comparison'),
+    ('Rejoins', 'rejoins', 'Number of Rejoins', 'Rejoins Comparison'),
+    ('Parent Changes', 'parent_changes', 'Number of Parent Changes', 'Parent Changes Comparison'),
+    ('Ack Rate', 'ack_rate', 'Ack Rate', 'Ack Rate Comparison'),
+    ('RDC (%)', 'rdc', 'RDC (%)', 'RDC Comparison'),
+]
+
+# Long (log, metric, node_id, bin, value) CSV of the time series of both logs
+@stage()
+def write_time_series(series_no_attack, series_attack, attack_name, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    frames = []
+    for name, series in [('No Attack', series_no_attack), (attack_name, series_attack)]:
+        frame = series.to_frame()
+        frame.insert(0, 'log', name)
+        frames.append(frame)
+    csv_path = os.path.join(output_folder, f'{attack_name}_timeseries.csv')
+    pd.concat(frames, ignore_index=True).to_csv(csv_path, index=False)
+    return csv_path
+
+# Network-wide value of every comparison metric per time bin, without and with the attack
+def time_series_charts(series_no_attack, series_attack, attack_name, output_folder):
+    charts = []
+    for column, prefix, ylabel, title in COMPARISON_CHARTS:
+        lines = []
+        for name, series in [('No Attack', series_no_attack), (attack_name, series_attack)]:
+            values = series.network(column)
+            lines.append((name, values.index, values))
+        charts.append(line_chart(os.path.join(output_folder, f'{prefix}_timeseries_{attack_name}.png'),
+                                 lines, f'{title} over Time', 'Time (sec)', ylabel))
+    return charts
+
+# With the time series of both logs, the charts of the metrics over time are added
+@stage()
+def generate_comparison_visualizations(node_metrics_no_attack, node_metrics_attack, attack_name, output_folder, jobs=1, pdf=False,
+                                       series_no_attack=None, series_attack=None):
     print(f"Generating comparison visualizations for: {attack_name}")
-    nodes = sorted(node_metrics_no_attack.keys())
-    packet_delivery_ratios_no_attack = [node_metrics_no_attack[node]['Packet Delivery Ratio'] for node in nodes]
-    throughputs_no_attack = [node_metrics_no_attack[node]['Throughput (packets/sec)'] for node in nodes]
-    latencies_no_attack = [node_metrics_no_attack[node]['Average Latency (sec)'] for node in nodes]
-    control_messages_no_attack = {msg_type: [node_metrics_no_attack[node]['Control Messages'][msg_type] for node in nodes] for msg_type in ['DIS', 'DIO', 'DAO']}
-    rejoins_no_attack = [node_metrics_no_attack[node]['Rejoins'] for node in nodes]
-    parent_changes_no_attack = [node_metrics_no_attack[node]['Parent Changes'] for node in nodes]
-    ack_rate_no_attack = [node_metrics_no_attack[node]['Ack Rate'] for node in nodes]
-    rdc_no_attack = [node_metrics_no_attack[node]['RDC (%)'] for node in nodes]
-    
-    packet_delivery_ratios_attack = [node_metrics_attack[node]['Packet Delivery Ratio'] for node in nodes]
-    throughputs_attack = [node_metrics_attack[node]['Throughput (packets/sec)'] for node in nodes]
-    latencies_attack = [node_metrics_attack[node]['Average Latency (sec)'] for node in nodes]
-    control_messages_attack = {msg_type: [node_metrics_attack[node]['Control Messages'][msg_type] for node in nodes] for msg_type in ['DIS', 'DIO', 'DAO']}
-    rejoins_attack = [node_metrics_attack[node]['Rejoins'] for node in nodes]
-    parent_changes_attack = [node_metrics_attack[node]['Parent Changes'] for node in nodes]
-    ack_rate_attack = [node_metrics_attack[node]['Ack Rate'] for node in nodes]
-    rdc_attack = [node_metrics_attack[node]['RDC (%)'] for node in nodes]
-    
-    # Packet Delivery Ratio comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, packet_delivery_ratios_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, packet_delivery_ratios_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Packet Delivery Ratio (%)')
-    plt.title('Packet Delivery Ratio Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'packet_delivery_ratio_comparison_{attack_name}.png'))
-    
-    # Throughput comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, throughputs_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, throughputs_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Throughput (packets/sec)')
-    plt.title('Throughput Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'throughput_comparison_{attack_name}.png'))
-    
-    # Average Latency comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, latencies_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, latencies_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Average Latency (sec)')
-    plt.title('Average Latency Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'latency_comparison_{attack_name}.png'))
-    
-    # Control Messages comparison
-    plt.figure(figsize=(10, 6))
-    bar_width = 0.25
-    index = range(len(nodes))
-    
-    plt.bar(index, control_messages_no_attack['DIS'], bar_width, label='DIS No Attack', color='purple')
-    plt.bar([i + bar_width for i in index], control_messages_attack['DIS'], bar_width, label=f'DIS {attack_name}', color='orange')
-    plt.bar([i + 2 * bar_width for i in index], control_messages_no_attack['DIO'], bar_width, label='DIO No Attack', color='cyan')
-    plt.bar([i + 3 * bar_width for i in index], control_messages_attack['DIO'], bar_width, label=f'DIO {attack_name}', color='green')
-    plt.bar([i + 4 * bar_width for i in index], control_messages_no_attack['DAO'], bar_width, label='DAO No Attack', color='blue')
-    plt.bar([i + 5 * bar_width for i in index], control_messages_attack['DAO'], bar_width, label=f'DAO {attack_name}', color='red')
-    
-    plt.xlabel('Node')
-    plt.ylabel('Number of Control Messages')
-    plt.title('Control Messages Comparison')
-    plt.xticks([i + 2.5 * bar_width for i in index], nodes, rotation=90)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'control_messages_comparison_{attack_name}.png'))
-    
-    # Rejoins comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, rejoins_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, rejoins_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Number of Rejoins')
-    plt.title('Rejoins Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'rejoins_comparison_{attack_name}.png'))
-    
-    # Parent Changes comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, parent_changes_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, parent_changes_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Number of Parent Changes')
-    plt.title('Parent Changes Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'parent_changes_comparison_{attack_name}.png'))
-    
-    # Ack Rate comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, ack_rate_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, ack_rate_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('Ack Rate')
-    plt.title('Ack Rate Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'ack_rate_comparison_{attack_name}.png'))
-    
-    # RDC comparison
-    plt.figure(figsize=(10, 6))
-    plt.bar(nodes, rdc_no_attack, width=0.4, label='No Attack', align='center')
-    plt.bar(nodes, rdc_attack, width=0.4, label=attack_name, align='edge')
-    plt.xlabel('Node')
-    plt.ylabel('RDC (%)')
-    plt.title('RDC Comparison')
-    plt.legend()
-    plt.xticks(rotation=90)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, f'rdc_comparison_{attack_name}.png'))
+    nodes = sorted(node_metrics_no_attack.index)
+    no_attack = node_metrics_no_attack.loc[nodes]
+    attack = node_metrics_attack.loc[nodes]
+
+    charts = [comparison_chart(os.path.join(output_folder, f'{prefix}_comparison_{attack_name}.png'),
+                               nodes, no_attack[column], attack[column], attack_name, title, ylabel)
+              for column, prefix, ylabel, title in COMPARISON_CHARTS]
+
+    groups = []
+    for msg_type, colors in [('DIS', ('purple', 'orange')), ('DIO', ('cyan', 'green')), ('DAO', ('blue', 'red'))]:
+        groups.append((f'{msg_type} No Attack', [counts[msg_type] for counts in no_attack['Control Messages']], colors[0]))
+        groups.append((f'{msg_type} {attack_name}', [counts[msg_type] for counts in attack['Control Messages']], colors[1]))
+    charts.insert(3, grouped_chart(os.path.join(output_folder, f'control_messages_comparison_{attack_name}.png'),
+                                   nodes, groups, 'Control Messages Comparison', 'Number of Control Messages'))
+    if series_no_attack is not None and series_attack is not None:
+        charts.extend(time_series_charts(series_no_attack, series_attack, attack_name, output_folder))
+
+    pdf_path = os.path.join(output_folder, f'comparison_{attack_name}.pdf') if pdf else None
+    save_charts(charts, jobs, pdf_path)
 
-def process_files_in_directory(directory):
+# shared is (node metrics of the no-attack log, plot jobs, pdf, time series of the no-attack log or None)
+def process_attack_file(shared, file_path):
+    node_metrics_no_attack, plot_jobs, pdf, series_no_attack = shared
+    directory, file_name = os.path.split(file_path)
+    base_name = os.path.splitext(file_name)[0]
+    output_folder = os.path.join(directory, f'no_attack_&_{base_name}')
+    bin_seconds = series_no_attack.bins.bin_seconds if series_no_attack is not None else None
+    overall_metrics_attack, node_metrics_attack, series_attack = analyze_log_file(file_path, bin_seconds)
+    generate_report(overall_metrics_attack, node_metrics_attack, output_folder, base_name)
+    if series_attack is not None:
+        write_time_series(series_no_attack, series_attack, base_name, output_folder)
+    generate_comparison_visualizations(node_metrics_no_attack, node_metrics_attack, base_name, output_folder, plot_jobs, pdf,
+                                       series_no_attack, series_attack)
+    return f"Processed {file_name}, output saved in {output_folder}"
+
+def process_files_in_directory(directory, jobs=1, pdf=False, bin_seconds=None):
     no_attack_file = os.path.join(directory, 'normal.txt')
-    overall_metrics_no_attack, node_metrics_no_attack = analyze_log_file(no_attack_file)
+    overall_metrics_no_attack, node_metrics_no_attack, series_no_attack = analyze_log_file(no_attack_file, bin_seconds)
     
-    for file_name in os.listdir(directory):
-        if file_name.endswith('.txt') and file_name != 'normal.txt':
-            file_path = os.path.join(directory, file_name)
-            base_name = os.path.splitext(file_name)[0]
-            output_folder = os.path.join(directory, f'no_attack_&_{base_name}')
-            overall_metrics_attack, node_metrics_attack = analyze_log_file(file_path)
-            generate_report(overall_metrics_attack, node_metrics_attack, output_folder, base_name)
-            generate_comparison_visualizations(node_metrics_no_attack, node_metrics_attack, base_name, output_folder)
-            print(f"Processed {file_name}, output saved in {output_folder}")
+    attack_files = [os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                    if file_name.endswith('.txt') and file_name != 'normal.txt']
+    # the workers go to the attack logs when there are several, else to the charts of the only one
+    plot_jobs = jobs if len(attack_files) <= 1 else 1
+    file_jobs = 1 if len(attack_files) <= 1 else jobs
+    shared = (node_metrics_no_attack, plot_jobs, pdf, series_no_attack)
+    for summary in map_shared(process_attack_file, attack_files, shared, file_jobs):
+        print(summary)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <log_files_directory>")
-        sys.exit(1)
-    
-    directory = sys.argv[1]
-    process_files_in_directory(directory)
-
+    parser = argparse.ArgumentParser(description="Compare every attack log in a directory against normal.txt")
+    parser.add_argument("directory", help="log files directory")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of attack logs (or charts, with a single attack log) processed in parallel (0 = one per CPU)")
+    parser.add_argument("--pdf", action="store_true",
+                        help="write the charts of each attack log into one multi-page PDF instead of PNG files")
+    parser.add_argument("-b", "--bin", type=float, metavar="SECONDS",
+                        help="also write every metric per node and time bin of SECONDS (<attack>_timeseries.csv) and chart it over time")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    if args.bin is not None and args.bin <= 0:
+        parser.error("--bin must be positive")
+    profiling.enable_from_args(args)
+    process_files_in_directory(args.directory, args.jobs, args.pdf, args.bin)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from profiling import stage
+
+###########################################
+# Matching of transmissions to acks.
+#
+# A transmission counts as acknowledged when its node logs an ack within
+# time_window seconds after it; its latency is the delay to the first such ack.
+# Both frames are sorted once and joined per node with merge_asof, instead of
+# scanning the whole acks frame for every transmission.
+
+# Latency (sec) of every transmission, in the order of the transmissions frame; NaN if unmatched
+@stage(rows=len)
+def match_acks(transmissions, acks, time_window=1.0):
+    if transmissions.empty:
+        return np.empty(0)
+    if acks.empty:
+        return np.full(len(transmissions), np.nan)
+
+    left = pd.DataFrame({
+        'timestamp': transmissions['timestamp'].to_numpy(dtype=np.float64),
+        'node_id': transmissions['node_id'].to_numpy(),
+        'order': np.arange(len(transmissions)),
+    }).sort_values('timestamp', kind='stable')
+    right = pd.DataFrame({
+        'timestamp': acks['timestamp'].to_numpy(dtype=np.float64),
+        'node_id': acks['node_id'].to_numpy(),
+    }).sort_values('timestamp', kind='stable')
+    right['ack_timestamp'] = right['timestamp']
+
+    matched = pd.merge_asof(left, right, on='timestamp', by='node_id',
+                            direction='forward', tolerance=time_window)
+    latencies = np.empty(len(transmissions))
+    latencies[matched['order'].to_numpy()] = (matched['ack_timestamp'] - matched['timestamp']).to_numpy()
+    return latencies
+
+def summarize_latencies(latencies):
+    total_transmissions = len(latencies)
+    if not total_transmissions:
+        return 0.0, 0
+    matched = ~np.isnan(latencies)
+    matched_acks = int(matched.sum())
+    packet_loss_rate = ((total_transmissions - matched_acks) / total_transmissions) * 100
+    avg_latency = float(latencies[matched].mean()) if matched_acks else 0
+    return packet_loss_rate, avg_latency
+
+# Packet loss rate (%) and average latency (sec) in a single matching pass
+def calculate_packet_loss_and_latency(transmissions, acks, time_window=1.0):
+    return summarize_latencies(match_acks(transmissions, acks, time_window))
+
+def calculate_packet_loss(transmissions, acks, time_window=1.0):
+    return calculate_packet_loss_and_latency(transmissions, acks, time_window)[0]
+
+def calculate_latency(transmissions, acks, time_window=1.0):
+    return calculate_packet_loss_and_latency(transmissions, acks, time_window)[1]
+
+# Tidy per-node frame (one row per node, sorted by node id) from the matched latencies:
+# transmissions, matched, packet_loss_rate (%), throughput (packets/sec) and avg_latency (sec)
+@stage(rows=len)
+def per_node_metrics(transmissions, latencies):
+    frame = pd.DataFrame({
+        'node_id': transmissions['node_id'].to_numpy(),
+        'timestamp': transmissions['timestamp'].to_numpy(dtype=np.float64),
+        'latency': latencies,
+        'matched': ~np.isnan(latencies),
+    })
+    metrics = frame.groupby('node_id', sort=True).agg(
+        transmissions=('timestamp', 'size'),
+        matched=('matched', 'sum'),
+        first=('timestamp', 'min'),
+        last=('timestamp', 'max'),
+        avg_latency=('latency', 'mean'),
+    )
+    metrics['packet_loss_rate'] = (metrics['transmissions'] - metrics['matched']) / metrics['transmissions'] * 100
+    metrics['throughput'] = metrics['transmissions'] / (metrics['last'] - metrics['first'])
+    metrics['avg_latency'] = metrics['avg_latency'].fillna(0)
+    return metrics[['transmissions', 'matched', 'packet_loss_rate', 'throughput', 'avg_latency']]
+
+# Binned sums of the matched transmissions, per node and bin of a resample.TimeBins:
+# transmissions, matched, lost, latency (sum of the matched latencies, sec) and
+# per_second (transmissions per second of the bin)
+def binned_packet_sums(bins, transmissions, latencies):
+    nodes = transmissions['node_id'].to_numpy()
+    timestamps = transmissions['timestamp'].to_numpy()
+    matched = ~np.isnan(latencies)
+    sums = {
+        'transmissions': bins.counts(nodes, timestamps),
+        'matched': bins.counts(nodes[matched], timestamps[matched]),
+        'latency': bins.sums(nodes[matched], timestamps[matched], latencies[matched]),
+    }
+    sums['lost'] = sums['transmissions'] - sums['matched']
+    sums['per_second'] = sums['transmissions'] / bins.bin_seconds
+    return sums
@@ -0,0 +1,233 @@
+import argparse
+import numpy as np
+import pandas as pd
+from log_parser import match_first, extract_fields, report_malformed, US_PER_SEC
+from log_cache import load_log
+from link_delivery import tsch_frames, match_frames
+from round_trips import app_events
+from profiling import stage
+
+###########################################
+# Hop-by-hop paths of the node.c App packets.
+#
+# A request goes down from the root along its source routing header, a response
+# goes up along the default routes. At every hop the log holds, at one node,
+# within a few microseconds and in this order:
+#
+#   TSCH  received from LL-<previous hop> with seqno <seqno>
+#   IPv6  packet received from 6G-<src> to 6G-<dst> (, SRH next hop ...)
+#   IPv6  Forwarding packet to next hop 6G-<next>
+#   TSCH  send packet to LL-<next hop> with seqno <seqno>
+#
+# The TSCH frames are matched to their receptions as in link_delivery.py, and
+# then chained with merge_asof joins on the log row, per node: a Forwarding line
+# belongs to the last frame the node received before it, and it sends the first
+# frame the node queues after it, both logged at the same time. This gives the
+# next frame of every frame in a few sorted joins; the paths of all packets are
+# then followed one hop at a time, over arrays.
+
+IPV6_MODULE = 'IPv6'
+
+FORWARD_PATTERNS = [
+    ('forwarding', 'Forwarding packet to next hop 6G-'),
+]
+
+FORWARDING_RE = r'Forwarding packet to next hop 6G-(\d+)'
+
+# paths longer than this are cut and reported as loops
+MAX_HOPS = 32
+
+# the lines of one hop are logged at the same time, give or take the few
+# microseconds of CPU time COOJA adds, far less than a 10 ms TSCH timeslot
+SAME_TIME_US = 5000
+
+###########################################
+
+# Position in right of the nearest row of the same node before ('backward') or
+# after ('forward') every row of left, if logged within tolerance_us of it; -1 otherwise
+def nearby_rows(left, right, direction, tolerance_us=SAME_TIME_US):
+    if left.empty:
+        return np.empty(0, dtype=np.int64)
+    if right.empty:
+        return np.full(len(left), -1, dtype=np.int64)
+    lhs = pd.DataFrame({'row': left['row'].to_numpy(), 'node_id': left['node_id'].to_numpy(),
+                        'timestamp_us': left['timestamp_us'].to_numpy()})
+    rhs = pd.DataFrame({'row': right['row'].to_numpy(), 'node_id': right['node_id'].to_numpy(),
+                        'right_timestamp_us': right['timestamp_us'].to_numpy(), 'target': np.arange(len(right))})
+    matched = pd.merge_asof(lhs, rhs, on='row', by='node_id', direction=direction, allow_exact_matches=False)
+    nearby = ((matched['right_timestamp_us'] - matched['timestamp_us']).abs() <= tolerance_us).to_numpy()
+    return np.where(nearby, matched['target'].fillna(-1).to_numpy(dtype=np.int64), -1)
+
+# Frames of the log and how they chain: the queued frames (with a 'node_id'
+# column, the sender), the first reception (row, timestamp_us) of every frame,
+# -1 if lost, and the frame forwarded after every frame was received, -1 if none
+@stage(rows=lambda frames: len(frames[0]))
+def chain_frames(log):
+    queued, done, received = tsch_frames(log)
+    queued = queued.reset_index(drop=True).assign(node_id=lambda frame: frame['src'])
+    n = len(queued)
+
+    of_reception = match_frames(queued, received)
+    matched = of_reception >= 0
+    receptions = pd.DataFrame({
+        'frame': of_reception[matched],
+        'row': received['row'].to_numpy()[matched],
+        'node_id': received['dst'].to_numpy()[matched],
+        'timestamp_us': received['timestamp_us'].to_numpy()[matched],
+    }).drop_duplicates('frame')
+    reception_row = np.full(n, -1, dtype=np.int64)
+    reception_us = np.full(n, -1, dtype=np.int64)
+    reception_row[receptions['frame'].to_numpy()] = receptions['row'].to_numpy()
+    reception_us[receptions['frame'].to_numpy()] = receptions['timestamp_us'].to_numpy()
+
+    masks = match_first(log, FORWARD_PATTERNS)
+    forwarding = extract_fields(log, masks['forwarding'] & log.is_module(IPV6_MODULE), FORWARDING_RE, ['next_hop'])
+    cause = nearby_rows(forwarding, receptions, 'backward')
+    sent = nearby_rows(forwarding, queued, 'forward')
+    linked = (cause >= 0) & (sent >= 0)
+    next_frame = np.full(n, -1, dtype=np.int64)
+    next_frame[receptions['frame'].to_numpy()[cause[linked]]] = sent[linked]
+    return queued, reception_row, reception_us, next_frame
+
+# App packets: every request sent by the root and every response sent back,
+# with kind, count, segment, src, dst, sent timestamp_us and the first frame
+# queued for it (-1 if none)
+def app_packets(log, queued):
+    events = app_events(log)
+    packets = []
+    for kind in ['request', 'response']:
+        sent = events[f'{kind}_sent']
+        first = nearby_rows(sent, queued, 'forward')
+        packets.append(pd.DataFrame({
+            'kind': kind,
+            'count': sent['count'].to_numpy(),
+            'segment': sent['segment'].to_numpy(),
+            'src': sent['node_id'].to_numpy(),
+            'dst': sent['peer'].to_numpy(),
+            'timestamp_us': sent['timestamp_us'].to_numpy(),
+            'first_frame': first,
+        }))
+    return pd.concat(packets, ignore_index=True).sort_values('timestamp_us', kind='stable').reset_index(drop=True)
+
+# (packets, hops) of every App packet.
+# hops: one row per frame of a packet, with packet (index in packets), hop, from,
+# to, queued and received (sec, NaN if lost) and delay (sec).
+# packets adds hops, path ('1>2>6'), delivered, delay (sec, end to end), and for
+# undelivered packets lost_at, the last node that had the packet, and lost_on:
+# 'source' (never sent), 'link' (frame not received), 'node' (received, not
+# forwarded) or 'loop' (more than max_hops)
+@stage(rows=len)
+def trace_paths(log, max_hops=MAX_HOPS):
+    queued, reception_row, reception_us, next_frame = chain_frames(log)
+    packets = app_packets(log, queued)
+    n = len(packets)
+    src = queued['src'].to_numpy()
+    dst = queued['dst'].to_numpy()
+    queued_us = queued['timestamp_us'].to_numpy()
+    packet_dst = packets['dst'].to_numpy()
+
+    hop_packet, hop_frame, hop_index = [], [], []
+    frame = packets['first_frame'].to_numpy().copy()
+    last_frame = np.full(n, -1, dtype=np.int64)
+    arrived = np.zeros(n, dtype=bool)
+    lost_on = np.where(frame < 0, 'source', '').astype(object)
+    for hop in range(max_hops):
+        active = np.flatnonzero(frame >= 0)
+        if not len(active):
+            break
+        current = frame[active]
+        hop_packet.append(active)
+        hop_frame.append(current)
+        hop_index.append(np.full(len(active), hop))
+        last_frame[active] = current
+
+        received = reception_row[current] >= 0
+        at_destination = received & (dst[current] == packet_dst[active])
+        arrived[active[at_destination]] = True
+        lost_on[active[~received]] = 'link'
+        forwarded = next_frame[current]
+        stalled = received & ~at_destination & (forwarded < 0)
+        lost_on[active[stalled]] = 'node'
+        frame[active] = np.where(received & ~at_destination, forwarded, -1)
+    lost_on[frame >= 0] = 'loop'
+
+    hop_packet = np.concatenate(hop_packet) if hop_packet else np.empty(0, dtype=np.int64)
+    hop_frame = np.concatenate(hop_frame) if hop_frame else np.empty(0, dtype=np.int64)
+    hop_index = np.concatenate(hop_index) if hop_index else np.empty(0, dtype=np.int64)
+    received_us = reception_us[hop_frame]
+    hops = pd.DataFrame({
+        'packet': hop_packet,
+        'hop': hop_index,
+        'from': src[hop_frame],
+        'to': dst[hop_frame],
+        'queued': queued_us[hop_frame] / US_PER_SEC,
+        'received': np.where(received_us >= 0, received_us / US_PER_SEC, np.nan),
+    }).sort_values(['packet', 'hop'], kind='stable').reset_index(drop=True)
+    hops['delay'] = hops['received'] - hops['queued']
+
+    packets['hops'] = np.bincount(hop_packet, minlength=n)[:n]
+    packets['path'] = path_strings(packets, hops)
+    packets['delivered'] = arrived
+    # only the packets that had a frame are indexed: there may be no frames at all
+    has_frame = last_frame >= 0
+    held = last_frame[has_frame]
+    end_us = np.full(n, -1, dtype=np.int64)
+    end_us[has_frame] = reception_us[held]
+    end_us[~arrived] = -1
+    packets['delay'] = np.where(end_us >= 0, (end_us - packets['timestamp_us'].to_numpy()) / US_PER_SEC, np.nan)
+    # the last node holding a lost packet: the sender of a lost frame, the receiver
+    # otherwise, and the source of a packet never sent
+    holder = packets['src'].to_numpy().copy()
+    holder[has_frame] = np.where(lost_on[has_frame] == 'link', src[held], dst[held])
+    packets['lost_at'] = pd.Series(holder).where(~arrived).astype('Int64')
+    packets['lost_on'] = np.where(arrived, None, lost_on)
+    packets['timestamp'] = packets['timestamp_us'] / US_PER_SEC
+    return packets.drop(columns=['timestamp_us', 'first_frame']), hops
+
+def path_strings(packets, hops):
+    if hops.empty:
+        return packets['src'].astype(str).to_numpy()
+    first = hops.groupby('packet', sort=True)['from'].first()
+    nodes = hops.groupby('packet', sort=True)['to'].agg(lambda to: '>'.join(map(str, to)))
+    paths = first.astype(str) + '>' + nodes
+    return paths.reindex(packets.index).fillna(packets['src'].astype(str)).to_numpy()
+
+# Per node: lost packets that disappeared there, split by where (link or node)
+def losses_by_node(packets):
+    lost = packets[~packets['delivered']]
+    return lost.groupby(['lost_at', 'lost_on']).size().unstack('lost_on', fill_value=0)
+
+# Per link: hops, received and the mean / max delay (sec)
+def hop_delays(hops):
+    grouped = hops.groupby(['from', 'to'], sort=True)
+    return pd.DataFrame({
+        'hops': grouped.size(),
+        'received': grouped['received'].count(),
+        'delay_mean': grouped['delay'].mean(),
+        'delay_max': grouped['delay'].max(),
+    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hop-by-hop paths of the App requests and responses, and where lost packets disappeared")
+    parser.add_argument("logfile")
+    parser.add_argument("--hops", help="write the per-hop rows to this CSV file")
+    parser.add_argument("--packets", help="write the per-packet rows to this CSV file")
+    parser.add_argument("--max-hops", type=int, default=MAX_HOPS, help="paths longer than this are reported as loops")
+    args = parser.parse_args()
+
+    log = load_log(args.logfile)
+    report_malformed(log, args.logfile)
+    packets, hops = trace_paths(log, args.max_hops)
+    delivered = int(packets['delivered'].sum())
+    print(f"Packets: {len(packets)}, delivered: {delivered}, lost: {len(packets) - delivered}")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print("\nLost packets per node (lost_at) and cause:")
+        print(losses_by_node(packets).to_string())
+        print("\nHop delays per link:")
+        print(hop_delays(hops).round(4).to_string())
+    if args.hops:
+        hops.to_csv(args.hops, index=False)
+        print(f"Hops saved to {args.hops}")
+    if args.packets:
+        packets.to_csv(args.packets, index=False)
+        print(f"Packets saved to {args.packets}")
@@ -0,0 +1,39 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+###########################################
+# Process pool helpers shared by the analysis scripts
+
+# data handed to every worker once, when the worker starts
+_shared = None
+
+def _init_worker(shared):
+    global _shared
+    _shared = shared
+
+def _call(func, item):
+    return func(_shared, item)
+
+def cpu_count():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Number of worker processes for a --jobs value: 0 means one per CPU
+def resolve_jobs(jobs):
+    if jobs is None or jobs < 0:
+        return 1
+    return jobs or cpu_count()
+
+# Yield func(shared, item) for every item, in order, using up to jobs processes.
+# func must be a module-level function; shared is sent to each worker only once.
+def map_shared(func, items, shared=None, jobs=1):
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+    if jobs <= 1:
+        for item in items:
+            yield func(shared, item)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(shared,)) as pool:
+        yield from pool.map(_call, repeat(func), items)
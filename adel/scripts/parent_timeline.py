@@ -0,0 +1,161 @@
+import argparse
+import numpy as np
+import pandas as pd
+from log_parser import match_first, report_malformed, US_PER_SEC
+from log_cache import load_log
+from profiling import stage
+
+###########################################
+# RPL preferred parent of every node over time.
+#
+# Every "parent switch: <old> -> <new>" line (rpl-lite) or
+# "rpl_set_preferred_parent <new> used to be <old>" line (rpl-classic) starts a
+# new interval. The intervals are stored in sorted arrays, node by node (CSR:
+# the intervals of the node in row i are offsets[i]:offsets[i + 1]), and a
+# lookup packs (row, time) into one int64 key, row * span + time_us, so that the
+# parents of any number of (node, time) pairs come from one np.searchsorted,
+# O(log k) each. A second index sorts the intervals by parent, for the children
+# of a node during a window.
+
+RPL_MODULE = 'RPL'
+
+PARENT_PATTERNS = [
+    ('switch', 'parent switch: '),
+    ('set', 'rpl_set_preferred_parent'),
+]
+
+SWITCH_RE = r'parent switch: \S+ -> 6\w-(\w+)'
+SET_RE = r'rpl_set_preferred_parent:? 6\w-(\w+) used to be'
+
+# parent of a node before its first switch, or after it left the DODAG (6A-NULL)
+NO_PARENT = -1
+
+###########################################
+
+class ParentTimeline:
+    def __init__(self, nodes, offsets, starts_us, parents):
+        # sorted node ids, the start (us) and parent of their intervals
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.starts_us = np.asarray(starts_us, dtype=np.int64)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        # an interval lasts until the next one of its node
+        rows = np.repeat(np.arange(len(self.nodes)), np.diff(self.offsets))
+        self.ends_us = np.full(len(self.starts_us), np.iinfo(np.int64).max, dtype=np.int64)
+        followed = rows[1:] == rows[:-1]
+        self.ends_us[:-1][followed] = self.starts_us[1:][followed]
+        self._span = int(self.starts_us.max()) + 2 if len(self.starts_us) else 1
+        self._keys = rows * self._span + self.starts_us
+        # intervals sorted by parent
+        self._by_parent = np.argsort(self.parents, kind='stable')
+        self._sorted_parents = self.parents[self._by_parent]
+
+    # Timeline of (timestamp_us, node_id, parent) switches, in any order
+    @classmethod
+    def from_switches(cls, timestamp_us, node_ids, parents):
+        switches = pd.DataFrame({'timestamp_us': timestamp_us, 'node_id': node_ids, 'parent': parents})
+        switches = switches.sort_values(['node_id', 'timestamp_us'], kind='stable')
+        nodes, counts = np.unique(switches['node_id'].to_numpy(), return_counts=True)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(nodes, offsets, switches['timestamp_us'].to_numpy(), switches['parent'].to_numpy())
+
+    def __len__(self):
+        return len(self.starts_us)
+
+    # Parent of every (node, time in sec) pair, NO_PARENT if unknown
+    def parents_at(self, node_ids, timestamps):
+        node_ids = np.atleast_1d(np.asarray(node_ids, dtype=np.int64))
+        times_us = np.rint(np.atleast_1d(np.asarray(timestamps, dtype=np.float64)) * US_PER_SEC).astype(np.int64)
+        node_ids, times_us = np.broadcast_arrays(node_ids, times_us)
+        result = np.full(node_ids.shape, NO_PARENT, dtype=np.int64)
+        if not len(self.nodes):
+            return result
+        rows = np.minimum(np.searchsorted(self.nodes, node_ids), len(self.nodes) - 1)
+        known = (self.nodes[rows] == node_ids) & (times_us >= 0)
+        keys = rows * self._span + np.minimum(times_us, self._span - 1)
+        interval = np.searchsorted(self._keys, keys, side='right') - 1
+        # the interval found must belong to the same node
+        known &= interval >= self.offsets[rows]
+        result[known] = self.parents[interval[known]]
+        return result
+
+    def parent(self, node_id, timestamp):
+        return int(self.parents_at(node_id, timestamp)[0])
+
+    # {node: parent} of every node at a time (sec), NO_PARENT for nodes without one
+    def dodag(self, timestamp):
+        parents = self.parents_at(self.nodes, timestamp)
+        return dict(zip(self.nodes.tolist(), parents.tolist()))
+
+    # Sorted nodes whose parent was parent at some point of [start, end) (sec)
+    def children(self, parent, start, end):
+        lo = np.searchsorted(self._sorted_parents, parent, side='left')
+        hi = np.searchsorted(self._sorted_parents, parent, side='right')
+        intervals = self._by_parent[lo:hi]
+        start_us = start * US_PER_SEC
+        end_us = end * US_PER_SEC
+        overlap = (self.starts_us[intervals] < end_us) & (self.ends_us[intervals] > start_us)
+        rows = np.searchsorted(self.offsets, intervals[overlap], side='right') - 1
+        return np.unique(self.nodes[rows]).tolist()
+
+    # Number of switches per node
+    def switches(self):
+        return dict(zip(self.nodes.tolist(), np.diff(self.offsets).tolist()))
+
+    # (node_id, start, end, parent) frame of every interval, times in sec, end NaN for the last ones
+    def to_frame(self):
+        rows = np.repeat(np.arange(len(self.nodes)), np.diff(self.offsets))
+        ends = np.where(self.ends_us == np.iinfo(np.int64).max, np.nan, self.ends_us / US_PER_SEC)
+        return pd.DataFrame({
+            'node_id': self.nodes[rows],
+            'start': self.starts_us / US_PER_SEC,
+            'end': ends,
+            'parent': self.parents,
+        })
+
+###########################################
+
+def parse_parent(fields):
+    return pd.to_numeric(fields, errors='coerce').fillna(NO_PARENT).astype(np.int64).to_numpy()
+
+@stage(rows=len)
+def parent_timeline(log):
+    masks = match_first(log, PARENT_PATTERNS)
+    rpl = log.is_module(RPL_MODULE)
+    timestamps, node_ids, parents = [], [], []
+    for name, pattern in [('switch', SWITCH_RE), ('set', SET_RE)]:
+        mask = masks[name] & rpl
+        fields = pd.Series(log.message[mask], dtype=object).str.extract(pattern)[0]
+        matched = fields.notna().to_numpy()
+        timestamps.append(log.timestamp_us[mask][matched])
+        node_ids.append(log.node_id[mask][matched])
+        # 6A-NULL: the node left the DODAG
+        parents.append(parse_parent(fields[matched]))
+    return ParentTimeline.from_switches(np.concatenate(timestamps), np.concatenate(node_ids), np.concatenate(parents))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RPL parent of every node over time")
+    parser.add_argument("logfile")
+    parser.add_argument("-t", "--time", type=float, action="append", help="print the DODAG at this time, in sec (can be repeated)")
+    parser.add_argument("-c", "--children", type=int, help="print the nodes that had this node as parent in the --window")
+    parser.add_argument("-w", "--window", type=float, nargs=2, metavar=("START", "END"), default=(0.0, float('inf')),
+                        help="window of --children, in sec (default: the whole log)")
+    parser.add_argument("-o", "--output", help="write the parent intervals to this CSV file")
+    args = parser.parse_args()
+
+    log = load_log(args.logfile)
+    report_malformed(log, args.logfile)
+    timeline = parent_timeline(log)
+    print(f"{len(timeline)} parent switches of {len(timeline.nodes)} nodes")
+    for node, count in timeline.switches().items():
+        print(f"Node {node}: {count} switches")
+    for timestamp in args.time or ():
+        dodag = timeline.dodag(timestamp)
+        print(f"DODAG at {timestamp} s: " + ", ".join(f"{node}->{parent if parent != NO_PARENT else '-'}"
+                                                     for node, parent in dodag.items()))
+    if args.children is not None:
+        start, end = args.window
+        print(f"Children of {args.children} in [{start}, {end}): {timeline.children(args.children, start, end)}")
+    if args.output:
+        timeline.to_frame().to_csv(args.output, index=False)
+        print(f"Parent intervals saved to {args.output}")
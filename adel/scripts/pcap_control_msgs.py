@@ -0,0 +1,39 @@
+import argparse
+import pandas as pd
+from pcap_parser import rpl_events, control_msgs_from_events, control_msgs_by_bin, RPL_TYPES
+from pcap_index import load_index
+
+# Count the RPL control messages (DIS/DIO/DAO/DAO-ACK) sent by every node in COOJA radio captures
+
+def main(file_paths, bin_seconds, csv_path=None, t0=None, t1=None):
+    binned = []
+    for file_path in file_paths:
+        if t0 is None and t1 is None:
+            events = rpl_events(file_path)
+        else:
+            # only the window is dissected, found through the time index of the capture
+            with load_index(file_path) as index:
+                events = index.rpl_events(t0, t1)
+        control_msgs = control_msgs_from_events(events)
+        print(f"\n{file_path}: {len(events)} RPL control messages")
+        print("Node " + " ".join(f"{msg_type:>8}" for msg_type in RPL_TYPES))
+        for node in sorted(control_msgs):
+            print(f"{node:>4} " + " ".join(f"{control_msgs[node][msg_type]:>8}" for msg_type in RPL_TYPES))
+        if csv_path:
+            counts = control_msgs_by_bin(events, bin_seconds).reset_index()
+            counts.insert(0, 'file', file_path)
+            binned.append(counts)
+
+    if csv_path and binned:
+        pd.concat(binned).to_csv(csv_path, index=False)
+        print(f"\nCounts per {bin_seconds} s bin saved to {csv_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the RPL control messages sent by every node in .pcap captures")
+    parser.add_argument("pcap_files", nargs="+")
+    parser.add_argument("-b", "--bin", type=float, default=60, help="time bin in seconds for --csv (default: %(default)s)")
+    parser.add_argument("--csv", help="write the counts per node and time bin to this CSV file")
+    parser.add_argument("--t0", type=float, help="only count from this time, in seconds since the first record")
+    parser.add_argument("--t1", type=float, help="only count until this time (exclusive)")
+    args = parser.parse_args()
+    main(args.pcap_files, args.bin, args.csv, args.t0, args.t1)
@@ -0,0 +1,173 @@
+import argparse
+import os
+import shutil
+import numpy as np
+from log_cache import file_key, file_digest, write_meta, validate_cache
+from pcap_parser import PcapFile, rpl_events_of, PCAP_HEADER_LEN, RECORD_HEADER_LEN
+
+###########################################
+# Time index of pcap captures.
+#
+# The byte offset, timestamp and length of every record of <capture> are stored
+# next to it in <capture>.index/ as .npy files. With the index, the records of
+# a [t0, t1) window are found with a binary search and read with a single slice
+# of the memory-mapped capture, instead of scanning it from the start.
+# Like the log cache, the index is keyed by the size, mtime and content hash,
+# and validated by the same log_cache helpers.
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.index'
+
+COLUMNS = ['offsets', 'timestamps_us', 'lengths']
+
+# bounds of an open window
+TS_MIN = np.iinfo(np.int64).min
+TS_MAX = np.iinfo(np.int64).max
+
+###########################################
+
+def index_dir(file_path):
+    return file_path + INDEX_SUFFIX
+
+# One pass over the records: (frame offsets, timestamps in microseconds, captured lengths)
+def scan_records(pcap):
+    offsets = []
+    timestamps = []
+    lengths = []
+    for ts_us, offset, length in pcap.records():
+        offsets.append(offset)
+        timestamps.append(ts_us)
+        lengths.append(length)
+    return (np.array(offsets, dtype=np.int64),
+            np.array(timestamps, dtype=np.int64),
+            np.array(lengths, dtype=np.int32))
+
+# (columns, meta) of the index of a capture, built in memory
+def build_index(file_path):
+    with PcapFile(file_path) as pcap:
+        columns = dict(zip(COLUMNS, scan_records(pcap)))
+    timestamps = columns['timestamps_us']
+    meta = file_key(file_path)
+    meta.update({
+        'version': INDEX_VERSION,
+        'digest': file_digest(file_path),
+        'records': len(timestamps),
+        'sorted': bool(np.all(timestamps[1:] >= timestamps[:-1])),
+    })
+    return columns, meta
+
+def save_index(file_path, columns, meta):
+    directory = index_dir(file_path)
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    os.makedirs(tmp_directory, exist_ok=True)
+    try:
+        for column, values in columns.items():
+            np.save(os.path.join(tmp_directory, column + '.npy'), values)
+        write_meta(tmp_directory, meta)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_directory, directory)
+    finally:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+###########################################
+
+class PcapIndex:
+    def __init__(self, file_path, columns, meta):
+        self.pcap = PcapFile(file_path)
+        self.offsets = columns['offsets']
+        self.timestamps_us = columns['timestamps_us']
+        self.lengths = columns['lengths']
+        self.sorted = meta['sorted']
+        self.start_us = int(self.timestamps_us.min()) if len(self.timestamps_us) else 0
+
+    def close(self):
+        self.pcap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Record numbers in the window [t0, t1), in seconds since the first record
+    def window(self, t0=None, t1=None):
+        lo = TS_MIN if t0 is None else self.start_us + round(t0 * 1000000)
+        hi = TS_MAX if t1 is None else self.start_us + round(t1 * 1000000)
+        if self.sorted:
+            start, stop = np.searchsorted(self.timestamps_us, [lo, hi], side='left')
+            return np.arange(start, stop)
+        return np.flatnonzero((self.timestamps_us >= lo) & (self.timestamps_us < hi))
+
+    # Raw bytes (record headers included) of the window, read with one slice of the capture
+    def window_bytes(self, t0=None, t1=None):
+        if not self.sorted:
+            raise ValueError(f"{self.pcap.file_path}: records are not in time order")
+        records = self.window(t0, t1)
+        if not len(records):
+            return b''
+        first, last = records[0], records[-1]
+        return self.pcap.data[self.offsets[first] - RECORD_HEADER_LEN:self.offsets[last] + self.lengths[last]]
+
+    # Yield (timestamp in microseconds, offset of the frame, captured length) of the records in the window
+    def records(self, t0=None, t1=None):
+        records = self.window(t0, t1)
+        for ts_us, offset, length in zip(self.timestamps_us[records].tolist(),
+                                         self.offsets[records].tolist(),
+                                         self.lengths[records].tolist()):
+            yield ts_us, offset, length
+
+    # Frames of the window as (timestamp in microseconds, bytes)
+    def packets(self, t0=None, t1=None):
+        data = self.pcap.data
+        return [(ts_us, data[offset:offset + length]) for ts_us, offset, length in self.records(t0, t1)]
+
+    # RPL control messages of the window, timestamps in seconds since the first record
+    def rpl_events(self, t0=None, t1=None):
+        return rpl_events_of(self.pcap, self.records(t0, t1), self.start_us)
+
+    # Write the window as a capture of its own, e.g. to open it in Wireshark
+    def write_window(self, output_path, t0=None, t1=None):
+        with open(output_path, 'wb') as f:
+            f.write(self.pcap.data[:PCAP_HEADER_LEN])
+            f.write(self.window_bytes(t0, t1))
+
+# Index of a capture, read from its sidecar when valid and built otherwise
+def load_index(file_path):
+    directory = index_dir(file_path)
+    meta = validate_cache(file_path, directory, INDEX_VERSION) if os.path.isdir(directory) else None
+    if meta is not None:
+        try:
+            columns = {column: np.load(os.path.join(directory, column + '.npy'), mmap_mode='r') for column in COLUMNS}
+            return PcapIndex(file_path, columns, meta)
+        except (OSError, ValueError):
+            pass
+
+    # an index that cannot be saved (e.g. read-only directory) is used from memory
+    columns, meta = build_index(file_path)
+    try:
+        save_index(file_path, columns, meta)
+    except OSError as e:
+        print(f"Warning: could not save the index of {file_path}: {e}")
+    return PcapIndex(file_path, columns, meta)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the time index of .pcap captures and cut time windows out of them")
+    parser.add_argument("pcap_files", nargs="+")
+    parser.add_argument("--t0", type=float, help="window start, in seconds since the first record")
+    parser.add_argument("--t1", type=float, help="window end (exclusive), in seconds since the first record")
+    parser.add_argument("-o", "--output", help="write the window to this .pcap file (single capture only)")
+    args = parser.parse_args()
+    if args.output and len(args.pcap_files) != 1:
+        parser.error("--output needs a single capture")
+
+    for file_path in args.pcap_files:
+        with load_index(file_path) as index:
+            records = index.window(args.t0, args.t1)
+            print(f"{file_path}: {len(index)} records, {len(records)} in the window")
+            if args.output:
+                index.write_window(args.output, args.t0, args.t1)
+                print(f"Window saved to {args.output}")
@@ -0,0 +1,302 @@
+import mmap
+import struct
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+###########################################
+# Streaming reader for the radio captures COOJA writes (adel/PCAP/*.pcap).
+#
+# The file is memory-mapped and walked record by record. Every frame is
+# dissected only as deep as needed to find RPL control messages:
+#
+#   IEEE 802.15.4 data frame -> 6LoWPAN (IPHC, NHC extension headers,
+#   FRAG1, uncompressed IPv6) -> ICMPv6 type 155 (RPL)
+#
+# Counts are per transmitter (the 802.15.4 source address), so unlike the
+# text logs they include the DAOs forwarded towards the root. Some captures
+# hold records more than once (10mins_no-attacks.pcap repeats the whole capture
+# three times, with the same timestamps and bytes); a record identical to an
+# earlier one is skipped before dissecting, so every frame counts once.
+
+PCAP_MAGIC = {
+    b'\xa1\xb2\xc3\xd4': ('>', 1),      # microsecond timestamps
+    b'\xd4\xc3\xb2\xa1': ('<', 1),
+    b'\xa1\xb2\x3c\x4d': ('>', 1000),   # nanosecond timestamps
+    b'\x4d\x3c\xb2\xa1': ('<', 1000),
+}
+PCAP_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+
+LINKTYPE_IEEE802_15_4_WITHFCS = 195
+LINKTYPE_IEEE802_15_4_NOFCS = 230
+FCS_LEN = {LINKTYPE_IEEE802_15_4_WITHFCS: 2, LINKTYPE_IEEE802_15_4_NOFCS: 0}
+
+ICMPV6 = 58
+ICMPV6_RPL = 155
+RPL_CODES = {0x00: 'DIS', 0x01: 'DIO', 0x02: 'DAO', 0x03: 'DAO-ACK'}
+RPL_TYPES = ['DIS', 'DIO', 'DAO', 'DAO-ACK']
+
+###########################################
+# pcap records
+
+class PcapFile:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b''
+        magic = bytes(self.data[:4])
+        if magic not in PCAP_MAGIC:
+            raise ValueError(f"{file_path}: not a pcap file (pcapng is not supported)")
+        self.byte_order, self.ts_divisor = PCAP_MAGIC[magic]
+        self.linktype = struct.unpack_from(self.byte_order + 'I', self.data, 20)[0] & 0xffff
+        if self.linktype not in FCS_LEN:
+            raise ValueError(f"{file_path}: unsupported link type {self.linktype}")
+        self.fcs_len = FCS_LEN[self.linktype]
+        self.record_header = struct.Struct(self.byte_order + 'IIII')
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Yield (timestamp in microseconds, offset of the frame, captured length) of the
+    # records between byte offsets start and end; a truncated last record is ignored
+    def records(self, start=PCAP_HEADER_LEN, end=None):
+        data = self.data
+        end = len(data) if end is None else end
+        unpack = self.record_header.unpack_from
+        divisor = self.ts_divisor
+        offset = start
+        while offset + RECORD_HEADER_LEN <= end:
+            ts_sec, ts_frac, incl_len, orig_len = unpack(data, offset)
+            offset += RECORD_HEADER_LEN
+            if offset + incl_len > end:
+                break
+            yield ts_sec * 1000000 + ts_frac // divisor, offset, incl_len
+            offset += incl_len
+
+###########################################
+# 802.15.4
+
+ADDR_LEN = (0, 0, 2, 8)
+
+# Whether the destination and source PAN ids are present (IEEE 802.15.4-2015, table 7-2)
+def pan_ids_present(version, dst_mode, src_mode, pan_comp):
+    if version < 2:
+        return dst_mode != 0, src_mode != 0 and not pan_comp
+    if dst_mode == 0 and src_mode == 0:
+        return bool(pan_comp), False
+    if src_mode == 0:
+        return not pan_comp, False
+    if dst_mode == 0:
+        return False, not pan_comp
+    if dst_mode == 3 and src_mode == 3:
+        return not pan_comp, False
+    return True, not pan_comp
+
+# The dissectors read a frame in place: data is the whole capture (bytes or mmap),
+# offset the position of the current header and end the end of the frame.
+
+# (source node id, offset of the MAC payload) of an unsecured data frame, or None
+def dissect_mac(data, offset, end):
+    if offset + 3 > end:
+        return None
+    fcf = data[offset] | data[offset + 1] << 8
+    if fcf & 0x7 != 1 or fcf & 0x8:
+        return None
+    pan_comp = fcf >> 6 & 1
+    dst_mode = fcf >> 10 & 3
+    version = fcf >> 12 & 3
+    src_mode = fcf >> 14 & 3
+    if src_mode == 0:
+        return None
+
+    offset += 2
+    if not (version == 2 and fcf >> 8 & 1):
+        offset += 1  # sequence number
+    dst_pan, src_pan = pan_ids_present(version, dst_mode, src_mode, pan_comp)
+    offset += 2 * dst_pan + ADDR_LEN[dst_mode] + 2 * src_pan
+    src = offset
+    offset += ADDR_LEN[src_mode]
+    if offset > end:
+        return None
+    # the node id is in the last two bytes of the address, sent least significant byte first
+    node = data[src] | data[src + 1] << 8
+
+    if fcf >> 9 & 1:
+        # header IEs, ended by HT1 (payload IEs follow) or HT2 (payload follows)
+        while offset + 2 <= end:
+            descriptor = data[offset] | data[offset + 1] << 8
+            element_id = descriptor >> 7 & 0xff
+            offset += 2 + (descriptor & 0x7f)
+            if element_id == 0x7f:
+                break
+            if element_id == 0x7e:
+                while offset + 2 <= end:
+                    descriptor = data[offset] | data[offset + 1] << 8
+                    offset += 2 + (descriptor & 0x7ff)
+                    if descriptor >> 11 & 0xf == 0xf:
+                        break
+                break
+    return node, offset
+
+###########################################
+# 6LoWPAN / IPv6
+
+TF_LEN = (4, 3, 1, 0)
+SAM_LEN = ((16, 8, 2, 0), (0, 8, 2, 0))          # by SAC
+DAM_LEN = ((16, 8, 2, 0), (0, 8, 2, 0),          # unicast, by DAC
+           (16, 6, 4, 1), (6, 0, 0, 0))          # multicast, by DAC
+IPV6_EXT_HEADERS = (0, 43, 60)                   # hop-by-hop, routing, destination options
+
+# (next header, offset of the data after the IPv6 headers) of a 6LoWPAN payload, or None for
+# anything that does not start an IPv6 packet (FRAGN, mesh, broadcast, ...)
+def dissect_6lowpan(data, offset, end):
+    if offset >= end:
+        return None
+    dispatch = data[offset]
+    if dispatch & 0xf8 == 0xc0:
+        offset += 4  # FRAG1
+        if offset >= end:
+            return None
+        dispatch = data[offset]
+    if dispatch == 0x41:
+        if offset + 41 > end:
+            return None
+        return skip_ext_headers(data, data[offset + 7], offset + 41, end)
+    if dispatch & 0xe0 == 0x60:
+        return dissect_iphc(data, offset, end)
+    return None
+
+def dissect_iphc(data, offset, end):
+    if offset + 2 > end:
+        return None
+    b0 = data[offset]
+    b1 = data[offset + 1]
+    offset += 2
+    if b1 & 0x80:
+        offset += 1  # context identifiers
+    offset += TF_LEN[b0 >> 3 & 3]
+    next_header = None
+    if not b0 & 0x04:
+        if offset >= end:
+            return None
+        next_header = data[offset]
+        offset += 1
+    if b0 & 0x03 == 0:
+        offset += 1  # hop limit
+    offset += SAM_LEN[b1 >> 6 & 1][b1 >> 4 & 3]
+    offset += DAM_LEN[(b1 >> 3 & 1) * 2 + (b1 >> 2 & 1)][b1 & 3]
+    if next_header is not None:
+        return skip_ext_headers(data, next_header, offset, end)
+    return dissect_nhc(data, offset, end)
+
+# Follow a chain of NHC-compressed extension headers
+def dissect_nhc(data, offset, end):
+    while offset < end:
+        nhc = data[offset]
+        if nhc & 0xf0 != 0xe0:
+            return None  # UDP or unknown NHC: not ICMPv6
+        eid = nhc >> 1 & 7
+        offset += 1
+        if eid == 7:
+            return dissect_iphc(data, offset, end)  # IPv6-in-IPv6
+        if nhc & 1:
+            # the next header is compressed too
+            if offset >= end:
+                return None
+            offset += 1 + data[offset]
+            continue
+        if offset + 2 > end:
+            return None
+        next_header = data[offset]
+        offset += 2 + data[offset + 1]
+        return skip_ext_headers(data, next_header, offset, end)
+    return None
+
+# Skip uncompressed IPv6 extension headers
+def skip_ext_headers(data, next_header, offset, end):
+    while next_header in IPV6_EXT_HEADERS:
+        if offset + 2 > end:
+            return None
+        next_header, offset = data[offset], offset + (data[offset + 1] + 1) * 8
+    return next_header, offset
+
+###########################################
+
+# (source node id, RPL message type) of the frame at data[offset:end], or None if it is
+# not an RPL control message; end excludes the FCS
+def dissect_rpl(data, offset, end):
+    mac = dissect_mac(data, offset, end)
+    if mac is None:
+        return None
+    node, offset = mac
+    ip = dissect_6lowpan(data, offset, end)
+    if ip is None:
+        return None
+    next_header, offset = ip
+    if next_header != ICMPV6 or offset + 2 > end or data[offset] != ICMPV6_RPL:
+        return None
+    msg_type = RPL_CODES.get(data[offset + 1])
+    if msg_type is None:
+        return None
+    return node, msg_type
+
+# The (timestamp in microseconds, offset, length) records whose timestamp and
+# bytes were not seen in an earlier record
+def unique_records(data, records):
+    seen = set()
+    for ts_us, offset, length in records:
+        key = (ts_us, data[offset:offset + length])
+        if key not in seen:
+            seen.add(key)
+            yield ts_us, offset, length
+
+# Frame of (timestamp in sec since start_us, node_id, type) of the RPL control
+# messages among the given (timestamp in microseconds, offset, length) records
+def rpl_events_of(pcap, records, start_us):
+    data = pcap.data
+    fcs_len = pcap.fcs_len
+    timestamps = []
+    nodes = []
+    types = []
+    for ts_us, offset, length in unique_records(data, records):
+        rpl = dissect_rpl(data, offset, offset + length - fcs_len)
+        if rpl is not None:
+            timestamps.append(ts_us - start_us)
+            nodes.append(rpl[0])
+            types.append(rpl[1])
+    return pd.DataFrame({
+        'timestamp': np.array(timestamps, dtype=np.int64) / 1e6,
+        'node_id': np.array(nodes, dtype=np.int64),
+        'type': pd.Categorical(types, categories=RPL_TYPES),
+    })
+
+# RPL control messages of a whole capture, timestamps in seconds since the first record
+def rpl_events(file_path):
+    with PcapFile(file_path) as pcap:
+        first = next(pcap.records(), None)
+        start_us = first[0] if first is not None else 0
+        return rpl_events_of(pcap, pcap.records(), start_us)
+
+# Per-node counts in the structure extract_control_msgs.py builds from text logs
+def control_msgs_from_events(events):
+    control_msgs = defaultdict(lambda: {msg_type: 0 for msg_type in RPL_TYPES})
+    counts = pd.crosstab(events['node_id'], events['type'], dropna=False)
+    for node, row in counts.iterrows():
+        control_msgs[int(node)].update({msg_type: int(row[msg_type]) for msg_type in RPL_TYPES})
+    return control_msgs
+
+# Counts per node and time bin: frame indexed by (node_id, bin start in sec), one column per type
+def control_msgs_by_bin(events, bin_seconds):
+    bins = (events['timestamp'] // bin_seconds * bin_seconds).rename('bin')
+    return pd.crosstab([events['node_id'], bins], events['type'], dropna=False)
+
+def parse_pcap_control_msgs(file_path):
+    return control_msgs_from_events(rpl_events(file_path))
@@ -0,0 +1,128 @@
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+from parallel import map_shared
+from profiling import stage
+
+###########################################
+# Bar charts of per-node metrics, and line charts of metrics over time.
+#
+# A chart is described by a plain dict and drawn on a matplotlib Figure that is
+# not registered with pyplot: no GUI backend is loaded, which also works without
+# a display, and a figure is freed as soon as it is saved. The dicts can be sent
+# to worker processes, so the charts of a run are rendered in parallel.
+#
+#   path    output file
+#   title, xlabel, ylabel
+#   bars    [(x, heights, keyword arguments of Axes.bar)]
+#   lines   [(x, y, keyword arguments of Axes.plot)], optional
+#   xticks  (positions, labels), or None to keep the default ticks
+#   rotation of the x tick labels; legend: whether to draw the legend
+
+FIGSIZE = (10, 6)
+
+# One bar per node
+def bar_chart(path, nodes, values, title, ylabel, color):
+    return {
+        'path': path, 'title': title, 'xlabel': 'Node', 'ylabel': ylabel,
+        'bars': [(list(nodes), list(values), {'color': color})],
+        'xticks': None, 'rotation': 90, 'legend': False,
+    }
+
+# The same metric per node without and with an attack, as overlapping bars
+def comparison_chart(path, nodes, values, attack_values, attack_name, title, ylabel):
+    return {
+        'path': path, 'title': title, 'xlabel': 'Node', 'ylabel': ylabel,
+        'bars': [(list(nodes), list(values), {'width': 0.4, 'label': 'No Attack', 'align': 'center'}),
+                 (list(nodes), list(attack_values), {'width': 0.4, 'label': attack_name, 'align': 'edge'})],
+        'xticks': None, 'rotation': 90, 'legend': True,
+    }
+
+# Side-by-side bars per node, one per (label, values, color) group; color may be None
+def grouped_chart(path, nodes, groups, title, ylabel, bar_width=0.25, rotation=90):
+    index = range(len(nodes))
+    bars = []
+    for k, (label, values, color) in enumerate(groups):
+        options = {'width': bar_width, 'label': label}
+        if color is not None:
+            options['color'] = color
+        bars.append(([i + k * bar_width for i in index], list(values), options))
+    center = (len(groups) - 1) / 2 * bar_width
+    return {
+        'path': path, 'title': title, 'xlabel': 'Node', 'ylabel': ylabel,
+        'bars': bars, 'xticks': ([i + center for i in index], list(nodes)),
+        'rotation': rotation, 'legend': True,
+    }
+
+# One line per (label, x, y) series, e.g. a metric per time bin without and with an attack
+def line_chart(path, lines, title, xlabel, ylabel):
+    return {
+        'path': path, 'title': title, 'xlabel': xlabel, 'ylabel': ylabel,
+        'bars': [], 'lines': [(list(x), list(y), {'label': label}) for label, x, y in lines],
+        'xticks': None, 'rotation': 0, 'legend': True,
+    }
+
+###########################################
+
+def draw_chart(chart, fig=None):
+    if fig is None:
+        fig = Figure(figsize=chart.get('figsize', FIGSIZE))
+    ax = fig.subplots()
+    for x, heights, options in chart['bars']:
+        ax.bar(x, heights, **options)
+    for x, y, options in chart.get('lines', ()):
+        ax.plot(x, y, **options)
+    ax.set_xlabel(chart['xlabel'])
+    ax.set_ylabel(chart['ylabel'])
+    ax.set_title(chart['title'])
+    if chart['xticks'] is not None:
+        positions, labels = chart['xticks']
+        ax.set_xticks(positions, labels)
+    if chart['rotation']:
+        ax.tick_params(axis='x', labelrotation=chart['rotation'])
+    if chart['legend']:
+        ax.legend()
+    fig.tight_layout()
+    return fig
+
+@stage()
+def save_chart(chart):
+    draw_chart(chart).savefig(chart['path'])
+    return chart['path']
+
+def _save_chart(shared, chart):
+    return save_chart(chart)
+
+# Save every chart to its own file using up to jobs processes (0 = one per CPU),
+# or, with pdf_path, all of them as the pages of one PDF
+@stage(rows=len)
+def save_charts(charts, jobs=1, pdf_path=None):
+    if pdf_path is None:
+        return list(map_shared(_save_chart, charts, jobs=jobs))
+    # the pages of a PDF are written one after the other by a single process
+    with PdfPages(pdf_path) as pdf:
+        for chart in charts:
+            pdf.savefig(draw_chart(chart))
+    return [pdf_path]
+
+###########################################
+# Scripts that can also open their chart in a window (--show). pyplot, and with
+# it the default GUI backend, is only imported when a window is requested.
+
+def new_figure(figsize=FIGSIZE, show=False):
+    if show:
+        import matplotlib.pyplot as plt
+        return plt.figure(figsize=figsize)
+    return Figure(figsize=figsize)
+
+# Save fig to path (if given), then display it if requested
+def finish_figure(fig, path=None, show=False):
+    if path is not None:
+        fig.savefig(path)
+    if show:
+        import matplotlib.pyplot as plt
+        plt.show()
+        plt.close(fig)
+
+def show_chart(chart):
+    fig = new_figure(chart.get('figsize', FIGSIZE), show=True)
+    finish_figure(draw_chart(chart, fig), show=True)
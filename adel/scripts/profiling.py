@@ -0,0 +1,190 @@
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+###########################################
+# Opt-in per-stage profiling of the analysis scripts.
+#
+# Functions decorated with @stage() record, for every call, the wall and CPU
+# time, the peak RSS of the process, and the rows and log lines they handled.
+# Profiling is enabled with the --profile option of a script or by setting
+# RPL_PROFILE=<output file>; otherwise a decorated function only checks one
+# module variable before calling through.
+#
+# Every finished stage is appended as a JSON line to <output>.events, from the
+# main process and from worker processes alike (they inherit RPL_PROFILE). When
+# the process that enabled profiling exits, the events are written to <output>
+# as a JSON trace, or as a Chrome trace (chrome://tracing, Perfetto) when the
+# format is 'chrome' or the file name ends with .trace.json.
+
+PROFILE_ENV = 'RPL_PROFILE'
+FORMAT_ENV = 'RPL_PROFILE_FORMAT'
+OWNER_ENV = 'RPL_PROFILE_OWNER'
+EVENTS_SUFFIX = '.events'
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# output path while profiling, None when disabled
+_output = None
+_local = threading.local()
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+def enable(output_path, trace_format=None):
+    global _output
+    _output = os.path.abspath(output_path)
+    os.environ[PROFILE_ENV] = _output
+    if trace_format:
+        os.environ[FORMAT_ENV] = trace_format
+    if os.environ.get(OWNER_ENV) is None:
+        # this process writes the trace; its workers only append events
+        os.environ[OWNER_ENV] = str(os.getpid())
+        try:
+            os.remove(_output + EVENTS_SUFFIX)
+        except FileNotFoundError:
+            pass
+        atexit.register(write_trace)
+
+def enabled():
+    return _output is not None
+
+# Add rows / log lines to the innermost running stage
+def count(rows=0, lines=0):
+    if _output is None:
+        return
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1]['rows'] += rows
+        stack[-1]['lines'] += lines
+
+# Decorator recording every call of a function as a stage. rows and lines are
+# optional functions of the result, e.g. rows=len. The lines of a stage are the
+# ones its inner stages handled, if any, else lines(result): a stage that wraps
+# the one reading the log (load_log around parse_log) does not count them twice.
+def stage(name=None, rows=None, lines=None):
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _output is None:
+                return func(*args, **kwargs)
+            stack = getattr(_local, 'stack', None)
+            if stack is None:
+                stack = _local.stack = []
+            record = {'rows': 0, 'lines': 0}
+            stack.append(record)
+            rss_before = max_rss()
+            cpu_start = time.process_time()
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                wall = time.time() - start
+                cpu = time.process_time() - cpu_start
+                stack.pop()
+            if rows is not None:
+                record['rows'] += rows(result)
+            if lines is not None and not record['lines']:
+                record['lines'] += lines(result)
+            rss_after = max_rss()
+            record.update({
+                'name': stage_name,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'depth': len(stack),
+                'start': start,
+                'wall': wall,
+                'cpu': cpu,
+                'max_rss': rss_after,
+                'rss_growth': rss_after - rss_before,
+                'lines_per_sec': record['lines'] / wall if record['lines'] and wall else None,
+            })
+            # the log lines of a stage are also lines of the stages it runs in
+            if stack:
+                stack[-1]['lines'] += record['lines']
+            append_event(record)
+            return result
+        return wrapper
+    return decorate
+
+def append_event(record):
+    with open(_output + EVENTS_SUFFIX, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+###########################################
+
+def read_events(output_path):
+    try:
+        with open(output_path + EVENTS_SUFFIX) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+# Totals per stage name
+def summarize(events):
+    summary = {}
+    for event in events:
+        totals = summary.setdefault(event['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'lines': 0, 'max_rss': 0})
+        totals['calls'] += 1
+        totals['wall'] += event['wall']
+        totals['cpu'] += event['cpu']
+        totals['rows'] += event['rows']
+        totals['lines'] += event['lines']
+        totals['max_rss'] = max(totals['max_rss'], event['max_rss'])
+    for totals in summary.values():
+        totals['lines_per_sec'] = totals['lines'] / totals['wall'] if totals['lines'] and totals['wall'] else None
+    return summary
+
+def chrome_trace(events, t0):
+    trace_events = []
+    for event in events:
+        trace_events.append({
+            'name': event['name'], 'cat': 'stage', 'ph': 'X',
+            'ts': (event['start'] - t0) * 1e6, 'dur': event['wall'] * 1e6,
+            'pid': event['pid'], 'tid': event['tid'],
+            'args': {key: event[key] for key in ('cpu', 'rows', 'lines', 'lines_per_sec', 'max_rss', 'rss_growth')},
+        })
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+def write_trace():
+    if _output is None or os.environ.get(OWNER_ENV) != str(os.getpid()):
+        return
+    events = sorted(read_events(_output), key=lambda event: event['start'])
+    t0 = events[0]['start'] if events else 0.0
+    trace_format = os.environ.get(FORMAT_ENV) or ('chrome' if _output.endswith('.trace.json') else 'json')
+    if trace_format == 'chrome':
+        trace = chrome_trace(events, t0)
+    else:
+        for event in events:
+            event['start'] -= t0
+        trace = {'command': sys.argv, 'stages': events, 'summary': summarize(events)}
+    with open(_output, 'w') as f:
+        json.dump(trace, f, indent=1)
+    try:
+        os.remove(_output + EVENTS_SUFFIX)
+    except FileNotFoundError:
+        pass
+    print(f"Profile saved to {_output}", file=sys.stderr)
+
+# Add --profile / --profile-format to a script's parser
+def add_arguments(parser):
+    parser.add_argument("--profile", metavar="FILE",
+                        help=f"record the time, CPU, memory and throughput of every stage into FILE (or set {PROFILE_ENV})")
+    parser.add_argument("--profile-format", choices=['json', 'chrome'],
+                        help="JSON trace, or Chrome trace for chrome://tracing (default: chrome for *.trace.json)")
+
+def enable_from_args(args):
+    if args.profile:
+        enable(args.profile, args.profile_format)
+
+# Inherited by worker processes, or set by the user
+if os.environ.get(PROFILE_ENV):
+    enable(os.environ[PROFILE_ENV], os.environ.get(FORMAT_ENV))
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+###########################################
+# Per-node time series of log metrics.
+#
+# Events (node id, timestamp and optionally a value) are binned into dense
+# nodes x time-bins matrices in one vectorized pass: the node index and the bin
+# number are packed into one key, node_index * n_bins + bin, and np.bincount
+# returns the count, or the sum of the values, of every key at once.
+
+class TimeBins:
+    def __init__(self, nodes, bin_seconds, n_bins, start=0.0):
+        # sorted node ids, one matrix row each
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.bin_seconds = float(bin_seconds)
+        self.n_bins = int(n_bins)
+        self.start = float(start)
+
+    # Bins of bin_seconds from start up to the last timestamp, one row per node seen
+    @classmethod
+    def covering(cls, node_ids, timestamps, bin_seconds, start=0.0):
+        end = float(np.max(timestamps)) if len(timestamps) else start
+        n_bins = int((end - start) // bin_seconds) + 1
+        return cls(np.unique(node_ids), bin_seconds, n_bins, start)
+
+    @property
+    def shape(self):
+        return len(self.nodes), self.n_bins
+
+    @property
+    def bin_starts(self):
+        return self.start + np.arange(self.n_bins) * self.bin_seconds
+
+    # Packed (node, bin) key of every event; -1 for events of other nodes or outside the bins
+    def keys(self, node_ids, timestamps):
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if not len(self.nodes):
+            return np.full(len(node_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.nodes, node_ids), len(self.nodes) - 1)
+        bins = np.floor((np.asarray(timestamps, dtype=np.float64) - self.start) / self.bin_seconds).astype(np.int64)
+        valid = (self.nodes[rows] == node_ids) & (bins >= 0) & (bins < self.n_bins)
+        return np.where(valid, rows * self.n_bins + bins, -1)
+
+    def _bincount(self, keys, weights=None):
+        valid = keys >= 0
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)[valid]
+        totals = np.bincount(keys[valid], weights=weights, minlength=len(self.nodes) * self.n_bins)
+        return totals.reshape(self.shape)
+
+    # Number of events per node and bin
+    def counts(self, node_ids, timestamps):
+        return self._bincount(self.keys(node_ids, timestamps))
+
+    # Sum of the event values per node and bin
+    def sums(self, node_ids, timestamps, values):
+        return self._bincount(self.keys(node_ids, timestamps), values)
+
+    def frame(self, matrix):
+        return pd.DataFrame(matrix,
+                            index=pd.Index(self.nodes, name='node_id'),
+                            columns=pd.Index(self.bin_starts, name='bin'))
+
+###########################################
+
+def ratio(numerator, denominator, scale=1.0):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, scale * numerator / denominator, np.nan)
+
+# Metrics read as time series from binned sums. metrics maps a metric name to
+# (numerator, denominator, scale), naming matrices of sums; the value of a bin is
+# scale * numerator / denominator, or scale * numerator when denominator is None.
+class NodeSeries:
+    def __init__(self, bins, sums, metrics):
+        self.bins = bins
+        self.sums = sums
+        self.metrics = metrics
+
+    def _values(self, metric, reduce=None):
+        numerator, denominator, scale = self.metrics[metric]
+        num = self.sums[numerator]
+        den = None if denominator is None else self.sums[denominator]
+        if reduce is not None:
+            num = reduce(num)
+            den = None if den is None else reduce(den)
+        return scale * num if den is None else ratio(num, den, scale)
+
+    # nodes x bins frame of a metric
+    def node(self, metric):
+        return self.bins.frame(self._values(metric))
+
+    # Network-wide series of a metric: sums of all nodes per bin, then the ratio
+    def network(self, metric):
+        return pd.Series(self._values(metric, lambda m: m.sum(axis=0)),
+                         index=pd.Index(self.bins.bin_starts, name='bin'), name=metric)
+
+    # Long (metric, node_id, bin, value) frame of every metric
+    def to_frame(self):
+        frames = []
+        for metric in self.metrics:
+            values = self.node(metric).stack(future_stack=True).rename('value').reset_index()
+            values.insert(0, 'metric', metric)
+            frames.append(values)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,143 @@
+import argparse
+import numpy as np
+import pandas as pd
+from log_parser import match_first, extract_fields, report_malformed, US_PER_SEC
+from log_cache import load_log
+from profiling import stage
+
+###########################################
+# End-to-end request/response round trips of the node.c application.
+#
+# The root sends requests numbered by a counter and every destination answers
+# with the same number:
+#
+#   <root>  Sending request N to 6G-<dst>
+#   <dst>   Received request N from 6G-<root>
+#   <dst>   Sending response N to 6G-<root>
+#   <root>  Received response N from 6G-<dst>
+#
+# The four kinds of lines are extracted in bulk and joined on the counter with
+# hash joins (pd.merge), so the cost is linear in the number of requests, and the
+# latencies are exact instead of the "ack within 1 second" guess of
+# packet_matching. The counter restarts with the simulation, so the key is
+# (counter, segment): the segment of a line is the number of times the counter
+# of the requests sent went back before it, and a lost or duplicated line only
+# affects its own request.
+
+APP_MODULE = 'App'
+
+APP_PATTERNS = [
+    ('request_sent', 'Sending request '),
+    ('request_received', 'Received request '),
+    ('response_sent', 'Sending response '),
+    ('response_received', 'Received response '),
+]
+
+APP_RE = r'(?:Sending|Received) (?:request|response) (\d+) (?:to|from) 6G-(\d+)'
+
+LATENCIES = ['request_latency', 'response_latency', 'round_trip']
+
+# quantiles reported per destination
+QUANTILES = [0.5, 0.9, 0.99]
+
+###########################################
+
+# Restart segment of every row: the number of restarts of the counter of the
+# requests sent (a count lower than the previous one) at earlier rows
+def restart_segments(sent, rows):
+    counts = sent['count'].to_numpy()
+    restarts = sent['row'].to_numpy()[1:][counts[1:] < counts[:-1]]
+    return np.searchsorted(restarts, rows, side='right')
+
+# One frame per kind of App line: row, timestamp_us, node_id, count, peer and the
+# segment of the join key; a line repeated by the same node within a segment is dropped
+def app_events(log):
+    masks = match_first(log, APP_PATTERNS)
+    app = log.is_module(APP_MODULE)
+    events = {}
+    for name, _ in APP_PATTERNS:
+        frame = extract_fields(log, masks[name] & app, APP_RE, ['count', 'peer'])
+        events[name] = frame[frame['count'] >= 0]
+    sent = events['request_sent']
+    for name, frame in events.items():
+        frame = frame.assign(segment=restart_segments(sent, frame['row'].to_numpy()))
+        events[name] = frame.drop_duplicates(['count', 'segment', 'node_id'])
+    return events
+
+# One row per request sent: count, src, dst, the timestamps (sec, NaN if missing) of
+# the four steps, request_latency and response_latency (one-way), round_trip, and
+# whether the request or the response was lost
+@stage(rows=len)
+def match_round_trips(log):
+    events = app_events(log)
+    keys = ['count', 'segment']
+
+    requests = events['request_sent'].rename(columns={'node_id': 'src', 'peer': 'dst', 'timestamp_us': 'request_sent'})
+    steps = [
+        ('request_received', 'dst'),
+        ('response_sent', 'dst'),
+        ('response_received', 'src'),
+    ]
+    trips = requests[keys + ['src', 'dst', 'request_sent']]
+    for name, node in steps:
+        # only the lines logged by the expected node belong to the request
+        step = events[name].rename(columns={'node_id': node, 'timestamp_us': name})[keys + [node, name]]
+        trips = trips.merge(step, on=keys + [node], how='left', validate='one_to_one')
+
+    for name in ['request_sent'] + [name for name, _ in steps]:
+        trips[name] = trips[name] / US_PER_SEC
+    trips['request_latency'] = trips['request_received'] - trips['request_sent']
+    trips['response_latency'] = trips['response_received'] - trips['response_sent']
+    trips['round_trip'] = trips['response_received'] - trips['request_sent']
+    trips['request_lost'] = trips['request_received'].isna()
+    trips['response_lost'] = ~trips['request_lost'] & trips['response_received'].isna()
+    return trips.sort_values('request_sent', kind='stable').reset_index(drop=True)
+
+# Per-destination requests, lost requests and responses, and the mean / quantiles / max
+# (sec) of every latency
+def summarize_round_trips(trips, quantiles=QUANTILES):
+    grouped = trips.groupby('dst', sort=True)
+    summary = pd.DataFrame({
+        'requests': grouped.size(),
+        'lost_requests': grouped['request_lost'].sum(),
+        'lost_responses': grouped['response_lost'].sum(),
+    })
+    for latency in LATENCIES:
+        values = grouped[latency]
+        summary[f'{latency}_mean'] = values.mean()
+        for q in quantiles:
+            summary[f'{latency}_p{round(q * 100)}'] = values.quantile(q)
+        summary[f'{latency}_max'] = values.max()
+    return summary
+
+def print_summary(trips, summary):
+    requests = len(trips)
+    lost_requests = int(trips['request_lost'].sum())
+    lost_responses = int(trips['response_lost'].sum())
+    print(f"Requests: {requests}, lost requests: {lost_requests}, lost responses: {lost_responses}")
+    for latency in LATENCIES:
+        values = trips[latency].dropna()
+        if len(values):
+            print(f"{latency}: mean {values.mean():.4f} s, median {values.median():.4f} s, "
+                  f"p99 {values.quantile(0.99):.4f} s, max {values.max():.4f} s")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 250):
+        print(summary.round(4).to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact request/response latencies and losses of the node.c application, per destination")
+    parser.add_argument("logfile")
+    parser.add_argument("-o", "--output", help="write the per-request rows to this CSV file")
+    parser.add_argument("-s", "--summary", help="write the per-destination summary to this CSV file")
+    args = parser.parse_args()
+
+    log = load_log(args.logfile)
+    report_malformed(log, args.logfile)
+    trips = match_round_trips(log)
+    summary = summarize_round_trips(trips)
+    print_summary(trips, summary)
+    if args.output:
+        trips.to_csv(args.output, index=False)
+        print(f"Round trips saved to {args.output}")
+    if args.summary:
+        summary.to_csv(args.summary)
+        print(f"Summary saved to {args.summary}")
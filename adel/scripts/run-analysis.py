@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
 import sys
 import time
-import matplotlib.pyplot as pl
-import re
+import numpy as np
+from matplotlib.figure import Figure
+from log_parser import parse_line, iter_log, report_malformed, US_PER_SEC
+from energest import EnergestTotals
+import profiling
+from profiling import stage
 
 ###########################################
 
@@ -15,15 +20,11 @@ PLOT_ALL_NODES = True
 
 LOG_FILE = 'DFA52021_log.txt'
 
-COORDINATOR_ID = 1
+# follow mode: how often to print per-node stats (simulated seconds) and to poll the log (wall seconds)
+FOLLOW_REPORT_SECONDS = 60
+FOLLOW_POLL_SECONDS = 0.5
 
-# for charge calculations
-CC2650_MHZ = 48
-CC2650_RADIO_TX_CURRENT_MA = 9.100  # at 5 dBm, from CC2650 datasheet
-CC2650_RADIO_RX_CURRENT_MA = 5.900  # from CC2650 datasheet
-CC2650_RADIO_CPU_ON_CURRENT = 0.061 * CC2650_MHZ  # from CC2650 datasheet
-CC2650_RADIO_CPU_SLEEP_CURRENT = 1.335  # empirical
-CC2650_RADIO_CPU_DEEP_SLEEP_CURRENT = 0.010  # empirical
+COORDINATOR_ID = 1
 
 ###########################################
 
@@ -32,7 +33,40 @@ node_id_to_device_id = {}
 
 ###########################################
 
+# number of set bits in every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Set of non-negative sequence numbers stored as a growable bitmap, one bit per seqnum
+class SeqnumBitmap:
+    __slots__ = ('bits',)
+
+    def __init__(self, size=64):
+        self.bits = np.zeros(size // 8 or 1, dtype=np.uint8)
+
+    def add(self, seqnum):
+        index = seqnum >> 3
+        if index >= len(self.bits):
+            bits = np.zeros(max(index + 1, 2 * len(self.bits)), dtype=np.uint8)
+            bits[:len(self.bits)] = self.bits
+            self.bits = bits
+        self.bits[index] |= 1 << (seqnum & 7)
+
+    def __contains__(self, seqnum):
+        index = seqnum >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (seqnum & 7)))
+
+    def __len__(self):
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64))
+
 class NodeStats:
+    __slots__ = (
+        'id', 'is_valid', 'is_tsch_joined', 'tsch_join_time_sec', 'rpl_join_time_sec',
+        'tsch_time_source', 'rpl_parent', 'max_seqnum_sent', 'seqnums_received_on_root',
+        'parent_packets_tx', 'parent_packets_ack', 'parent_packets_queue_dropped',
+        'energest',
+        'pdr', 'rpl_parent_changes', 'par', 'rdc', 'rdc_joined', 'charge',
+    )
+
     def __init__(self, id):
         self.id = id
 
@@ -44,21 +78,12 @@ class NodeStats:
         self.tsch_time_source = None
         self.rpl_parent = None
         self.max_seqnum_sent = 0
-        self.seqnums_received_on_root = set()
+        self.seqnums_received_on_root = SeqnumBitmap()
         self.parent_packets_tx = 0
         self.parent_packets_ack = 0
         self.parent_packets_queue_dropped = 0
-        self.energest_cpu_on = 0
-        self.energest_cpu_sleep = 0
-        self.energest_cpu_deep_sleep = 0
-        self.energest_radio_tx = 0
-        self.energest_radio_rx = 0
-        self.energest_radio_rx_joined = 0
-        self.energest_total = 0
-        self.energest_total_joined = 0
-        self.energest_ticks_per_second = 1
-        self.energest_joined = False
-        self.energest_period_seconds = 60
+        # running totals of the complete Energest periods
+        self.energest = EnergestTotals()
 
         # final metrics (uninitialized)
         self.pdr = 0.0
@@ -69,44 +94,32 @@ class NodeStats:
         self.charge = None
 
     # calculate the final metrics
-    def calc(self):
-        if self.energest_total:
-            radio_on = self.energest_radio_tx + self.energest_radio_rx
-            self.rdc = 100.0 * radio_on / self.energest_total
-
-            cpu_on_sec = self.energest_cpu_on / self.energest_ticks_per_second
-            cpu_sleep_sec = self.energest_cpu_sleep / self.energest_ticks_per_second
-            cpu_deep_sleep_sec = self.energest_cpu_deep_sleep / self.energest_ticks_per_second
-            radio_tx_sec = self.energest_radio_tx / self.energest_ticks_per_second
-            radio_rx_sec = self.energest_radio_rx / self.energest_ticks_per_second
-
-            self.charge = CC2650_RADIO_TX_CURRENT_MA * radio_tx_sec \
-                + CC2650_RADIO_RX_CURRENT_MA * radio_rx_sec \
-                + CC2650_RADIO_CPU_ON_CURRENT * cpu_on_sec \
-                + CC2650_RADIO_CPU_SLEEP_CURRENT * cpu_sleep_sec \
-                + CC2650_RADIO_CPU_DEEP_SLEEP_CURRENT * cpu_deep_sleep_sec
-
+    def calc(self, verbose=True):
+        energy = self.energest.energy()
+        if energy is not None and energy['total']:
+            self.rdc = float(energy['rdc'])
+            self.rdc_joined = float(energy['rdc_joined'])
+            self.charge = float(energy['charge'])
         else:
-            print("warning: no energest results for {}".format(self.id))
+            if verbose:
+                print("warning: no energest results for {}".format(self.id))
             self.rdc = 0.0
-            self.charge = 0.0
-
-        if self.energest_total_joined:
-            radio_on_joined = self.energest_radio_tx + self.energest_radio_rx_joined
-            self.rdc_joined = 100.0 * radio_on_joined / self.energest_total_joined
-        else:
             self.rdc_joined = 0
+            self.charge = 0.0
 
         if self.tsch_join_time_sec is None:
-            print("node {} never associated TSCH".format(self.id))
+            if verbose:
+                print("node {} never associated TSCH".format(self.id))
             return 0, 0, 0, 0, 0
 
         if self.rpl_join_time_sec is None:
-            print("node {} never joined RPL DAG".format(self.id))
+            if verbose:
+                print("node {} never joined RPL DAG".format(self.id))
             return 0, 0, 0, 0, 0
 
         if self.max_seqnum_sent == 0:
-            print("node {} never sent any data packets".format(self.id))
+            if verbose:
+                print("node {} never sent any data packets".format(self.id))
             return 0, 0, 0, 0, 0
 
         self.is_valid = True
@@ -117,7 +130,7 @@ class NodeStats:
             self.par = 0.0
 
         expected = self.max_seqnum_sent
-        actual = len(self.seqnums_received_on_root)
+        actual = len(self.seqnums_received_on_root)  # popcount of the bitmap
         if expected:
             self.pdr = 100.0 * actual / expected
         else:
@@ -127,7 +140,7 @@ class NodeStats:
             self.parent_packets_ack, \
             self.parent_packets_queue_dropped, \
             self.max_seqnum_sent, \
-            len(self.seqnums_received_on_root)
+            actual
 
 ###########################################
 
@@ -156,118 +169,121 @@ def addr_to_id(addr):
 # Parse a log file
 
 def parse_log_line(line):
-    match = re.match(r'(\d+\.\d+)\s+ID:(\d+)\s+\[(\w+):\s+(\w+)\s*\]\s+(.*)', line)
-    if match:
-        timestamp, node_id, log_level, module, message = match.groups()
-        return {
-            'timestamp': float(timestamp),
-            'node_id': int(node_id),
-            'log_level': log_level,
-            'module': module,
-            'message': message
-        }
-    else:
-        print(f"Warning: Failed to parse line: {line}")
+    entry = parse_line(line)
+    if entry is None:
         return None
+    timestamp_us, node_id, log_level, module, message = entry
+    return {
+        'timestamp': timestamp_us / US_PER_SEC,
+        'node_id': node_id,
+        'log_level': log_level,
+        'module': module,
+        'message': message
+    }
 
+###########################################
+# Message handlers, dispatched on the module of the log line.
+#
+# Each module has a short table of (pattern, handler) entries, and a line goes
+# to the first handler whose pattern is in its message. Lines of modules without
+# handlers (most TSCH/IPv6 chatter) are skipped after one dict lookup. The
+# per-module tables are a few entries long, where plain substring checks are
+# faster than one combined regex.
+
+# module -> ((pattern, handler), ...)
+DISPATCH = {}
+
+# Call handler(nodes, ts, node, message) for the lines of module whose message contains pattern
+def register_handler(module, pattern, handler):
+    DISPATCH[module] = DISPATCH.get(module, ()) + ((pattern, handler),)
+
+def on_association_done(nodes, ts, node, message):
+    if nodes[node].tsch_join_time_sec is None:
+        nodes[node].tsch_join_time_sec = ts
+    nodes[node].is_tsch_joined = True
+
+def on_leaving_network(nodes, ts, node, message):
+    nodes[node].is_tsch_joined = False
+    nodes[node].energest.leave()
+
+def on_time_source(nodes, ts, node, message):
+    nodes[node].tsch_time_source = extract_macaddr(message.split(" -> ")[1])
+
+def on_set_preferred_parent(nodes, ts, node, message):
+    nodes[node].rpl_parent_changes += 1
+    nodes[node].rpl_parent = extract_ipaddr(message.split("used to be ")[1])
+    if nodes[node].rpl_join_time_sec is None:
+        nodes[node].rpl_join_time_sec = ts
+
+def on_parent_switch(nodes, ts, node, message):
+    nodes[node].rpl_parent_changes += 1
+    old_parent, new_parent = extract_ipaddr_pair(message.split()[3:])
+    nodes[node].rpl_parent = new_parent
+    if nodes[node].rpl_join_time_sec is None:
+        nodes[node].rpl_join_time_sec = ts
+
+def on_app_generate(nodes, ts, node, message):
+    seqnum = int(message.split("seqnum=")[1])
+    nodes[node].max_seqnum_sent = max(nodes[node].max_seqnum_sent, seqnum)
+
+def on_app_receive(nodes, ts, node, message):
+    seqnum = int(message.split("seqnum=")[1])
+    fromaddr = message.split("from=")[1]
+    from_node = addr_to_id(fromaddr)
+    if from_node not in nodes:
+        nodes[from_node] = NodeStats(from_node)
+    nodes[from_node].seqnums_received_on_root.add(seqnum)
+
+def on_energest(nodes, ts, node, message):
+    nodes[node].energest.add_line(message, nodes[node].is_tsch_joined)
+
+def on_link_stats(nodes, ts, node, message):
+    parts = message.split()
+    tx = int(parts[2].split("=")[1])
+    ack = int(parts[3].split("=")[1])
+    queue_drops = int(parts[4].split("=")[1])
+    to_addr = parts[5].split("=")[1]
+    if nodes[node].tsch_time_source == to_addr:
+        nodes[node].parent_packets_tx += tx
+        nodes[node].parent_packets_ack += ack
+        nodes[node].parent_packets_queue_dropped += queue_drops
+
+register_handler("TSCH", "association done", on_association_done)
+register_handler("TSCH", "leaving the network", on_leaving_network)
+register_handler("TSCH Queue", "update time source", on_time_source)
+register_handler("RPL", "rpl_set_preferred_parent", on_set_preferred_parent)
+register_handler("RPL", "parent switch: ", on_parent_switch)
+register_handler("App", "app generate packet", on_app_generate)
+register_handler("App", "app receive packet", on_app_receive)
+register_handler("App", "num packets", on_link_stats)
+register_handler("Energest", "", on_energest)
+
+# Update the per-node state with one log entry
+def process_entry(nodes, ts, node, module, message):
+    if node not in nodes:
+        nodes[node] = NodeStats(node)
+
+    for pattern, handler in DISPATCH.get(module, ()):
+        if pattern in message:
+            handler(nodes, ts, node, message)
+            return
+
+@stage()
 def analyze_results(filename):
     nodes = {}
-    start_ts_unix = None
+    stats = {}
 
     with open(filename, "r") as f:
-        for line in f:
-            line = line.strip()
-            entry = parse_log_line(line)
-            if entry:
-                ts = entry['timestamp']
-                node = entry['node_id']
-                message = entry['message']
-
-                if node not in nodes:
-                    nodes[node] = NodeStats(node)
-
-                if "association done" in message:
-                    if nodes[node].tsch_join_time_sec is None:
-                        nodes[node].tsch_join_time_sec = ts / 1000
-                    nodes[node].is_tsch_joined = True
-                    continue
-
-                if "leaving the network" in message:
-                    nodes[node].is_tsch_joined = False
-                    nodes[node].energest_joined = False
-                    continue
-
-                if "update time source" in message:
-                    nodes[node].tsch_time_source = extract_macaddr(message.split(" -> ")[1])
-                    continue
-
-                if "rpl_set_preferred_parent" in message:
-                    nodes[node].rpl_parent_changes += 1
-                    nodes[node].rpl_parent = extract_ipaddr(message.split("used to be ")[1])
-                    if nodes[node].rpl_join_time_sec is None:
-                        nodes[node].rpl_join_time_sec = ts / 1000
-                    continue
-
-                if "parent switch: " in message:
-                    nodes[node].rpl_parent_changes += 1
-                    old_parent, new_parent = extract_ipaddr_pair(message.split()[3:])
-                    nodes[node].rpl_parent = new_parent
-                    if nodes[node].rpl_join_time_sec is None:
-                        nodes[node].rpl_join_time_sec = ts / 1000
-                    continue
-
-                if "app generate packet" in message:
-                    seqnum = int(message.split("seqnum=")[1])
-                    nodes[node].max_seqnum_sent = max(nodes[node].max_seqnum_sent, seqnum)
-                    continue
-
-                if "app receive packet" in message:
-                    seqnum = int(message.split("seqnum=")[1])
-                    fromaddr = message.split("from=")[1]
-                    from_node = addr_to_id(fromaddr)
-                    if from_node not in nodes:
-                        nodes[from_node] = NodeStats(from_node)
-                    nodes[from_node].seqnums_received_on_root.add(seqnum)
-                    continue
-
-                if "num packets" in message:
-                    parts = message.split()
-                    tx = int(parts[2].split("=")[1])
-                    ack = int(parts[3].split("=")[1])
-                    queue_drops = int(parts[4].split("=")[1])
-                    to_addr = parts[5].split("=")[1]
-                    if nodes[node].tsch_time_source == to_addr:
-                        nodes[node].parent_packets_tx += tx
-                        nodes[node].parent_packets_ack += ack
-                        nodes[node].parent_packets_queue_dropped += queue_drops
-                    continue
-
-                if "INFO: Energest" in message:
-                    if "Period" in message:
-                        nodes[node].energest_period_seconds = int(message.split()[2])
-                    elif "Total time" in message:
-                        total = int(message.split()[3])
-                        nodes[node].energest_total += total
-                        nodes[node].energest_ticks_per_second = total / nodes[node].energest_period_seconds
-                        if nodes[node].energest_joined:
-                            nodes[node].energest_total_joined += total
-                    else:
-                        ticks = int(message.split()[3])
-                        if "CPU" in message:
-                            nodes[node].energest_cpu_on += ticks
-                        elif "Deep LPM" in message:
-                            nodes[node].energest_cpu_sleep += ticks
-                        elif "LPM" in message:
-                            nodes[node].energest_cpu_deep_sleep += ticks
-                        elif "Radio Tx" in message:
-                            nodes[node].energest_radio_tx += ticks
-                        elif "Radio Rx" in message:
-                            nodes[node].energest_radio_rx += ticks
-                            if nodes[node].energest_joined:
-                                nodes[node].energest_radio_rx_joined += ticks
-                            nodes[node].energest_joined = nodes[node].is_tsch_joined
-                    continue
+        for ts_us, node, log_level, module, message in iter_log(f, stats):
+            process_entry(nodes, ts_us / US_PER_SEC, node, module, message)
 
+    report_malformed(stats.get('malformed', 0), filename)
+    profiling.count(lines=stats.get('lines', 0))
+    return summarize_results(nodes)
+
+# Calculate the final metrics of all nodes
+@stage(rows=lambda result: len(result[0]))
+def summarize_results(nodes):
     print(f"Total nodes parsed: {len(nodes)}")
     r = []
     total_ll_sent = 0
@@ -301,19 +317,87 @@ def analyze_results(filename):
     e2e_pdr = 100.0 * total_e2e_received / total_e2e_sent if total_e2e_sent else 0.0
     return r, ll_par, total_ll_queue_dropped, e2e_pdr
 
+#######################################################
+# Follow a log while COOJA is still writing it
+
+# Yield complete lines appended to f; stops after idle_timeout wall seconds without new data
+def follow_lines(f, poll_interval=FOLLOW_POLL_SECONDS, idle_timeout=None):
+    pending = ""
+    idle = 0.0
+    while True:
+        line = f.readline()
+        if not line:
+            if os.fstat(f.fileno()).st_size < f.tell():
+                # the simulation script truncates the log when a new run starts
+                f.seek(0)
+                pending = ""
+                continue
+            if idle_timeout is not None and idle >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+            idle += poll_interval
+            continue
+        idle = 0.0
+        if not line.endswith("\n"):
+            pending += line
+            continue
+        yield pending + line
+        pending = ""
+
+def print_live_stats(nodes, sim_time):
+    print(f"--- {sim_time:.0f} s simulated, {len(nodes)} nodes ---")
+    for k in sorted(nodes.keys()):
+        n = nodes[k]
+        if n.id == COORDINATOR_ID:
+            continue
+        n.calc(verbose=False)
+        print(f"Node {n.id}: PDR={n.pdr:.2f} PAR={n.par:.2f} RDC={n.rdc:.2f} charge={n.charge:.2f}")
+    sys.stdout.flush()
+
+# Feed each new line of a growing log into the node state, printing stats every interval simulated seconds
+@stage()
+def follow_results(filename, interval=FOLLOW_REPORT_SECONDS, idle_timeout=None):
+    nodes = {}
+    stats = {}
+    last_ts = 0.0
+    next_report = interval
+
+    with open(filename, "r") as f:
+        try:
+            for ts_us, node, log_level, module, message in iter_log(follow_lines(f, idle_timeout=idle_timeout), stats):
+                ts = ts_us / US_PER_SEC
+                if ts < last_ts:
+                    print("Log restarted, resetting node state")
+                    nodes = {}
+                    next_report = interval
+                last_ts = ts
+                if ts >= next_report:
+                    print_live_stats(nodes, next_report)
+                    next_report = (ts // interval + 1) * interval
+                process_entry(nodes, ts, node, module, message)
+        except KeyboardInterrupt:
+            pass
+
+    report_malformed(stats.get('malformed', 0), filename)
+    profiling.count(lines=stats.get('lines', 0))
+    return summarize_results(nodes)
+
 #######################################################
 # Plot the results of a given metric as a bar chart
 
+@stage()
 def plot(results, metric, ylabel):
     if not results:
         print(f"No results to plot for {metric}")
         return
     
-    pl.figure(figsize=(5, 4))
+    # a Figure outside pyplot needs no GUI backend and is freed once saved
+    fig = Figure(figsize=(5, 4))
+    ax = fig.subplots()
 
     data = [r[metric] for r in results]
     x = range(len(data))
-    barlist = pl.bar(x, data, width=0.4)
+    barlist = ax.bar(x, data, width=0.4)
 
     for b in barlist:
         b.set_color("orange")
@@ -321,33 +405,43 @@ def plot(results, metric, ylabel):
         b.set_linewidth(1)
 
     ids = [r["id"] for r in results]
-    pl.xticks(x, [str(u) for u in ids], rotation=90)
-    pl.xlabel("Node ID")
-    pl.ylabel(ylabel)
+    ax.set_xticks(x, [str(u) for u in ids], rotation=90)
+    ax.set_xlabel("Node ID")
+    ax.set_ylabel(ylabel)
 
     if metric == "pdr":
         miny = min(80, min(data))
-        pl.ylim([miny, 100])
+        ax.set_ylim([miny, 100])
     else:
-        pl.ylim(ymin=0)
+        ax.set_ylim(bottom=0)
 
-    pl.savefig("plot_{}.pdf".format(metric), format="pdf", bbox_inches='tight')
-    pl.close()
+    fig.savefig("plot_{}.pdf".format(metric), format="pdf", bbox_inches='tight')
 
 #######################################################
 # Run the application
 
 def main():
-    input_file = LOG_FILE
-    if len(sys.argv) > 1:
-        # change from the default
-        input_file = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Analyze a COOJA log")
+    parser.add_argument("input_file", nargs="?", default=LOG_FILE)
+    parser.add_argument("-f", "--follow", action="store_true",
+                        help="keep reading the log while the simulation writes it")
+    parser.add_argument("-n", "--interval", type=float, default=FOLLOW_REPORT_SECONDS,
+                        help="print per-node stats every N simulated seconds in follow mode")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="stop following after N wall seconds without new lines")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+    input_file = args.input_file
 
     if not os.access(input_file, os.R_OK):
         print('The input file "{}" does not exist'.format(input_file))
         exit(-1)
 
-    results, ll_par, ll_queue_dropped, e2e_pdr = analyze_results(input_file)
+    if args.follow:
+        results, ll_par, ll_queue_dropped, e2e_pdr = follow_results(input_file, args.interval, args.idle_timeout)
+    else:
+        results, ll_par, ll_queue_dropped, e2e_pdr = analyze_results(input_file)
 
     print("Link-layer PAR={:.2f} ({} packets queue dropped) End-to-end PDR={:.2f}".format(
         ll_par, ll_queue_dropped, e2e_pdr))
@@ -11,7 +11,6 @@ JS_DIR="/home/adel/contiki-ng-attacks/examples/benchmarks/faya/adel/scripts/sim_
 
 # Output directory for logs
 LOG_DIR="/home/adel/contiki-ng-attacks/examples/benchmarks/faya/adel/logs"
-mkdir -p "$LOG_DIR"
 
 # Path to Contiki directory
 CONTIKI_DIR="/home/adel/contiki-ng-attacks"
@@ -19,25 +18,17 @@ CONTIKI_DIR="/home/adel/contiki-ng-attacks"
 # Path to Python analysis script
 PYTHON_ANALYSIS_SCRIPT="/home/adel/contiki-ng-attacks/examples/benchmarks/faya/adel/scripts/metrics_scripts/network_node_metrics_calculator.py"
 
-# Loop through each JavaScript file in the directory
-for JS_FILE in "$JS_DIR"/*.js; do
-  # Extract the base name of the JavaScript file (without extension)
-  JS_BASE=$(basename "$JS_FILE" .js)
-
-  # Run the Cooja simulation with the current JavaScript file
-  echo "Running simulation with $JS_FILE"
-  LOG_FILE="$LOG_DIR/${JS_BASE}_log.txt"
-
-  # Example of redirecting standard output and error to log file
-  java -jar "$COOJA_JAR" -nogui="$SIM_CONFIG" -contiki="$CONTIKI_DIR" -script="$JS_FILE" &> "$LOG_FILE"
-
-  echo "Simulation completed for $JS_FILE. Log saved to $LOG_FILE"
-
-  # Run the Python analysis script on the generated log file
-  echo "Analyzing log file $LOG_FILE"
-  python3 "$PYTHON_ANALYSIS_SCRIPT" "$LOG_FILE"
-  echo "Analysis completed for $LOG_FILE"
-done
-
-echo "All simulations and analyses completed."
-
+# Number of simulations run at once (0: one per CPU), runs (seeds) per script
+# and seconds after which a stuck simulation is killed and retried
+JOBS=0
+RUNS=1
+TIMEOUT=3600
+
+# Run every simulation in parallel and analyse each log as soon as it is
+# written; running the script again resumes an interrupted batch
+python3 "$(dirname "$0")/batch_runner.py" "$JS_DIR" \
+  --log-dir "$LOG_DIR" \
+  --cooja "$COOJA_JAR" --config "$SIM_CONFIG" --contiki "$CONTIKI_DIR" \
+  --runs "$RUNS" -j "$JOBS" --timeout "$TIMEOUT" \
+  --analysis "python3 '$PYTHON_ANALYSIS_SCRIPT' {log}" \
+  "$@"
@@ -0,0 +1,50 @@
+import os
+import sys
+import pytest
+
+###########################################
+# The scripts import each other by module name, as when run from their folder.
+# The fixture logs are the two COOJA logs of adel/logs, parsed once per session
+# without the log cache (which would write next to them); the captures are the
+# ones of adel/PCAP.
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGS_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), 'logs')
+PCAP_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), 'PCAP')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from log_parser import parse_log
+
+NORMAL_LOG = 'normal.txt'
+ATTACK_LOG = 'SFA+SHA52021_log.txt'
+FIXTURE_LOGS = [NORMAL_LOG, ATTACK_LOG]
+
+###########################################
+
+@pytest.fixture(scope='session')
+def log_path():
+    return lambda name: os.path.join(LOGS_DIR, name)
+
+@pytest.fixture(scope='session')
+def capture_path():
+    return lambda name: os.path.join(PCAP_DIR, name)
+
+# Parsed LogTable of a fixture log, by file name
+@pytest.fixture(scope='session')
+def fixture_log(log_path):
+    logs = {}
+
+    def get(name):
+        if name not in logs:
+            logs[name] = parse_log(log_path(name))
+        return logs[name]
+    return get
+
+# Parsed LogTable of lines written to a temporary file
+@pytest.fixture
+def make_log(tmp_path):
+    def make(lines):
+        path = tmp_path / 'log.txt'
+        path.write_text(''.join(line + '\n' for line in lines))
+        return parse_log(str(path))
+    return make
@@ -0,0 +1,137 @@
+import json
+import os
+import shlex
+import sys
+import time
+import pytest
+from batch_runner import make_jobs, run_batch, STATE_FILE, PARTIAL_SUFFIX
+
+###########################################
+# The batch runs a stub instead of COOJA: a Python script that counts its runs
+# next to the log and behaves according to its mode.
+
+STUB = '''
+import os, subprocess, sys, time
+mode, log, seed = sys.argv[1:]
+if os.environ['RPL_LOG_PATH'] != log or os.environ['RPL_SEED'] != seed:
+    sys.exit(9)
+runs = log + '.runs'
+count = int(open(runs).read()) + 1 if os.path.exists(runs) else 1
+with open(runs, 'w') as f:
+    f.write(str(count))
+if mode == 'flaky' and count == 1:
+    sys.exit(3)
+if mode == 'hang':
+    child = subprocess.Popen(['sleep', '60'])
+    with open(log + '.child', 'w') as f:
+        f.write(str(child.pid))
+    time.sleep(60)
+with open(log, 'w') as f:
+    if mode != 'empty':
+        f.write('1.0\\tID:1\\t[INFO: Main      ] seed ' + seed + '\\n')
+'''
+
+ANALYSIS_STUB = '''
+import sys
+print(len(open(sys.argv[1]).readlines()), 'lines')
+'''
+
+def python_command(path, *fields):
+    return ' '.join([shlex.quote(sys.executable), shlex.quote(str(path))] + list(fields))
+
+@pytest.fixture
+def batch(tmp_path):
+    stub = tmp_path / 'stub.py'
+    stub.write_text(STUB)
+    log_dir = tmp_path / 'logs'
+
+    def run(mode, seeds=(1,), **options):
+        jobs = make_jobs(['sim_script.js'], list(seeds), str(log_dir))
+        counts = run_batch(jobs, str(log_dir), python_command(stub, mode, '{log}', '{seed}'), **options)
+        return jobs, counts
+    return run
+
+def state_records(jobs):
+    with open(os.path.join(os.path.dirname(jobs[0].log), STATE_FILE)) as f:
+        return [json.loads(line) for line in f]
+
+def runs(job):
+    with open(job.log + PARTIAL_SUFFIX + '.runs') as f:
+        return int(f.read())
+
+# A process is gone once it no longer exists or is a zombie waiting for its parent
+def is_gone(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except FileNotFoundError:
+        return True
+
+###########################################
+
+def test_simulation_writes_the_log(batch):
+    jobs, counts = batch('ok', seeds=(1, 2), analysis=None, jobs_count=2)
+    assert counts == {'simulation': {'done': 2}, 'analysis': {}}
+    for job in jobs:
+        assert not os.path.exists(job.log + PARTIAL_SUFFIX)
+        with open(job.log) as f:
+            assert f.read().endswith(f'seed {job.seed}\n')
+
+def test_retry_after_a_nonzero_exit(batch):
+    jobs, counts = batch('flaky', analysis=None, retries=1)
+    assert counts['simulation'] == {'done': 1}
+    assert runs(jobs[0]) == 2
+    assert os.path.exists(jobs[0].log)
+    [record] = state_records(jobs)
+    assert (record['status'], record['attempts']) == ('done', 2)
+
+def test_failure_without_retries(batch):
+    jobs, counts = batch('flaky', analysis=None)
+    assert counts['simulation'] == {'failed (3)': 1}
+    assert not os.path.exists(jobs[0].log)
+
+def test_timeout_kills_the_process_group(batch):
+    start = time.monotonic()
+    jobs, counts = batch('hang', analysis=None, timeout=2)
+    assert time.monotonic() - start < 30
+    assert counts['simulation'] == {'failed (timeout)': 1}
+    with open(jobs[0].log + PARTIAL_SUFFIX + '.child') as f:
+        child = int(f.read())
+    deadline = time.monotonic() + 5
+    while not is_gone(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert is_gone(child)
+    assert not os.path.exists(jobs[0].log)
+
+def test_empty_log_is_not_renamed(batch):
+    jobs, counts = batch('empty', analysis=None)
+    assert counts['simulation'] == {'failed (no log)': 1}
+    assert not os.path.exists(jobs[0].log)
+    assert not os.path.exists(jobs[0].log + PARTIAL_SUFFIX)
+
+def test_resume_skips_done_jobs(batch, tmp_path):
+    analysis_stub = tmp_path / 'analysis.py'
+    analysis_stub.write_text(ANALYSIS_STUB)
+    analysis = python_command(analysis_stub, '{log}')
+
+    jobs, counts = batch('ok', seeds=(1, 2), analysis=analysis)
+    assert counts == {'simulation': {'done': 2}, 'analysis': {'done': 2}}
+    with open(jobs[0].log + '.analysis') as f:
+        assert f.read() == '1 lines\n'
+
+    # a new seed is the only job left to run
+    jobs, counts = batch('ok', seeds=(1, 2, 3), analysis=analysis)
+    assert counts == {'simulation': {'skipped': 2, 'done': 1}, 'analysis': {'done': 1}}
+    assert [runs(job) for job in jobs] == [1, 1, 1]
+
+    # without resume, everything runs again
+    jobs, counts = batch('ok', seeds=(1, 2, 3), analysis=None, resume=False)
+    assert counts['simulation'] == {'done': 3}
+    assert [runs(job) for job in jobs] == [2, 2, 2]
+
+def test_resume_reruns_a_job_whose_log_is_gone(batch):
+    jobs, _ = batch('ok', analysis=None)
+    os.remove(jobs[0].log)
+    jobs, counts = batch('ok', analysis=None)
+    assert counts['simulation'] == {'done': 1}
+    assert runs(jobs[0]) == 2
@@ -0,0 +1,138 @@
+import pytest
+from energest import energest_periods, log_periods, node_energy, tsch_state, EnergestTotals, TICK_COLUMNS
+
+# (periods, sum of the CPU ticks) of the fixture logs, as summed by the
+# per-line loop of network_metrics_calculator.py before energest_periods
+BASELINE = {
+    'normal.txt': (144, 8640002020),
+    'SFA+SHA52021_log.txt': (144, 8640003692),
+}
+
+def block(period, total, cpu, lpm, tx, rx):
+    return [
+        f'--- Period summary #{period} (60 seconds)',
+        f'Total time  :   {total}',
+        f'CPU         :   {cpu}/  {total} (0 permil)',
+        f'LPM         :   {lpm}/  {total} (0 permil)',
+        f'Deep LPM    :          0/  {total} (0 permil)',
+        f'Radio Tx    :   {tx}/  {total} (0 permil)',
+        f'Radio Rx    :   {rx}/  {total} (0 permil)',
+        f'Radio total :   {tx + rx}/  {total} (0 permil)',
+    ]
+
+def log_line(time, node, module, text):
+    return f'{time:.3f}\tID:{node}\t[INFO: {module:<10}] {text}'
+
+# Energest blocks of node 2, which leaves and associates again during period 1,
+# interleaved with the ones of node 3, which never associates
+def joined_log_lines():
+    lines = [log_line(1, 2, 'TSCH', 'association done (1), sec 0')]
+    for period, (tx, rx) in enumerate([(40, 50), (5, 5), (20, 30), (10, 20)]):
+        t = 60 * (period + 1)
+        for node in (2, 3):
+            lines += [log_line(t, node, 'Energest', text) for text in block(period, 100, 10, 90, tx, rx)]
+        if period == 1:
+            lines += [log_line(t + 1, 2, 'TSCH', 'leaving the network, stats: tx 1'),
+                      log_line(t + 2, 2, 'TSCH', 'association done (1), sec 0')]
+    return lines
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_fixture_logs_match_the_baseline(fixture_log, name):
+    periods = log_periods(fixture_log(name))
+    assert len(periods) == BASELINE[name][0]
+    assert periods['complete'].all()
+    assert periods['cpu'].sum() == BASELINE[name][1]
+
+def test_interleaved_blocks_of_two_nodes():
+    first, second = block(0, 100, 10, 90, 5, 15), block(0, 200, 20, 180, 1, 3)
+    # the lines of node 2 are interleaved with the ones of node 1
+    messages = [line for pair in zip(first, second) for line in pair] + block(1, 100, 30, 70, 0, 50)[:3]
+    node_ids = [1, 2] * len(first) + [1] * 3
+    periods = energest_periods(range(len(messages)), node_ids, messages)
+
+    assert periods['node_id'].tolist() == [1, 1, 2]
+    assert periods['period'].tolist() == [0, 1, 0]
+    assert periods['complete'].tolist() == [True, False, True]
+    assert periods[TICK_COLUMNS].values.tolist()[0] == [100, 10, 90, 0, 5, 15]
+    assert periods[TICK_COLUMNS].values.tolist()[2] == [200, 20, 180, 0, 1, 3]
+
+    nodes = node_energy(periods)
+    assert nodes.loc[1, 'periods'] == 1
+    assert nodes.loc[1, 'rdc'] == pytest.approx(20.0)
+    assert nodes.loc[2, 'rdc'] == pytest.approx(2.0)
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_streaming_totals_match_node_energy(fixture_log, name):
+    log = fixture_log(name)
+    nodes = node_energy(log_periods(log))
+
+    totals = {}
+    mask = log.is_module('Energest')
+    for node_id, message in zip(log.node_id[mask], log.message[mask]):
+        totals.setdefault(int(node_id), EnergestTotals()).add_line(message)
+
+    assert sorted(totals) == nodes.index.tolist()
+    for node_id, node in totals.items():
+        energy = node.energy()
+        assert energy['periods'] == nodes.loc[node_id, 'periods']
+        for column in ['seconds'] + TICK_COLUMNS:
+            assert energy[column] == nodes.loc[node_id, column]
+        assert energy['rdc'] == pytest.approx(nodes.loc[node_id, 'rdc'])
+        assert energy['charge'] == pytest.approx(nodes.loc[node_id, 'charge'])
+
+def test_streaming_totals_skip_incomplete_periods():
+    totals = EnergestTotals()
+    assert totals.energy() is None
+    for line in block(0, 100, 10, 90, 5, 15)[:4] + block(1, 100, 10, 90, 20, 30):
+        totals.add_line(line)
+    energy = totals.energy()
+    assert energy['periods'] == 1
+    assert energy['rdc'] == pytest.approx(50.0)
+
+def test_tsch_state_of_the_energest_lines(make_log):
+    log = make_log(joined_log_lines())
+    mask = log.is_module('Energest')
+    joined, left = tsch_state(log, mask)
+    headers = [i for i, message in enumerate(log.message[mask]) if message.startswith('---')]
+    assert joined[headers].tolist() == [True, False, True, False, True, False, True, False]
+    assert left[headers].tolist() == [0, 0, 0, 0, 1, 0, 1, 0]
+
+def test_periods_after_leaving_are_not_joined(make_log):
+    periods = log_periods(make_log(joined_log_lines()))
+    assert periods[periods['node_id'] == 2]['joined'].tolist() == [False, True, False, True]
+    assert not periods[periods['node_id'] == 3]['joined'].any()
+
+    nodes = node_energy(periods)
+    # periods 1 and 3 of node 2: (10 + 30) radio ticks of 200
+    assert nodes.loc[2, 'rdc_joined'] == pytest.approx(20.0)
+    assert nodes.loc[3, 'rdc_joined'] == 0.0
+
+    totals = EnergestTotals()
+    for line in joined_log_lines():
+        if 'ID:2' in line and 'leaving the network' in line:
+            totals.leave()
+        elif 'ID:2' in line and 'Energest' in line:
+            totals.add_line(line.split('] ', 1)[1], joined=True)
+    assert totals.energy()['rdc_joined'] == pytest.approx(20.0)
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_fixture_logs_rdc_joined_matches_the_streaming_totals(fixture_log, name):
+    log = fixture_log(name)
+    nodes = node_energy(log_periods(log))
+    assert (nodes['rdc_joined'] > 0).sum() == len(nodes) - 1
+
+    # the TSCH state kept line by line, as in run-analysis.py
+    totals, joined = {}, {}
+    for node_id, module_code, message in zip(log.node_id, log.module_codes, log.message):
+        node_id, module = int(node_id), log.modules[module_code]
+        node = totals.setdefault(node_id, EnergestTotals())
+        if module == 'TSCH' and 'association done' in message:
+            joined[node_id] = True
+        elif module == 'TSCH' and 'leaving the network' in message:
+            joined[node_id] = False
+            node.leave()
+        elif module == 'Energest':
+            node.add_line(message, joined.get(node_id, False))
+
+    for node_id in nodes.index:
+        assert totals[node_id].energy()['rdc_joined'] == pytest.approx(nodes.loc[node_id, 'rdc_joined'])
@@ -0,0 +1,86 @@
+import re
+from collections import defaultdict
+import pytest
+from link_delivery import link_delivery
+
+# Totals over the links of the fixture logs:
+# (links, sent, delivered, duplicates, acked, failed, transmissions)
+TOTALS = {
+    'normal.txt': (54, 2086, 2079, 0, 2079, 6, 2219),
+    'SFA+SHA52021_log.txt': (56, 2456, 2417, 0, 2417, 37, 3328),
+}
+
+LINE_RE = re.compile(r'^([\d.]+)\tID:(\d+)\t\[\w+: *([^\]]*?) *\] (.*)$')
+QUEUED_RE = re.compile(r'send packet to LL-(\d+) with seqno (\d+)')
+DONE_RE = re.compile(r'packet sent to LL-(\d+), seqno (\d+), status (\d+), tx (\d+)')
+RECEIVED_RE = re.compile(r'received from LL-(\d+) with seqno (\d+)')
+
+# Line-by-line reference: every completion and reception belongs to the last
+# frame queued before it with the same (src, dst, seqno)
+def reference_links(path):
+    frames = []
+    last = {}
+
+    def frame_of(key):
+        return frames[last[key]] if key in last else None
+
+    with open(path) as file:
+        for line in file:
+            match = LINE_RE.match(line.rstrip('\n'))
+            if not match or match.group(3) != 'TSCH':
+                continue
+            node, message = int(match.group(2)), match.group(4)
+            if (fields := QUEUED_RE.search(message)):
+                dst, seqno = int(fields.group(1)), int(fields.group(2))
+                if dst and seqno < 256:
+                    last[(node, dst, seqno)] = len(frames)
+                    frames.append({'link': (node, dst), 'receptions': 0, 'status': -1, 'tx': 0})
+            elif (fields := DONE_RE.search(message)):
+                frame = frame_of((node, int(fields.group(1)), int(fields.group(2))))
+                if frame:
+                    frame['status'], frame['tx'] = int(fields.group(3)), int(fields.group(4))
+            elif (fields := RECEIVED_RE.search(message)):
+                frame = frame_of((int(fields.group(1)), node, int(fields.group(2))))
+                if frame:
+                    frame['receptions'] += 1
+
+    links = defaultdict(lambda: [0] * 6)
+    for frame in frames:
+        counts = links[frame['link']]
+        counts[0] += 1
+        counts[1] += frame['receptions'] > 0
+        counts[2] += max(frame['receptions'] - 1, 0)
+        counts[3] += frame['status'] == 0
+        counts[4] += frame['status'] > 0
+        counts[5] += frame['tx']
+    return dict(links)
+
+@pytest.mark.parametrize('name', sorted(TOTALS))
+def test_fixture_log_totals(fixture_log, name):
+    links = link_delivery(fixture_log(name))
+    columns = ['sent', 'delivered', 'duplicates', 'acked', 'failed', 'transmissions']
+    assert (len(links), *links[columns].sum().tolist()) == TOTALS[name]
+    assert (links['delivery_ratio'] == links['delivered'] / links['sent'] * 100).all()
+
+@pytest.mark.parametrize('name', sorted(TOTALS))
+def test_fixture_log_matches_the_line_loop(fixture_log, log_path, name):
+    links = link_delivery(fixture_log(name))
+    columns = ['sent', 'delivered', 'duplicates', 'acked', 'failed', 'transmissions']
+    engine = {link: row for link, row in zip(links.index, links[columns].values.tolist())}
+    assert engine == reference_links(log_path(name))
+
+def test_wrapped_seqno_and_duplicates(make_log):
+    links = link_delivery(make_log([
+        '1.0\tID:2\t[INFO: TSCH      ] send packet to LL-0001 with seqno 7, queue 1/64 1/64, len 21 40',
+        '1.1\tID:1\t[INFO: TSCH      ] received from LL-0002 with seqno 7',
+        '1.2\tID:1\t[INFO: TSCH      ] received from LL-0002 with seqno 7',
+        '1.3\tID:2\t[INFO: TSCH      ] packet sent to LL-0001, seqno 7, status 0, tx 2',
+        '9.0\tID:2\t[INFO: TSCH      ] send packet to LL-0001 with seqno 7, queue 1/64 1/64, len 21 40',
+        '9.1\tID:2\t[INFO: TSCH      ] packet sent to LL-0001, seqno 7, status 2, tx 3',
+        '9.2\tID:2\t[INFO: TSCH      ] send packet to LL-0000 with seqno 8, queue 1/64 1/64, len 21 40',
+    ]))
+    assert links.loc[(2, 1)].to_dict() == {
+        'sent': 2, 'delivered': 1, 'duplicates': 1, 'acked': 1, 'failed': 1,
+        'transmissions': 5, 'retransmissions': 3, 'delivery_ratio': 50.0,
+    }
+    assert len(links) == 1
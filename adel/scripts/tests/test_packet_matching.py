@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+import analysis
+from packet_matching import match_acks, summarize_latencies, per_node_metrics, binned_packet_sums
+from resample import TimeBins
+
+# Packet loss rate (%) and average latency (sec) of the per-transmission ack scan
+# of analysis.py before match_acks, on the fixture logs
+BASELINE = {
+    'normal.txt': (42.89843104872006, 0.3964962255965293),
+    'SFA+SHA52021_log.txt': (40.67856511751193, 0.3305450128090557),
+}
+
+# (node, packet loss rate, average latency) of a few nodes, same source
+BASELINE_NODES = {
+    'normal.txt': [(1, 14.634146341463413, 0.4484388033613447),
+                   (3, 67.51269035532995, 0.22801449999999335),
+                   (16, 83.13253012048193, 0.545504571428568)],
+    'SFA+SHA52021_log.txt': [(1, 37.48251748251748, 0.3731008322147633),
+                             (10, 24.171539961013643, 0.2734053264781481),
+                             (15, 36.771300448430495, 0.1863846808510676)],
+}
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['timestamp', 'node_id'])
+
+def test_first_ack_of_the_same_node_within_the_window():
+    transmissions = frame([(1.0, 2), (5.0, 2), (1.0, 3), (9.0, 3)])
+    acks = frame([(1.2, 2), (1.5, 2), (6.5, 2), (1.1, 4), (9.0, 3)])
+    latencies = match_acks(transmissions, acks)
+    np.testing.assert_allclose(latencies, [0.2, np.nan, np.nan, 0.0])
+
+def test_latencies_keep_the_order_of_the_transmissions():
+    transmissions = frame([(3.0, 1), (1.0, 1), (2.0, 1)])
+    acks = frame([(1.25, 1), (2.5, 1), (3.75, 1)])
+    np.testing.assert_allclose(match_acks(transmissions, acks), [0.75, 0.25, 0.5])
+
+def test_no_acks():
+    latencies = match_acks(frame([(1.0, 2)]), frame([]))
+    assert np.isnan(latencies).all()
+    assert summarize_latencies(latencies) == (100.0, 0)
+
+def test_binned_sums():
+    transmissions = frame([(1.0, 2), (5.0, 2), (12.0, 2), (3.0, 3)])
+    latencies = np.array([0.5, np.nan, 0.25, 0.75])
+    sums = binned_packet_sums(TimeBins([2, 3], 10, 2), transmissions, latencies)
+    assert sums['transmissions'].tolist() == [[2, 1], [1, 0]]
+    assert sums['lost'].tolist() == [[1, 0], [0, 0]]
+    assert sums['latency'].tolist() == [[0.5, 0.25], [0.75, 0.0]]
+    assert sums['per_second'].tolist() == [[0.2, 0.1], [0.1, 0.0]]
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_fixture_logs_match_the_baseline(fixture_log, name):
+    transmissions, acks, _ = analysis.extract_packet_info(fixture_log(name))
+    latencies = match_acks(transmissions, acks)
+    packet_loss_rate, avg_latency = summarize_latencies(latencies)
+    assert packet_loss_rate == pytest.approx(BASELINE[name][0], abs=1e-9)
+    assert avg_latency == pytest.approx(BASELINE[name][1], abs=1e-9)
+
+    metrics = per_node_metrics(transmissions, latencies)
+    for node, loss, latency in BASELINE_NODES[name]:
+        assert metrics.loc[node, 'packet_loss_rate'] == pytest.approx(loss, abs=1e-9)
+        assert metrics.loc[node, 'avg_latency'] == pytest.approx(latency, abs=1e-9)
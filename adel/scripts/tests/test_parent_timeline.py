@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from parent_timeline import ParentTimeline, parent_timeline, NO_PARENT
+
+# Parent switches per node of the fixture logs, as counted by the rpl_switches
+# of run-analysis.py before parent_timeline
+BASELINE = {
+    'normal.txt': {2: 1, 3: 1, 4: 1, 5: 1, 6: 2, 7: 1, 8: 1, 9: 1, 10: 1,
+                   11: 1, 12: 1, 13: 1, 14: 1, 15: 1, 16: 2},
+    'SFA+SHA52021_log.txt': {2: 1, 3: 4, 4: 1, 5: 6, 6: 2, 7: 2, 8: 2, 9: 30, 10: 30,
+                             11: 20, 12: 23, 13: 5, 14: 7, 15: 10, 16: 7},
+}
+
+# Parent of a node at a time (sec) by scanning the intervals
+def reference_parent(intervals, node, timestamp):
+    parent = NO_PARENT
+    for row in intervals.itertuples():
+        if row.node_id == node and row.start <= timestamp:
+            parent = row.parent
+    return parent
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_fixture_log_switches_match_the_baseline(fixture_log, name):
+    timeline = parent_timeline(fixture_log(name))
+    assert timeline.switches() == BASELINE[name]
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_fixture_log_lookups_match_a_scan(fixture_log, name):
+    log = fixture_log(name)
+    timeline = parent_timeline(log)
+    intervals = timeline.to_frame()
+
+    rng = np.random.default_rng(0)
+    nodes = rng.integers(1, 18, 200)
+    times = rng.uniform(0, log.timestamp[-1], 200)
+    # the switch times themselves and the instant before
+    nodes = np.concatenate([nodes, intervals['node_id'], intervals['node_id']])
+    times = np.concatenate([times, intervals['start'], intervals['start'] - 1e-6])
+
+    parents = timeline.parents_at(nodes, times)
+    expected = [reference_parent(intervals, node, timestamp) for node, timestamp in zip(nodes, times)]
+    assert parents.tolist() == expected
+
+    start, end = 100.0, 300.0
+    for parent in range(1, 17):
+        overlapping = intervals[(intervals['parent'] == parent) & (intervals['start'] < end)
+                                & (intervals['end'].isna() | (intervals['end'] > start))]
+        assert timeline.children(parent, start, end) == sorted(set(overlapping['node_id']))
+
+def test_intervals_of_unsorted_switches():
+    timeline = ParentTimeline.from_switches([5_000_000, 1_000_000, 2_000_000, 3_000_000],
+                                            [2, 2, 3, 2], [NO_PARENT, 1, 2, 3])
+    assert timeline.switches() == {2: 3, 3: 1}
+    assert timeline.parents_at([2, 2, 2, 2, 3, 4], [0.5, 1.0, 3.5, 6.0, 2.0, 2.0]).tolist() == [NO_PARENT, 1, 3, NO_PARENT, 2, NO_PARENT]
+    assert timeline.dodag(2.5) == {2: 1, 3: 2}
+    assert timeline.children(1, 0, 1.5) == [2]
+    assert timeline.children(1, 3.0, 4.0) == []
+    assert timeline.children(3, 4.0, 10.0) == [2]
+
+def test_rpl_lite_and_classic_lines(make_log):
+    timeline = parent_timeline(make_log([
+        '1.0\tID:2\t[INFO: RPL       ] parent switch: 6A-NULL -> 6G-001',
+        '2.0\tID:3\t[INFO: RPL       ] rpl_set_preferred_parent 6G-002 used to be NULL',
+        '3.0\tID:2\t[INFO: RPL       ] parent switch: 6G-001 -> 6A-NULL',
+    ]))
+    assert timeline.switches() == {2: 2, 3: 1}
+    assert timeline.parents_at([2, 3, 2], [1.5, 2.5, 3.5]).tolist() == [1, 2, NO_PARENT]
@@ -0,0 +1,30 @@
+import os
+import shutil
+from log_cache import read_meta
+from pcap_index import load_index, index_dir, INDEX_VERSION
+
+def test_index_is_reused_after_a_touch(capture_path, tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    shutil.copyfile(capture_path('10mins_SFA.pcap'), path)
+    with load_index(path) as index:
+        records = len(index)
+        events = index.rpl_events(10, 60)
+
+    meta = read_meta(index_dir(path), INDEX_VERSION)
+    assert meta['records'] == records
+    os.utime(path, ns=(meta['mtime_ns'] + 10**9, meta['mtime_ns'] + 10**9))
+    with load_index(path) as index:
+        assert index.rpl_events(10, 60).equals(events)
+    # the content did not change: the stored mtime is refreshed instead of rebuilding
+    assert read_meta(index_dir(path), INDEX_VERSION)['mtime_ns'] == meta['mtime_ns'] + 10**9
+    assert read_meta(index_dir(path), INDEX_VERSION + 1) is None
+
+def test_changed_capture_is_indexed_again(capture_path, tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    shutil.copyfile(capture_path('10mins_SFA.pcap'), path)
+    with load_index(path) as index:
+        records = len(index)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 200)
+    with load_index(path) as index:
+        assert len(index) < records
@@ -0,0 +1,57 @@
+import struct
+import pytest
+from pcap_parser import PcapFile, rpl_events, dissect_rpl, control_msgs_from_events, PCAP_HEADER_LEN, RECORD_HEADER_LEN
+from pcap_index import load_index
+
+# RPL control messages of the bundled captures, every frame counted once
+COUNTS = {
+    '10mins_no-attacks.pcap': {'DIS': 1, 'DIO': 166, 'DAO': 11, 'DAO-ACK': 11},
+    '10mins_SFA.pcap': {'DIS': 5, 'DIO': 338, 'DAO': 79, 'DAO-ACK': 76},
+}
+
+# Raw bytes (header included) of every record of a capture, and its global header
+def capture_records(path):
+    with PcapFile(path) as pcap:
+        header = bytes(pcap.data[:PCAP_HEADER_LEN])
+        records = [bytes(pcap.data[offset - RECORD_HEADER_LEN:offset + length]) for _, offset, length in pcap.records()]
+    return header, records
+
+def write_capture(path, header, records):
+    path.write_bytes(header + b''.join(records))
+    return str(path)
+
+def totals(events):
+    return events['type'].value_counts().to_dict()
+
+@pytest.mark.parametrize('name', sorted(COUNTS))
+def test_bundled_captures(capture_path, name):
+    assert totals(rpl_events(capture_path(name))) == COUNTS[name]
+
+def test_duplicate_records_count_once(capture_path, tmp_path):
+    header, records = capture_records(capture_path('10mins_SFA.pcap'))
+    records = records[:1000]
+    expected = rpl_events(write_capture(tmp_path / 'once.pcap', header, records))
+    assert len(expected)
+
+    doubled = [record for record in records for _ in range(2)]
+    repeated = records * 3
+    for name, copies in [('doubled.pcap', doubled), ('repeated.pcap', repeated)]:
+        path = write_capture(tmp_path / name, header, copies)
+        events = rpl_events(path)
+        assert events.equals(expected)
+        with load_index(path) as index:
+            assert index.rpl_events().equals(expected)
+        assert control_msgs_from_events(events) == control_msgs_from_events(expected)
+
+def test_same_frame_at_another_time_counts(capture_path, tmp_path):
+    path = capture_path('10mins_SFA.pcap')
+    with PcapFile(path) as pcap:
+        header = bytes(pcap.data[:PCAP_HEADER_LEN])
+        offset, length = next((offset, length) for _, offset, length in pcap.records()
+                              if dissect_rpl(pcap.data, offset, offset + length - pcap.fcs_len))
+        record = bytes(pcap.data[offset - RECORD_HEADER_LEN:offset + length])
+        ts_sec = struct.unpack_from(pcap.byte_order + 'I', record)[0]
+        # the same bytes one second later are another transmission
+        later = struct.pack(pcap.byte_order + 'I', ts_sec + 1) + record[4:]
+    events = rpl_events(write_capture(tmp_path / 'later.pcap', header, [record, later, later]))
+    assert events['timestamp'].tolist() == [0.0, 1.0]
@@ -0,0 +1,60 @@
+import pytest
+import profiling
+from profiling import stage, read_events
+from log_cache import load_log
+
+@pytest.fixture
+def events(tmp_path, monkeypatch):
+    output = str(tmp_path / 'profile.json')
+    monkeypatch.setattr(profiling, '_output', output)
+    return lambda: {event['name']: event for event in read_events(output)}
+
+@stage(lines=len)
+def read(items):
+    return list(items)
+
+@stage(lines=len)
+def load(items):
+    return read(items)
+
+@stage(rows=len, lines=len)
+def load_both(first, second):
+    return load(first) + read(second)
+
+@stage()
+def analyze(items):
+    profiling.count(rows=1)
+    return load(items)
+
+def test_nested_stages_count_lines_once(events):
+    load_both(range(5), range(3))
+    recorded = events()
+    assert recorded['load']['lines'] == 5
+    assert recorded['load_both']['lines'] == 8
+    assert recorded['load_both']['rows'] == 8
+
+def test_lines_reach_the_outer_stages(events):
+    analyze(range(4))
+    recorded = events()
+    assert [recorded[name]['lines'] for name in ['read', 'load', 'analyze']] == [4, 4, 4]
+    assert recorded['analyze']['rows'] == 1
+    assert recorded['analyze']['depth'] == 0 and recorded['read']['depth'] == 2
+
+def test_log_lines_include_malformed_ones(events, tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_text('1.0\tID:1\t[INFO: Main      ] a\n'
+                    'garbage\n'
+                    '\n'
+                    '2.0\tID:2\t[INFO: Main      ] b\n')
+    # parsed: the lines come from parse_log
+    load_log(str(path), use_cache=True)
+    recorded = events()
+    assert recorded['parse_log']['lines'] == 3
+    assert recorded['load_log']['lines'] == 3
+
+    # cached: load_log counts them itself
+    (tmp_path / 'profile.json.events').unlink()
+    load_log(str(path), use_cache=True)
+    recorded = events()
+    assert 'parse_log' not in recorded
+    assert recorded['load_log']['lines'] == 3
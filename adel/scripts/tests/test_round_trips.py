@@ -0,0 +1,85 @@
+import re
+import numpy as np
+import pytest
+from round_trips import match_round_trips
+
+# (requests, lost requests, lost responses, mean round trip in sec) of the fixture logs
+TOTALS = {
+    'normal.txt': (304, 2, 3, 0.607229),
+    'SFA+SHA52021_log.txt': (254, 4, 96, 0.581991),
+}
+
+APP_RE = re.compile(r'^([\d.]+)\tID:(\d+)\t\[INFO: App *\] (Sending|Received) (request|response) (\d+) (?:to|from) 6G-(\d+)')
+
+# Line-by-line reference for a single run: the first line of every step of a request
+def reference_trips(path):
+    steps = {}
+    with open(path) as file:
+        for line in file:
+            match = APP_RE.match(line)
+            if match:
+                time, node, verb, kind, count, peer = match.groups()
+                steps.setdefault((verb, kind, int(count), int(node), int(peer)), float(time))
+    trips = {}
+    for (verb, kind, count, src, dst), sent in steps.items():
+        if (verb, kind) == ('Sending', 'request'):
+            received = steps.get(('Received', 'response', count, src, dst))
+            trips[(count, dst)] = received - sent if received is not None else None
+    return trips
+
+def app_line(time, node, text):
+    return f'{time}\tID:{node}\t[INFO: App       ] {text}'
+
+# One run of the root (1) sending requests 1..3 to node 2, without the given line
+def app_run(start, missing=None):
+    lines = []
+    for count in range(1, 4):
+        t = start + count
+        lines += [
+            app_line(f'{t:.3f}', 1, f'Sending request {count} to 6G-2'),
+            app_line(f'{t + 0.1:.3f}', 2, f'Received request {count} from 6G-1'),
+            app_line(f'{t + 0.2:.3f}', 2, f'Sending response {count} to 6G-1'),
+            app_line(f'{t + 0.4:.3f}', 1, f'Received response {count} from 6G-2'),
+        ]
+    return [line for line in lines if line != missing]
+
+@pytest.mark.parametrize('name', sorted(TOTALS))
+def test_fixture_log_totals(fixture_log, name):
+    trips = match_round_trips(fixture_log(name))
+    requests, lost_requests, lost_responses, mean = TOTALS[name]
+    assert len(trips) == requests
+    assert trips['request_lost'].sum() == lost_requests
+    assert trips['response_lost'].sum() == lost_responses
+    assert trips['round_trip'].mean() == pytest.approx(mean, abs=1e-6)
+
+@pytest.mark.parametrize('name', sorted(TOTALS))
+def test_fixture_log_matches_the_line_loop(fixture_log, log_path, name):
+    trips = match_round_trips(fixture_log(name))
+    reference = reference_trips(log_path(name))
+    assert len(trips) == len(reference)
+    for count, dst, round_trip in zip(trips['count'], trips['dst'], trips['round_trip']):
+        expected = reference[(count, dst)]
+        if expected is None:
+            assert np.isnan(round_trip)
+        else:
+            assert round_trip == pytest.approx(expected, abs=1e-9)
+
+def test_latencies_of_one_request(make_log):
+    trips = match_round_trips(make_log(app_run(0)))
+    first = trips.iloc[0]
+    assert (first['count'], first['src'], first['dst']) == (1, 1, 2)
+    assert first['request_latency'] == pytest.approx(0.1)
+    assert first['response_latency'] == pytest.approx(0.2)
+    assert first['round_trip'] == pytest.approx(0.4)
+
+def test_restarted_counter_pairs_each_run_on_its_own(make_log):
+    # the first run lost a line; the second run reuses the same counts
+    missing = app_line('2.100', 2, 'Received request 2 from 6G-1')
+    trips = match_round_trips(make_log(app_run(0, missing) + app_run(100)))
+    single = match_round_trips(make_log(app_run(100)))
+
+    assert len(trips) == 6
+    assert trips['request_lost'].tolist() == [False, True, False, False, False, False]
+    second = trips.iloc[3:].reset_index(drop=True)
+    columns = ['count', 'src', 'dst', 'request_latency', 'response_latency', 'round_trip']
+    assert second[columns].equals(single[columns])
@@ -1,39 +1,42 @@
-import sys
-import matplotlib.pyplot as plt
+import argparse
+import os
 import pandas as pd
-import re
-from collections import defaultdict
+from log_parser import report_malformed
+from log_cache import load_log
+from plotting import new_figure, finish_figure
 
 def parse_log_file(file_path):
-    data = defaultdict(list)
-    with open(file_path, 'r') as file:
-        for line in file:
-            match = re.match(r'(?P<timestamp>\d+\.?\d*)\s+ID:(?P<id>\d+)\s+\[(?P<level>INFO|WARN|ERROR):\s*(?P<source>.*?)\s*\]\s*(?P<message>.*)', line)
-            if match:
-                data['timestamp'].append(float(match.group('timestamp')))
-                data['id'].append(int(match.group('id')))
-                data['level'].append(match.group('level'))
-                data['source'].append(match.group('source').strip())
-                data['message'].append(match.group('message').strip())
-    return pd.DataFrame(data)
+    log = load_log(file_path)
+    report_malformed(log, file_path)
+    df = log.to_frame()
+    df = df[df['level'].isin(['INFO', 'WARN', 'ERROR'])]
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy(),
+        'id': df['node_id'].to_numpy(),
+        'level': df['level'].astype(str).to_numpy(),
+        'source': df['module'].astype(str).to_numpy(),
+        'message': df['message'].str.strip().to_numpy(),
+    })
 
 def generate_summary(df):
     summary = df.groupby(['id', 'source']).size().reset_index(name='count')
     return summary
 
-def visualize_data(df):
+def visualize_data(df, output_path=None, show=False):
     summary = generate_summary(df)
     summary_pivot = summary.pivot(index='id', columns='source', values='count').fillna(0)
 
-    summary_pivot.plot(kind='bar', stacked=True, figsize=(12, 8))
-    plt.title('Log Messages by Node and Source')
-    plt.xlabel('Node ID')
-    plt.ylabel('Message Count')
-    plt.legend(title='Source')
-    plt.tight_layout()
-    plt.show()
+    fig = new_figure((12, 8), show)
+    ax = fig.subplots()
+    summary_pivot.plot(kind='bar', stacked=True, ax=ax)
+    ax.set_title('Log Messages by Node and Source')
+    ax.set_xlabel('Node ID')
+    ax.set_ylabel('Message Count')
+    ax.legend(title='Source')
+    fig.tight_layout()
+    finish_figure(fig, output_path, show)
 
-def main(file_path):
+def main(file_path, show=False):
     df = parse_log_file(file_path)
     print("Parsed log data:")
     print(df.head())
@@ -43,11 +46,14 @@ def main(file_path):
     print(summary)
 
     print("\nGenerating visualization...")
-    visualize_data(df)
+    output_path = None if show else os.path.splitext(file_path)[0] + '_messages_by_source.png'
+    visualize_data(df, output_path, show)
+    if output_path is not None:
+        print(f"Visualization saved to {output_path}")
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python3 script.py path/to/file")
-        sys.exit(1)
-    file_path = sys.argv[1]
-    main(file_path)
+    parser = argparse.ArgumentParser(description="Count the log messages of every node by source module")
+    parser.add_argument("file_path", help="COOJA log file")
+    parser.add_argument("--show", action="store_true", help="open the chart in a window instead of saving it")
+    args = parser.parse_args()
+    main(args.file_path, args.show)